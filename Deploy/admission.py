@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Admission Control for the Cattle AI Servers
+Bounds concurrent /predict work, sheds excess load with 503/429 and drops requests past their deadline.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Default admission limits
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_PER_CLIENT_LIMIT = 4
+
+# Requests without X-Deadline-Ms get the Flutter client's ApiConfig.requestTimeout
+DEFAULT_DEADLINE_MS = 30000
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Proof of admission; hand it back to ``release`` when the request is done"""
+
+    __slots__ = ("client_ip", "admitted_at")
+
+    def __init__(self, client_ip: str, admitted_at: float):
+        self.client_ip = client_ip
+        self.admitted_at = admitted_at
+
+
+def parse_deadline(headers, received: Optional[float] = None,
+                   default_ms: Optional[float] = DEFAULT_DEADLINE_MS) -> Optional[float]:
+    """Absolute ``time.monotonic()`` deadline from the X-Deadline-Ms header.
+
+    The header is the client's remaining budget in milliseconds, counted from
+    when the request reached the server (``received``).
+    """
+    received = time.monotonic() if received is None else received
+    value = headers.get(DEADLINE_HEADER) if headers is not None else None
+    try:
+        budget_ms = float(value) if value else default_ms
+    except ValueError:
+        budget_ms = default_ms
+    if budget_ms is None or budget_ms <= 0:
+        return None
+    return received + budget_ms / 1000.0
+
+
+def _set_done(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdmissionController:
+    """Bounded admission queue in front of the model.
+
+    At most ``max_in_flight`` requests run at once; up to ``max_queue`` more
+    wait for a slot, and anything beyond that is rejected at once with 503 and
+    a Retry-After estimate. A single client IP may hold at most
+    ``per_client_limit`` running or waiting requests (429 beyond that), and a
+    request whose deadline passes while it waits is dropped with 504 before it
+    reaches the model. Limits are per process, so pre-forked workers each get
+    their own.
+
+    ``acquire`` blocks the calling thread while it waits (threaded engine).
+    ``acquire_async`` waits on a future instead, so the asyncio engine admits
+    requests on its event loop and only hands admitted ones to its executor.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 max_queue: int = DEFAULT_MAX_QUEUE,
+                 per_client_limit: int = DEFAULT_PER_CLIENT_LIMIT):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.per_client_limit = max(0, int(per_client_limit))  # 0 disables the per-client cap
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._per_client: Dict[str, int] = {}
+        self._async_waiters = deque()  # (loop, future) per waiting acquire_async call, oldest first
+
+        # Counters for /status
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_client_limit = 0
+        self.shed_deadline = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.service_time_avg = 0.0  # EWMA of admitted request duration, seconds
+
+    def acquire(self, client_ip: str, deadline: Optional[float] = None) -> AdmissionTicket:
+        """Wait for an inference slot or raise AdmissionRejected"""
+        enqueued = time.monotonic()
+        with self._cond:
+            self._enqueue(client_ip, enqueued, deadline)
+            try:
+                while self._in_flight >= self.max_in_flight:
+                    self._cond.wait(self._remaining(deadline))
+            except BaseException:
+                self._leave(client_ip)
+                raise
+            return self._admit(client_ip, enqueued)
+
+    async def acquire_async(self, client_ip: str, deadline: Optional[float] = None) -> AdmissionTicket:
+        """``acquire`` for an event loop: a queued request waits on a future, not on a thread"""
+        loop = asyncio.get_running_loop()
+        enqueued = time.monotonic()
+        with self._cond:
+            self._enqueue(client_ip, enqueued, deadline)
+        try:
+            while True:
+                with self._cond:
+                    if self._in_flight < self.max_in_flight:
+                        return self._admit(client_ip, enqueued)
+                    remaining = self._remaining(deadline)
+                    entry = (loop, loop.create_future())
+                    self._async_waiters.append(entry)
+                try:
+                    await asyncio.wait_for(entry[1], remaining)
+                except asyncio.TimeoutError:
+                    pass  # the next pass sheds it with 504
+                finally:
+                    with self._cond:
+                        if entry in self._async_waiters:
+                            self._async_waiters.remove(entry)
+                        elif entry[1].cancelled():
+                            # release() picked this waiter as it gave up: pass the free slot on
+                            self._wake_async()
+        except BaseException:
+            with self._cond:
+                self._leave(client_ip)
+            raise
+
+    def release(self, ticket: AdmissionTicket):
+        """Free the slot held by an admitted request"""
+        duration = time.monotonic() - ticket.admitted_at
+        with self._cond:
+            self._in_flight -= 1
+            self._drop_client(ticket.client_ip)
+            if self.service_time_avg:
+                self.service_time_avg = 0.9 * self.service_time_avg + 0.1 * duration
+            else:
+                self.service_time_avg = duration
+            self._cond.notify()
+            self._wake_async()
+
+    def _enqueue(self, client_ip: str, enqueued: float, deadline: Optional[float]):
+        """Shed the request or count it as waiting (lock held)"""
+        if deadline is not None and enqueued >= deadline:
+            self.shed_deadline += 1
+            raise AdmissionRejected(504, "Request deadline already exceeded")
+
+        held = self._per_client.get(client_ip, 0)
+        if self.per_client_limit and held >= self.per_client_limit:
+            self.shed_client_limit += 1
+            raise AdmissionRejected(429, f"Too many concurrent requests from {client_ip}",
+                                    self._retry_after())
+
+        if self._in_flight >= self.max_in_flight and self._waiting >= self.max_queue:
+            self.shed_queue_full += 1
+            raise AdmissionRejected(503, "Server busy, inference queue is full", self._retry_after())
+
+        self._per_client[client_ip] = held + 1
+        self._waiting += 1
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        """Seconds a waiting request may still wait; sheds it with 504 once its deadline passed (lock held)"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.shed_deadline += 1
+            raise AdmissionRejected(504, "Request deadline exceeded while queued")
+        return remaining
+
+    def _admit(self, client_ip: str, enqueued: float) -> AdmissionTicket:
+        """Move a waiting request into a free slot (lock held)"""
+        self._waiting -= 1
+        self._in_flight += 1
+        self.admitted += 1
+        admitted_at = time.monotonic()
+        waited = admitted_at - enqueued
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        return AdmissionTicket(client_ip, admitted_at)
+
+    def _leave(self, client_ip: str):
+        """Forget a waiting request that was shed or cancelled (lock held)"""
+        self._waiting -= 1
+        self._drop_client(client_ip)
+
+    def _wake_async(self):
+        """Wake the oldest acquire_async waiter, on its own loop (lock held)"""
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_set_done, waiter)
+                return
+            except RuntimeError:
+                continue  # its loop has closed
+
+    def _drop_client(self, client_ip: str):
+        """Decrement a client's held count (lock held)"""
+        held = self._per_client.get(client_ip, 0) - 1
+        if held > 0:
+            self._per_client[client_ip] = held
+        else:
+            self._per_client.pop(client_ip, None)
+
+    def _retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (lock held)"""
+        backlog = self._in_flight + self._waiting
+        return max(1, math.ceil(backlog * self.service_time_avg / self.max_in_flight))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Occupancy, queue wait and shed counters, for /status"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "per_client_limit": self.per_client_limit,
+            "in_flight": self._in_flight,
+            "queued": self._waiting,
+            "admitted": self.admitted,
+            "avg_queue_wait_ms": round(self.queue_wait_total / self.admitted * 1000.0, 2) if self.admitted else 0.0,
+            "max_queue_wait_ms": round(self.queue_wait_max * 1000.0, 2),
+            "avg_service_ms": round(self.service_time_avg * 1000.0, 2),
+            "shed": {
+                "queue_full": self.shed_queue_full,
+                "client_limit": self.shed_client_limit,
+                "deadline": self.shed_deadline,
+                "total": self.shed_queue_full + self.shed_client_limit + self.shed_deadline,
+            },
+        }
\ No newline at end of file
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Asyncio Serving Engine for the Cattle AI Servers
+An HTTP/1.1 server on asyncio streams with persistent connections and a bounded inference executor.
+"""
+
+import asyncio
+import functools
+import http
+import http.client
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from typing import Callable, Iterable, Optional
+
+from admission import DEFAULT_DEADLINE_MS, AdmissionController, AdmissionRejected, parse_deadline
+from metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+from server_logging import get_logger
+
+# Engine defaults
+DEFAULT_EXECUTOR_WORKERS = 8
+# Executor threads beyond the admission limit, for the routes admission does not cover (/status, /breeds, ...)
+EXECUTOR_SPARE_WORKERS = 4
+# Cheap routes answered on the event loop, so probes never wait behind inference
+PROBE_PATHS = ("/live", "/ready", "/health")
+KEEPALIVE_TIMEOUT = 15.0
+# Seconds to receive a declared request body, as the threaded handlers' socket timeout
+BODY_READ_TIMEOUT = 30.0
+MAX_HEADER_BYTES = 64 * 1024
+
+logger = get_logger("async_engine")
+
+class AsyncHTTPServer:
+    """Serves the same routes as the threaded servers on one event loop.
+
+    Connections stay open between requests (HTTP/1.1 keep-alive) until the
+    client closes them, asks for ``Connection: close`` or idles longer than
+    ``keepalive_timeout``; one whose body does not arrive in full within
+    ``body_timeout`` is closed without a response. Request bodies are read on the loop; routing,
+    decode and inference run on a ``ThreadPoolExecutor`` of ``max_workers``
+    threads, so CPU-bound work never blocks other connections.
+
+    ``handle_request(method, path, headers, rfile, client_ip, received)`` is
+    the same routing function the threaded handler uses and returns
+    ``(status_code, response_dict)``; ``received`` is the monotonic time the
+    request headers arrived, so time spent queued for the executor counts
+    against the request deadline. A ``str`` response is sent as Prometheus
+    text. JSON serialization also runs on the executor and is recorded as the
+    ``serialize`` stage for paths listed in ``endpoints`` (others as "other").
+
+    With an ``admission`` controller, POSTs to ``admission_paths`` are
+    admitted on the event loop before their body is read, and only admitted
+    requests reach the executor, which gets ``EXECUTOR_SPARE_WORKERS``
+    threads beyond the admission limit. The outcome (an AdmissionTicket, or
+    the AdmissionRejected to answer with) is passed to ``handle_request`` as
+    ``admitted``; the engine releases the ticket. GETs to ``probe_paths``
+    run on the loop itself.
+    """
+
+    def __init__(self, handle_request: Callable, host: str = "", port: int = 8001,
+                 max_workers: int = DEFAULT_EXECUTOR_WORKERS,
+                 max_body_bytes: int = 20 * 1024 * 1024,
+                 allow_headers: str = "Content-Type, Authorization",
+                 keepalive_timeout: float = KEEPALIVE_TIMEOUT, body_timeout: float = BODY_READ_TIMEOUT,
+                 sock=None, endpoints: Iterable[str] = (),
+                 admission: Optional[AdmissionController] = None, admission_paths: Iterable[str] = (),
+                 deadline_ms: Optional[float] = DEFAULT_DEADLINE_MS, probe_paths: Iterable[str] = PROBE_PATHS):
+        self.handle_request = handle_request
+        self.host = host or None
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.allow_headers = allow_headers
+        self.keepalive_timeout = keepalive_timeout
+        self.body_timeout = body_timeout
+        self.sock = sock  # pre-bound listening socket (pre-fork workers)
+        self.endpoints = frozenset(endpoints)
+        self.admission = admission
+        self.admission_paths = frozenset(admission_paths)
+        self.deadline_ms = deadline_ms
+        self.probe_paths = frozenset(probe_paths)
+        if admission is not None:
+            max_workers = max(max_workers, admission.max_in_flight + EXECUTOR_SPARE_WORKERS)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-worker")
+        self.connections_opened = 0
+        self.requests_handled = 0
+
+    async def serve_forever(self):
+        if self.sock is not None:
+            server = await asyncio.start_server(self._handle_connection, sock=self.sock,
+                                                limit=MAX_HEADER_BYTES)
+        else:
+            server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                limit=MAX_HEADER_BYTES, reuse_address=True)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until it should be closed"""
+        self.connections_opened += 1
+        peer = writer.get_extra_info("peername")
+        client_ip = peer[0] if peer else "unknown"
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._write_response(writer, 400, {"error": "Request headers too large"}, keep_alive=False)
+                    return
+
+                keep_alive = await self._handle_request(head, reader, writer, client_ip)
+                self.requests_handled += 1
+                if not keep_alive:
+                    return
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _handle_request(self, head: bytes, reader, writer, client_ip: str) -> bool:
+        """Read one request body, run it on the executor and write the response; returns keep-alive"""
+        received = time.monotonic()
+        request_line, _, header_block = head.partition(b"\r\n")
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._write_response(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+            return False
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+
+        connection = headers.get("Connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+
+        if headers.get("Transfer-Encoding"):
+            await self._write_response(writer, 411, {"error": "Content-Length required"}, keep_alive=False)
+            return False
+
+        try:
+            content_length = int(headers.get("Content-Length", 0) or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            await self._write_response(writer, 400, {"error": "Invalid Content-Length header"}, keep_alive=False)
+            return False
+        if content_length > self.max_body_bytes:
+            # The unread body would corrupt the next request, so close afterwards
+            error = f"Upload of {content_length} bytes exceeds the {self.max_body_bytes} byte limit"
+            await self._write_response(writer, 413, {"error": error}, keep_alive=False)
+            return False
+        path = target.split("?", 1)[0]
+        if method == "GET" and path in self.probe_paths:
+            status_code, response, encoded = self._run_request(method, path, headers, io.BytesIO(), client_ip,
+                                                               received)
+            await self._write_response(writer, status_code, response, keep_alive, encoded)
+            return keep_alive
+
+        # Admit before reading the body, so shed uploads cost no memory and queued ones hold no thread
+        extra = {}
+        ticket = None
+        if self.admission is not None and method == "POST" and path in self.admission_paths:
+            try:
+                ticket = await self.admission.acquire_async(client_ip,
+                                                            parse_deadline(headers, received, self.deadline_ms))
+                extra["admitted"] = ticket
+            except AdmissionRejected as e:
+                extra["admitted"] = e
+                # The body stays unread, so the connection cannot carry another request
+                keep_alive = keep_alive and content_length == 0
+                content_length = 0
+        try:
+            try:
+                body = (await asyncio.wait_for(reader.readexactly(content_length), self.body_timeout)
+                        if content_length > 0 else b"")
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                return False  # the client stalled or went away mid-body
+
+            if method == "OPTIONS":
+                await self._write_response(writer, 200, None, keep_alive)
+                return keep_alive
+
+            loop = asyncio.get_running_loop()
+            try:
+                status_code, response, encoded = await loop.run_in_executor(
+                    self.executor, functools.partial(self._run_request, method, path, headers, io.BytesIO(body),
+                                                     client_ip, received, **extra))
+            except Exception as e:
+                logger.exception("%s %s failed", method, path)
+                status_code, response, encoded = 500, {"error": f"Server error: {str(e)}"}, None
+        finally:
+            if ticket is not None:
+                self.admission.release(ticket)
+
+        await self._write_response(writer, status_code, response, keep_alive, encoded)
+        return keep_alive
+
+    def _run_request(self, method, path, headers, rfile, client_ip, received, **extra):
+        """Route the request and serialize its response (on the executor, or on the loop for probes)"""
+        status_code, response = self.handle_request(method, path, headers, rfile, client_ip, received, **extra)
+        started = time.perf_counter()
+        encoded = self._encode(response)
+        METRICS.observe(path if path in self.endpoints else "other", "serialize", time.perf_counter() - started)
+        return status_code, response, encoded
+
+    @staticmethod
+    def _encode(response):
+        """Response body bytes and content type"""
+        if response is None:
+            return b"", "application/json"
+        if isinstance(response, str):
+            return response.encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+        return json.dumps(response, indent=2).encode("utf-8"), "application/json"
+
+    async def _write_response(self, writer, status_code: int, response, keep_alive: bool, encoded=None):
+        """Write a response with CORS and connection headers"""
+        body, content_type = encoded or self._encode(response)
+        lines = [
+            f"HTTP/1.1 {status_code} {reason_phrase(status_code)}",
+            f"Date: {formatdate(usegmt=True)}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+            f"Access-Control-Allow-Headers: {self.allow_headers}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if isinstance(response, dict) and "retry_after" in response:
+            lines.append(f"Retry-After: {response['retry_after']}")
+        if keep_alive:
+            lines.append(f"Keep-Alive: timeout={int(self.keepalive_timeout)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def reason_phrase(status_code: int) -> str:
+    """Standard reason phrase for a status code, as http.server sends it"""
+    try:
+        return http.HTTPStatus(status_code).phrase
+    except ValueError:
+        return ""
+
+
+def run_async_server(handle_request: Callable, port: int, host: str = "", **kwargs):
+    """Run the asyncio engine until interrupted"""
+    server = AsyncHTTPServer(handle_request, host=host, port=port, **kwargs)
+    try:
+        asyncio.run(server.serve_forever())
+    finally:
+        server.executor.shutdown(wait=False)
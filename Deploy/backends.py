@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Inference Backends for the Cattle AI Servers
+PyTorch or ONNX Runtime behind one forward/topk interface; the ONNX Runtime backend does not need torch installed.
+The fake backend stands in for the model when benchmarking the serving layer.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None  # only the ONNX Runtime backend is usable
+
+from preprocessing import Preprocessor
+from prediction_cache import compute_model_version
+
+BACKENDS = ("torch", "onnxruntime", "fake")
+
+# ONNX export written next to the checkpoint by export_model.py --format onnx
+ONNX_SUFFIX = ".onnx"
+
+
+def onnx_path(checkpoint_path) -> str:
+    """Where export_model.py writes the ONNX export of a checkpoint"""
+    path = str(checkpoint_path)
+    if path.endswith(ONNX_SUFFIX):
+        return path
+    return os.path.splitext(path)[0] + ONNX_SUFFIX
+
+
+class TorchBackend:
+    """PyTorch model (eager or TorchScript) from model_loading"""
+
+    name = "torch"
+
+    def __init__(self, loaded, device):
+        self.model = loaded.module
+        self.classes = loaded.classes
+        self.format = loaded.format
+        self.version = loaded.version
+        self.path = loaded.path
+        self.info = loaded.info
+        self.normalization_folded = loaded.normalization_folded
+        self.device = device
+
+    def make_preprocessor(self, channels_last: bool) -> Preprocessor:
+        return Preprocessor(channels_last=channels_last, pin_memory=self.device.type == "cuda",
+                            normalize=not self.normalization_folded)
+
+    def forward(self, batch):
+        """Class probabilities for a preprocessed batch"""
+        with torch.no_grad():
+            outputs = self.model(batch.to(self.device, non_blocking=True))
+            return torch.nn.functional.softmax(outputs, dim=1)
+
+    def topk(self, probabilities, k: int) -> Tuple[List[List[float]], List[List[int]]]:
+        """Top-k probabilities and class indices per row, as lists"""
+        top_probs, top_indices = torch.topk(probabilities, min(k, probabilities.shape[1]), dim=1)
+        return top_probs.tolist(), top_indices.tolist()
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime CPU session over the ONNX export; preprocessing and top-k run in NumPy"""
+
+    name = "onnxruntime"
+    format = "onnx"
+
+    def __init__(self, path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads  # 0 = one per physical core
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.model = self.session
+        self.path = path
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.classes = json.loads(metadata.get("classes", "null"))
+        self.info = json.loads(metadata.get("metadata", "{}"))
+        self.version = self.info.get("source_version") or compute_model_version(path)
+        self.device = "cpu"
+
+    def make_preprocessor(self, channels_last: bool) -> Preprocessor:
+        # ORT takes a contiguous NCHW float32 array; channels-last would force a copy
+        return Preprocessor(use_numpy=True)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed batch"""
+        logits = self.session.run(None, {self.input_name: batch})[0]
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def topk(self, probabilities: np.ndarray, k: int) -> Tuple[List[List[float]], List[List[int]]]:
+        """Top-k probabilities and class indices per row, as lists"""
+        return numpy_topk(probabilities, k)
+
+
+def numpy_topk(probabilities: np.ndarray, k: int) -> Tuple[List[List[float]], List[List[int]]]:
+    """Top-k probabilities and class indices per row of a NumPy array, as lists"""
+    k = min(k, probabilities.shape[1])
+    indices = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    rows = np.arange(probabilities.shape[0])[:, None]
+    order = np.argsort(-probabilities[rows, indices], axis=1)
+    indices = indices[rows, order]
+    return probabilities[rows, indices].tolist(), indices.tolist()
+
+
+# Fake backend forward latency: "constant:MS", "uniform:LOW,HIGH", "normal:MEAN,STD", "lognormal:MEDIAN,SIGMA"
+# or "exponential:MEAN", in milliseconds per forward pass
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+DEFAULT_FAKE_LATENCY = "constant:20"
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler (random.Random -> milliseconds, never negative) for a latency distribution spec"""
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"latency spec {spec!r} has non-numeric parameters") from None
+    arity = {"constant": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+    if name not in arity or len(values) != arity[name]:
+        raise ValueError(f"latency spec {spec!r} is not one of constant:MS, uniform:LOW,HIGH, normal:MEAN,STD, "
+                         f"lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    if name == "constant":
+        return lambda rng: max(0.0, values[0])
+    if name == "uniform":
+        return lambda rng: max(0.0, rng.uniform(values[0], values[1]))
+    if name == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if name == "lognormal":
+        return lambda rng: rng.lognormvariate(np.log(values[0]), values[1])
+    return lambda rng: rng.expovariate(1.0 / values[0])
+
+
+class FakeBackend:
+    """Deterministic stand-in for the model, for benchmarking the HTTP and batching layers in isolation.
+
+    Each input row is hashed and the hash seeds its logits, so the same image
+    always gets the same prediction (across processes and runs), with no
+    weights and no torch. ``forward`` takes ``latency`` milliseconds (a
+    distribution spec, sampled with a seeded RNG) plus ``per_item_ms`` per
+    input after the first, sleeping so other threads keep running as they
+    would while a real model releases the GIL.
+    """
+
+    name = "fake"
+    format = "fake"
+    normalization_folded = False
+
+    def __init__(self, num_classes: int, latency: str = DEFAULT_FAKE_LATENCY, per_item_ms: float = 0.0,
+                 seed: int = 0, classes: Optional[List[str]] = None):
+        self.num_classes = num_classes
+        self.sample_latency = parse_latency(latency)
+        self.per_item_ms = per_item_ms
+        self.seed = seed
+        self.classes = classes
+        self.model = self
+        self.path = None
+        self.info = {"latency": latency, "per_item_ms": per_item_ms, "seed": seed}
+        self.version = f"fake-{seed}"
+        self.device = "cpu"
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def make_preprocessor(self, channels_last: bool) -> Preprocessor:
+        return Preprocessor(use_numpy=True)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed batch, after the simulated latency"""
+        started = time.perf_counter()
+        with self._lock:
+            delay = self.sample_latency(self._random) + self.per_item_ms * (len(batch) - 1)
+        probabilities = np.stack([self._probabilities(row) for row in batch])
+        remaining = delay / 1000.0 - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        return probabilities
+
+    def _probabilities(self, row: np.ndarray) -> np.ndarray:
+        digest = hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=8,
+                                 key=self.seed.to_bytes(8, "little"))
+        logits = np.random.default_rng(int.from_bytes(digest.digest(), "little")).standard_normal(self.num_classes)
+        logits *= 3.0  # a clear winner, like a trained model, rather than a near-uniform spread
+        logits -= logits.max()
+        np.exp(logits, out=logits)
+        return (logits / logits.sum()).astype(np.float32)
+
+    def topk(self, probabilities: np.ndarray, k: int) -> Tuple[List[List[float]], List[List[int]]]:
+        """Top-k probabilities and class indices per row, as lists"""
+        return numpy_topk(probabilities, k)
\ No newline at end of file
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Image Decode Benchmark
+Compares full-resolution PIL decoding with the reduced-resolution decode on large phone photos:
+decode time, peak RSS and whether the model's predictions move.
+
+Usage: python benchmarks/bench_decode.py [--images a.jpg b.png ...] [--model ../models/stable_cattle_model.pth]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageOps
+
+from image_decode import decode_image, decode_image_full
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / "assets"
+PHONE_SIZE = (4032, 3024)  # 12 MP, the common phone camera resolution
+
+
+def build_phone_images(out_dir: str):
+    """Upscale the app's sample photos to 12 MP phone-camera files (JPEG, rotated JPEG, PNG, WebP)"""
+    sources = sorted(ASSETS_DIR.glob("*.jpg")) + sorted(ASSETS_DIR.glob("*.png"))
+    if not sources:
+        raise SystemExit(f"No sample images in {ASSETS_DIR}; pass --images")
+    paths = []
+    for i, source in enumerate(sources):
+        image = Image.open(source).convert("RGB").resize(PHONE_SIZE, Image.Resampling.BICUBIC)
+        path = os.path.join(out_dir, f"{source.stem}_12mp.jpg")
+        image.save(path, "JPEG", quality=92)
+        paths.append(path)
+        if i == 0:
+            # Portrait shot stored landscape with an EXIF rotation, as phones do
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            path = os.path.join(out_dir, f"{source.stem}_12mp_rotated.jpg")
+            image.save(path, "JPEG", quality=92, exif=exif)
+            paths.append(path)
+            for fmt in ("PNG", "WEBP"):
+                path = os.path.join(out_dir, f"{source.stem}_12mp.{fmt.lower()}")
+                image.save(path, fmt)
+                paths.append(path)
+    return paths
+
+
+def preprocess(image):
+    """The servers' preprocessing after decode"""
+    from preprocessing import Preprocessor
+    return Preprocessor()(image)
+
+
+def time_decode(fn, data: bytes, repeat: int) -> float:
+    """Median milliseconds to decode (and resize to 224x224) one upload"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data).resize((224, 224), Image.Resampling.BILINEAR)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def peak_rss_mb(method: str, path: str) -> float:
+    """Peak RSS growth of decoding one image, measured in a fresh process"""
+    output = subprocess.run([sys.executable, __file__, "--child", method, path],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])["peak_rss_mb"]
+
+
+def _peak_rss_kb() -> float:
+    """Peak RSS of this process in KB.
+
+    Linux keeps ru_maxrss across exec (the child would report the parent's
+    peak), so VmHWM, which belongs to the new address space, is preferred.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 if sys.platform == "darwin" else maxrss  # bytes on macOS
+
+
+def child(method: str, path: str):
+    """Child process body for peak_rss_mb"""
+    data = Path(path).read_bytes()
+    before = _peak_rss_kb()
+    fn = decode_image if method == "reduced" else decode_image_full
+    fn(data).resize((224, 224), Image.Resampling.BILINEAR)
+    print(json.dumps({"peak_rss_mb": (_peak_rss_kb() - before) / 1024}))
+
+
+def load_model(model_path: str):
+    """The trained checkpoint if it loads, else a fixed-seed untrained ResNet18 (still compares decodes)"""
+    import torch
+    import torch.nn as nn
+    from torchvision import models
+
+    model = models.resnet18(weights=None)
+    try:
+        checkpoint = torch.load(model_path, map_location="cpu", weights_only=False)
+        state_dict = checkpoint.get("model_state_dict", checkpoint)
+        model.fc = nn.Linear(model.fc.in_features, state_dict["fc.weight"].shape[0])
+        model.load_state_dict(state_dict)
+        label = model_path
+    except Exception as e:
+        torch.manual_seed(0)
+        model = models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, 124)
+        label = f"untrained ResNet18 (could not load {model_path}: {type(e).__name__})"
+    return model.eval(), label
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs reduced-resolution image decode")
+    parser.add_argument("--images", nargs="*", help="Images to test (default: 12 MP versions of assets/*)")
+    parser.add_argument("--model", default=str(Path(__file__).resolve().parent.parent / "models" / "stable_cattle_model.pth"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    import torch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = args.images or build_phone_images(tmp)
+        model, model_label = load_model(args.model)
+
+        print("🖼️ Image decode benchmark")
+        print(f"Accuracy model: {model_label}")
+        print("=" * 104)
+        print(f"{'image':>32} | {'full ms':>8} {'full MB':>8} | {'reduced ms':>10} {'reduced MB':>10} | "
+              f"{'speedup':>7} | {'top1':>5} {'max dp':>7}")
+        print("-" * 104)
+
+        agree = 0
+        for path in paths:
+            data = Path(path).read_bytes()
+            full_ms = time_decode(decode_image_full, data, args.repeat)
+            reduced_ms = time_decode(decode_image, data, args.repeat)
+            full_mb = peak_rss_mb("full", path)
+            reduced_mb = peak_rss_mb("reduced", path)
+
+            # Reference keeps full resolution but is made upright too, so only resolution differs
+            reference = ImageOps.exif_transpose(decode_image_full(data))
+            batch = torch.stack([preprocess(reference), preprocess(decode_image(data))])
+            with torch.no_grad():
+                probs = torch.softmax(model(batch), dim=1)
+            same_top1 = bool(probs[0].argmax() == probs[1].argmax())
+            agree += same_top1
+            max_dp = (probs[0] - probs[1]).abs().max().item()
+
+            print(f"{Path(path).name[-32:]:>32} | {full_ms:>8.1f} {full_mb:>8.1f} | {reduced_ms:>10.1f} "
+                  f"{reduced_mb:>10.1f} | {full_ms / reduced_ms:>6.1f}x | {'same' if same_top1 else 'DIFF':>5} "
+                  f"{max_dp:>7.4f}")
+
+        print("-" * 104)
+        print(f"Top-1 agreement: {agree}/{len(paths)}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
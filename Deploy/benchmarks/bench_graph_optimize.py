@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Graph Optimization Benchmark and Equivalence Check
+Compares the checkpoint model with its graph_optimize.py versions (Conv+BN fused, and with the ImageNet normalization
+folded into conv1) on the app's sample photos and random inputs, eager and frozen TorchScript, then times them.
+Exits with status 1 if an optimized model's logits differ by more than --tolerance or its top-1 predictions change.
+
+Usage: python benchmarks/bench_graph_optimize.py [--checkpoint ../models/stable_cattle_model.pth] [--repeat 20]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from export_model import SAMPLE_IMAGES_DIR
+from graph_optimize import optimize_model
+from image_decode import decode_image
+from model_loading import build_resnet18, load_eager
+from preprocessing import Preprocessor
+
+DEFAULT_CHECKPOINT = str(Path(__file__).resolve().parent.parent / "models" / "stable_cattle_model.pth")
+
+
+def load_model(checkpoint: str):
+    """The checkpoint if it loads, else a fixed-seed ResNet18 with random BatchNorm statistics"""
+    try:
+        return load_eager(checkpoint, "cpu", channels_last=True).module, checkpoint
+    except Exception as e:
+        torch.manual_seed(0)
+        model = build_resnet18(124)
+        for module in model.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                # Untrained statistics are 0/1, which would make the fusion trivially exact
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.2, 0.2)
+        model.to(memory_format=torch.channels_last).eval()
+        return model, f"untrained ResNet18, seed 0 ({type(e).__name__} loading {checkpoint})"
+
+
+def script(model):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.script(model)))
+
+
+def inputs(limit: int = 8):
+    """(normalized, pixel/255) channels-last batches of the sample photos followed by random images"""
+    normalized, scaled = Preprocessor(channels_last=True), Preprocessor(channels_last=True, normalize=False)
+    paths = sorted(SAMPLE_IMAGES_DIR.glob("*.jpg")) + sorted(SAMPLE_IMAGES_DIR.glob("*.png"))
+    pixels = [normalized.pixels(decode_image(str(path))) for path in paths[:limit]]
+    generator = torch.Generator().manual_seed(0)
+    pixels += [torch.randint(0, 256, (224, 224, 3), dtype=torch.uint8, generator=generator)
+               for _ in range(limit - len(pixels))]
+    return normalized.batch(pixels).clone(), scaled.batch(pixels).clone()
+
+
+def median_ms(model, batch: torch.Tensor, repeat: int) -> float:
+    for _ in range(3):
+        model(batch)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model(batch)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the inference graph optimizations")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Largest allowed logit difference")
+    args = parser.parse_args()
+
+    model, label = load_model(args.checkpoint)
+    normalized, scaled = inputs()
+    variants = [
+        ("eager", model, False),
+        ("eager conv+bn fused", optimize_model(model), False),
+        ("eager fused + folded norm", optimize_model(model, fold_normalization=True), True),
+    ]
+    variants += [(f"torchscript{name[5:]}", script(module), folded) for name, module, folded in variants]
+
+    print("🧮 Graph optimization benchmark (CPU)")
+    print(f"Model: {label}")
+    print("=" * 92)
+    print(f"{'variant':>32} | {'max diff':>9} | {'top-1':>6} | {'BN layers':>9} | {'b1 ms':>7} | {'b8 ms':>7}")
+    print("-" * 92)
+
+    failed = False
+    with torch.no_grad():
+        reference = model(normalized)
+        for name, module, folded in variants:
+            batch = scaled if folded else normalized
+            output = module(batch)
+            max_diff = (output - reference).abs().max().item()
+            agreement = (output.argmax(dim=1) == reference.argmax(dim=1)).float().mean().item()
+            failed |= max_diff > args.tolerance or agreement < 1.0
+            bn_layers = (sum(isinstance(m, torch.nn.BatchNorm2d) for m in module.modules())
+                         if not isinstance(module, torch.jit.ScriptModule) else "-")
+            single = batch[:1].contiguous(memory_format=torch.channels_last)
+            print(f"{name:>32} | {max_diff:>9.2e} | {agreement:>6.0%} | {bn_layers:>9} | "
+                  f"{median_ms(module, single, args.repeat):>7.1f} | {median_ms(module, batch, args.repeat):>7.1f}")
+
+    # What folding saves on the preprocessing side: the mean shift of the fused normalize
+    pixels = [torch.randint(0, 256, (224, 224, 3), dtype=torch.uint8) for _ in range(8)]
+    for name, preprocessor in (("normalize (addcmul)", Preprocessor(channels_last=True)),
+                               ("scale only (mul)", Preprocessor(channels_last=True, normalize=False))):
+        print(f"{'preprocess ' + name:>32} | {'':>9} | {'':>6} | {'':>9} | {'':>7} | "
+              f"{median_ms(preprocessor.batch, pixels, args.repeat):>7.2f}")
+
+    print("-" * 92)
+    if failed:
+        print(f"❌ An optimized model differs from the original (tolerance {args.tolerance:g})")
+        sys.exit(1)
+    print(f"✅ All optimized models match the original (tolerance {args.tolerance:g}, same top-1)")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Local Inference Benchmark
+Per-image latency for a script on the server's host, three ways: loading the model in-process (predict_cattle.py
+without a daemon), through the server's Unix socket daemon (--uds), and over HTTP (POST /predict on the TCP port).
+Each mode runs in fresh processes, so the cold column is what a one-off script pays from start to its first
+prediction (imports, model load or connect); the per-image columns are the steady state after that.
+
+Needs a server started with --uds for the daemon and HTTP modes, e.g. python robust_cattle_server.py --uds
+
+Usage: python benchmarks/bench_local_inference.py [--socket /tmp/cattle_ai.sock] [--url http://127.0.0.1:8001]
+                                                  [--model models/stable_cattle_model.pth] [--repeat 50]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "src"))
+
+from uds_daemon import default_socket_path
+
+DEFAULT_MODEL = str(Path(__file__).resolve().parent.parent / "models" / "stable_cattle_model.pth")
+MODES = ("inprocess", "daemon", "http")
+
+
+def child(mode: str, directory: str, args):
+    """Fresh-process body: time to the first prediction, then per-image latency over --repeat images"""
+    started = time.perf_counter()
+    paths = sorted(str(path) for path in Path(directory).iterdir())
+    if mode == "http":
+        def predict(path):
+            with open(path, "rb") as f:
+                # Trailing bytes keep the server's prediction cache out of the measurement
+                data = f.read() + os.urandom(16)
+            request = urllib.request.Request(f"{args.url}/predict", data=data, method="POST",
+                                             headers={"Content-Type": "image/jpeg"})
+            with urllib.request.urlopen(request, timeout=30) as response:
+                result = json.loads(response.read())
+            if "error" in result:
+                raise RuntimeError(result["error"])
+    else:
+        from predict_cattle import CattlePredictor
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor = CattlePredictor(args.model, socket_path=args.socket, use_daemon=mode == "daemon")
+        if (mode == "daemon") != (predictor.daemon is not None):
+            raise SystemExit(f"❌ No inference daemon on {args.socket}" if mode == "daemon" else "❌ Used the daemon")
+
+        def predict(path):
+            _, predictions, error = next(predictor.predict_files([path], 3, batch_size=1, workers=0))
+            if error:
+                raise RuntimeError(error)
+
+    predict(paths[0])
+    first = time.perf_counter() - started
+
+    latencies = []
+    for i in range(args.repeat):
+        image_started = time.perf_counter()
+        predict(paths[i % len(paths)])
+        latencies.append((time.perf_counter() - image_started) * 1000)
+    latencies.sort()
+    print(json.dumps({
+        "first_s": first,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p90_ms": latencies[int(len(latencies) * 0.9)],
+        "mean_ms": statistics.fmean(latencies),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-process vs Unix socket daemon vs HTTP predictions")
+    parser.add_argument("--socket", default=default_socket_path(), help="Daemon socket (server --uds)")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Server base URL")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Checkpoint for the in-process mode")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--sizes", nargs="+", default=["original"],
+                        help="Image sizes: 'original' and/or the longest side in pixels of a re-encoded JPEG")
+    parser.add_argument("--repeat", type=int, default=50, help="Images per process after the first")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per mode (results are medians)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args)
+        return
+
+    from loadgen import load_payloads
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, payload in enumerate(load_payloads(args.sizes)):
+            Path(tmp, f"{i:03d}.img").write_bytes(payload.data)
+
+        print("⏱️ Local inference benchmark")
+        print(f"Daemon: {args.socket}   HTTP: {args.url}   In-process: {args.model}")
+        print("=" * 62)
+        print(f"{'mode':>10} | {'cold s':>7} | {'p50 ms':>8} {'p90 ms':>8} {'mean ms':>8} {'img/s':>7}")
+        print("-" * 62)
+
+        for mode in args.modes:
+            runs = []
+            for _ in range(args.runs):
+                command = [sys.executable, __file__, "--child", mode, tmp, "--repeat", str(args.repeat),
+                           "--socket", args.socket, "--url", args.url, "--model", args.model]
+                result = subprocess.run(command, capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"{mode:>10} | failed: {(result.stdout + result.stderr).strip().splitlines()[-1]}")
+                    break
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            if len(runs) < args.runs:
+                continue
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            print(f"{mode:>10} | {median['first_s']:>7.2f} | {median['p50_ms']:>8.1f} {median['p90_ms']:>8.1f} "
+                  f"{median['mean_ms']:>8.1f} {1000 / median['mean_ms']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
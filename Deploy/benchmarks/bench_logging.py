@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Logging Overhead Benchmark
+Measures /predict throughput of the threaded robust server with logging off, queued (background writer) and synchronous.
+
+The "-console" modes log every DEBUG record (about the volume of the old per-request
+print calls) to a simulated terminal that takes --console-latency-us per write, which is
+where synchronous print/StreamHandler output serializes the handler threads.
+
+Usage: python benchmarks/bench_logging.py [--concurrency 16] [--seconds 5]
+"""
+
+import argparse
+import http.client
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import robust_cattle_server as server
+from admission import AdmissionController
+from server_logging import JsonLinesFormatter, RequestContextFilter, get_logger, setup_logging, stop_logging
+
+BOUNDARY = "dart-http-boundary-benchmark0123456789"
+
+
+def build_body() -> bytes:
+    """A small Flutter-style upload so request handling, not image decoding, dominates"""
+    payload = b'\xff\xd8\xff\xe0' + os.urandom(4 * 1024)
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="photo.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class SlowConsole(io.TextIOBase):
+    """Stand-in for a terminal: every write blocks for a fixed time"""
+
+    def __init__(self, latency_us: float):
+        self.latency = latency_us / 1e6
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        time.sleep(self.latency)
+        return len(text)
+
+
+def configure(mode: str, log_dir: str, console_latency_us: float):
+    """Set up the cattle loggers for one benchmark mode"""
+    stop_logging()
+    log_file = os.path.join(log_dir, f"{mode}.jsonl")
+    if mode == "off":
+        setup_logging(level="WARNING", console=False)
+    elif mode == "queued":
+        setup_logging(level="INFO", log_file=log_file, console=False)
+    elif mode == "queued-debug":
+        setup_logging(level="DEBUG", log_file=log_file, console=False, debug_sample_rate=1.0)
+    elif mode == "queued-console":
+        setup_logging(level="DEBUG", console_stream=SlowConsole(console_latency_us), debug_sample_rate=1.0)
+    else:
+        # Synchronous: format and write on the request thread, like the old print calls
+        if mode == "sync-console":
+            handler = logging.StreamHandler(SlowConsole(console_latency_us))
+        else:
+            handler = logging.FileHandler(log_file, encoding="utf-8")
+        handler.setFormatter(JsonLinesFormatter())
+        handler.addFilter(RequestContextFilter())
+        logger = get_logger()
+        logger.handlers = [handler]
+        logger.setLevel(logging.DEBUG if mode in ("sync-debug", "sync-console") else logging.INFO)
+        logger.propagate = False
+
+
+def run_load(port: int, body: bytes, concurrency: int, seconds: float):
+    """Closed-loop clients posting to /predict; returns (requests completed, errors)"""
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", "Content-Length": str(len(body))}
+    deadline = time.perf_counter() + seconds
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+
+    def client(index):
+        while time.perf_counter() < deadline:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                conn.request("POST", "/predict", body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                conn.close()
+                if response.status == 200:
+                    counts[index] += 1
+                else:
+                    errors[index] += 1
+            except OSError:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts), sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request throughput with logging on and off")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", default=["off", "queued", "sync", "queued-console", "sync-console",
+                                                       "queued-debug", "sync-debug"])
+    parser.add_argument("--console-latency-us", type=float, default=200.0)
+    args = parser.parse_args()
+
+    # Mock-prediction model: keeps the measurement on the request path and its logging
+    server.model_instance = server.CattleBreedModel("missing.pth", "missing.json")
+    server.model_instance.breeds = ["Gir", "Sahiwal", "Ongole"]
+    server.admission = AdmissionController(max_in_flight=args.concurrency, max_queue=args.concurrency * 4,
+                                           per_client_limit=0)
+
+    httpd = server.ThreadedHTTPServer(("127.0.0.1", 0), server.CattleAIHandler)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    body = build_body()
+
+    print("🪵 Logging overhead benchmark")
+    print("=" * 60)
+    print(f"{'mode':>14} | {'req/s':>8} | {'errors':>6} | {'vs off':>7} | {'log MB':>7}")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        baseline = None
+        for mode in args.modes:
+            configure(mode, log_dir, args.console_latency_us)
+            run_load(port, body, args.concurrency, 0.5)  # warm up connections and threads
+            completed, errors = run_load(port, body, args.concurrency, args.seconds)
+            stop_logging()
+            for handler in get_logger().handlers:
+                handler.close()
+            log_file = os.path.join(log_dir, f"{mode}.jsonl")
+            log_mb = os.path.getsize(log_file) / (1024 * 1024) if os.path.exists(log_file) else 0.0
+
+            rate = completed / args.seconds
+            baseline = baseline or rate
+            print(f"{mode:>14} | {rate:>8.1f} | {errors:>6} | {rate / baseline:>6.2f}x | {log_mb:>7.2f}")
+
+    httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
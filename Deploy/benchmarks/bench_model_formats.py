@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Model Format Benchmark
+Cold start (fresh process: import, load, first prediction) and CPU forward latency for each serving format
+and backend (eager, TorchScript and memory-mapped slim files on PyTorch, the ONNX export on ONNX Runtime).
+RSS is split out into anonymous (private) memory; mapped weights count as shared page cache.
+
+Usage: python benchmarks/bench_model_formats.py [--checkpoint ../models/stable_cattle_model.pth] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_CHECKPOINT = str(Path(__file__).resolve().parent.parent / "models" / "stable_cattle_model.pth")
+FORMATS = ("eager", "torchscript", "onnxruntime", "slim", "slim-fp16")
+
+
+def _rss_mb(field: str = "VmRSS") -> float:
+    """A /proc/self/status memory field; RssAnon is private memory, RssFile is shared with the page cache"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return float(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def child(model_format: str, path: str, repeat: int):
+    """Fresh-process body: time imports, load, first forward, then steady-state latency"""
+    started = time.perf_counter()
+    if model_format == "onnxruntime":
+        # Same imports as the onnxruntime servers (preprocessing still pulls in torch when it is installed)
+        import numpy as np
+        from backends import OnnxRuntimeBackend
+        imported = time.perf_counter()
+        backend = OnnxRuntimeBackend(path)
+        loaded_at = time.perf_counter()
+        single = np.random.randn(1, 3, 224, 224).astype(np.float32)
+        batch = np.random.randn(8, 3, 224, 224).astype(np.float32)
+        model = backend.forward
+    else:
+        import torch
+        import model_loading
+        imported = time.perf_counter()
+        if model_format == "eager":
+            loaded = model_loading.load_eager(path, "cpu", channels_last=True)
+        elif model_format.startswith("slim"):
+            loaded = model_loading.load_slim(path, "cpu")
+        else:
+            loaded = model_loading.load_torchscript(path, "cpu")
+        module = loaded.module
+        loaded_at = time.perf_counter()
+        single = torch.randn(1, 3, 224, 224).contiguous(memory_format=torch.channels_last)
+        batch = torch.randn(8, 3, 224, 224).contiguous(memory_format=torch.channels_last)
+        torch.set_grad_enabled(False)
+        model = module
+
+    model(single)
+    first = time.perf_counter()
+    # Whole process until the first prediction: interpreter start + imports + load + first forward
+    process_s = time.time() - float(os.environ.get("BENCH_LAUNCHED_AT", time.time()))
+
+    latency = {}
+    for name, inputs in (("b1", single), ("b8", batch)):
+        for _ in range(3):
+            model(inputs)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model(inputs)
+            times.append(time.perf_counter() - start)
+        latency[name] = statistics.median(times) * 1000
+
+    print(json.dumps({
+        "import_s": imported - started,
+        "load_s": loaded_at - imported,
+        "first_s": first - loaded_at,
+        "process_s": process_s,
+        "b1_ms": latency["b1"],
+        "b8_ms": latency["b8"],
+        "rss_mb": _rss_mb(),
+        "anon_mb": _rss_mb("RssAnon"),
+    }))
+
+
+def prepare(checkpoint: str, out_dir: str):
+    """Model file for each format, exporting into ``out_dir`` when missing"""
+    from backends import onnx_path
+    from model_loading import exported_path
+    paths = {"eager": checkpoint, "torchscript": exported_path(checkpoint), "onnxruntime": onnx_path(checkpoint)}
+    if not os.path.exists(paths["torchscript"]):
+        from export_model import export_torchscript
+        paths["torchscript"] = os.path.join(out_dir, "model.torchscript.pt")
+        export_torchscript(checkpoint, paths["torchscript"])
+    if not os.path.exists(paths["onnxruntime"]):
+        from export_model import export_onnx
+        paths["onnxruntime"] = os.path.join(out_dir, "model.onnx")
+        export_onnx(checkpoint, paths["onnxruntime"])
+    from export_model import export_slim
+    for model_format, fp16 in (("slim", False), ("slim-fp16", True)):
+        paths[model_format] = os.path.join(out_dir, f"model.{model_format}.safetensors")
+        export_slim(checkpoint, paths[model_format], fp16=fp16)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start and latency of the serving model formats")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per format (cold start is the median)")
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = prepare(args.checkpoint, tmp)
+
+        print("⏱️ Model format benchmark (CPU)")
+        print(f"Checkpoint: {args.checkpoint}")
+        print("=" * 109)
+        print(f"{'format':>12} | {'MB':>6} | {'process s':>9} {'import s':>8} {'load s':>7} {'first s':>7} | "
+              f"{'b1 ms':>7} {'b8 ms':>7} {'img/s':>6} | {'RSS MB':>6} {'anon MB':>7}")
+        print("-" * 109)
+
+        for model_format in args.formats:
+            runs = []
+            for _ in range(args.runs):
+                env = dict(os.environ, BENCH_LAUNCHED_AT=repr(time.time()))
+                output = subprocess.run([sys.executable, __file__, "--child", model_format, paths[model_format],
+                                         "--repeat", str(args.repeat)],
+                                        capture_output=True, text=True, check=True, env=env).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            size_mb = os.path.getsize(paths[model_format]) / 1024 / 1024
+            print(f"{model_format:>12} | {size_mb:>6.1f} | {median['process_s']:>9.2f} {median['import_s']:>8.2f} "
+                  f"{median['load_s']:>7.2f} {median['first_s']:>7.2f} | {median['b1_ms']:>7.1f} "
+                  f"{median['b8_ms']:>7.1f} {8000 / median['b8_ms']:>6.1f} | {median['rss_mb']:>6.0f} "
+                  f"{median['anon_mb']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
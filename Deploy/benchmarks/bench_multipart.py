@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Multipart Parser Micro-Benchmark
+Compares the streaming memoryview parser with the previous email-module approach on phone-sized uploads.
+
+Usage: python benchmarks/bench_multipart.py [--sizes-mb 1 2 5 10] [--repeat 5]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from multipart_utils import MultipartReader, get_boundary, parse_multipart_email
+
+BOUNDARY = "dart-http-boundary-benchmark0123456789"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def build_body(size: int) -> bytes:
+    """A Flutter-style upload: one 'file' part of random JPEG-looking bytes"""
+    payload = b'\xff\xd8\xff\xe0' + os.urandom(size - 4)
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="photo.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def parse_email(body: bytes):
+    """Previous server path: read the whole body, then parse it with the email module"""
+    rfile = io.BufferedReader(io.BytesIO(body))
+    post_data = rfile.read(len(body))
+    parts = parse_multipart_email(CONTENT_TYPE, post_data)
+    return next(part["data"] for part in parts if part["name"] == "file")
+
+
+def parse_streaming(body: bytes):
+    """New server path: stream the body into one buffer and slice the parts out of it"""
+    rfile = io.BufferedReader(io.BytesIO(body))
+    parts = MultipartReader(get_boundary(CONTENT_TYPE), max_bytes=len(body)).read(rfile, len(body))
+    return next(part.data for part in parts if part.name == "file")
+
+
+def measure(fn, body: bytes, repeat: int):
+    """Median wall time (ms) and peak Python allocation (MB) for one parser"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(body)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multipart upload parsing")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("📦 Multipart parser benchmark")
+    print("=" * 72)
+    print(f"{'upload':>8} | {'email ms':>9} {'email MB':>9} | {'stream ms':>9} {'stream MB':>9} | {'speedup':>7}")
+    print("-" * 72)
+
+    for size_mb in args.sizes_mb:
+        body = build_body(int(size_mb * 1024 * 1024))
+        assert bytes(parse_streaming(body)) == parse_email(body)
+
+        email_ms, email_mb = measure(parse_email, body, args.repeat)
+        stream_ms, stream_mb = measure(parse_streaming, body, args.repeat)
+        print(f"{size_mb:>6g}MB | {email_ms:>9.2f} {email_mb:>9.1f} | {stream_ms:>9.2f} {stream_mb:>9.1f} | "
+              f"{email_ms / stream_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
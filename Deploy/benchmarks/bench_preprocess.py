@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Preprocessing Benchmark
+Compares the shared Preprocessor with the previous torchvision Compose (robust server, CLI, trainer)
+and the previous NumPy path of simple_ai_server.py, from decoded image to model-ready batch.
+
+Usage: python benchmarks/bench_preprocess.py [--batch-size 16] [--repeat 50]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import torch
+from torchvision import transforms
+
+from image_decode import decode_image
+from preprocessing import IMAGENET_MEAN, IMAGENET_STD, RESAMPLE_BILINEAR, Preprocessor
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / "assets"
+
+TORCHVISION_TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=list(IMAGENET_MEAN), std=list(IMAGENET_STD)),
+])
+
+
+def torchvision_batch(images):
+    """Previous robust server / CLI / trainer path"""
+    return torch.stack([TORCHVISION_TRANSFORM(image) for image in images])
+
+
+def numpy_batch(images):
+    """Previous simple_ai_server.py path"""
+    tensors = []
+    for image in images:
+        image = image.resize((224, 224))
+        img_array = np.array(image).astype(np.float32) / 255.0
+        img_array = np.transpose(img_array, (2, 0, 1))
+        mean = np.array([0.485, 0.456, 0.406])
+        std = np.array([0.229, 0.224, 0.225])
+        for c in range(3):
+            img_array[c] = (img_array[c] - mean[c]) / std[c]
+        tensors.append(torch.from_numpy(img_array))
+    return torch.stack(tensors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing paths")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    torch.set_num_threads(1)  # per-request work runs on one handler/decode thread
+
+    # Images as the servers see them after the reduced-resolution decode
+    sources = sorted(ASSETS_DIR.glob("*.jpg")) + sorted(ASSETS_DIR.glob("*.png"))
+    images = [decode_image(str(sources[i % len(sources)])) for i in range(args.batch_size)]
+
+    contiguous = Preprocessor()
+    channels_last = Preprocessor(channels_last=True)
+    pixels = [contiguous.pixels(image) for image in images]
+    resized = [image.resize((224, 224), RESAMPLE_BILINEAR) for image in images]
+
+    methods = [
+        ("torchvision Compose + stack", lambda: torchvision_batch(images)),
+        ("numpy loop (simple server)", lambda: numpy_batch(images)),
+        ("Preprocessor", lambda: contiguous.batch([contiguous.pixels(image) for image in images])),
+        ("Preprocessor channels-last", lambda: channels_last.batch([channels_last.pixels(image) for image in images])),
+        ("  normalize only (fused)", lambda: contiguous.batch(pixels)),
+        ("  normalize only (ToTensor+Norm)", lambda: torch.stack([
+            transforms.functional.normalize(transforms.functional.to_tensor(image), IMAGENET_MEAN, IMAGENET_STD)
+            for image in resized])),
+    ]
+    reference = torchvision_batch(images)
+
+    print("🧪 Preprocessing benchmark")
+    print(f"Batch of {args.batch_size} decoded images, median of {args.repeat} runs, 1 thread")
+    print("=" * 86)
+    print(f"{'method':>34} | {'batch ms':>9} | {'us/image':>9} | {'vs Compose':>10} | {'max diff':>9}")
+    print("-" * 86)
+
+    baseline = None
+    for name, fn in methods:
+        output = fn()
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        batch_ms = statistics.median(times) * 1000
+        baseline = baseline or batch_ms
+        max_diff = (output - reference).abs().max().item()
+        print(f"{name:>34} | {batch_ms:>9.2f} | {batch_ms * 1000 / args.batch_size:>9.1f} | "
+              f"{baseline / batch_ms:>9.2f}x | {max_diff:>9.2e}")
+
+    first = contiguous.batch(pixels).data_ptr()
+    reused = all(contiguous.batch(pixels).data_ptr() == first for _ in range(3))
+    print("-" * 86)
+    print(f"Batch buffer reused across calls: {reused}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Stage Micro-Benchmark Suite
+Times every inference stage (multipart parse, decode, preprocess, forward at batch 1/8/32, top-k, JSON encode) for each
+available backend, plus the training data pipeline, and compares the medians with a stored baseline for this machine.
+Runs offline: without the checkpoint it uses a randomly initialized ResNet18, which has the same cost.
+
+The first run on a machine (or --update-baseline) saves benchmarks/baselines/<fingerprint>.json, where the
+fingerprint covers the CPU, thread count and library versions; later runs exit 1 when a stage is slower than its
+baseline by more than --tolerance.
+
+Usage: python benchmarks/bench_stages.py [--checkpoint models/stable_cattle_model.pth]
+                                         [--backends eager torchscript onnxruntime] [--stages forward decode]
+                                         [--tolerance 0.25] [--update-baseline] [--quick]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import PIL
+import torch
+
+from backends import OnnxRuntimeBackend, TorchBackend
+from image_decode import decode_image
+from model_loading import build_resnet18, load_eager, load_torchscript
+from multipart_utils import MultipartReader, get_boundary
+from preprocessing import Preprocessor
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / "assets"
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+DEFAULT_CHECKPOINT = Path(__file__).resolve().parent.parent / "models" / "stable_cattle_model.pth"
+
+BACKENDS = ("eager", "torchscript", "onnxruntime")
+FORWARD_BATCH_SIZES = (1, 8, 32)
+NUM_CLASSES = 124
+
+# Changes smaller than this are timer noise, whatever the relative change
+MIN_REGRESSION_MS = 0.05
+
+BOUNDARY = "dart-http-boundary-benchmark0123456789"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def machine_fingerprint(threads: int) -> Dict[str, Any]:
+    """What the timings depend on besides the code: CPU, thread count and library versions"""
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    try:
+        import onnxruntime
+        ort_version = onnxruntime.__version__
+    except ImportError:
+        ort_version = None
+    details = {
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "threads": threads,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "onnxruntime": ort_version,
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+    }
+    details["id"] = hashlib.sha256(json.dumps(details, sort_keys=True).encode()).hexdigest()[:12]
+    return details
+
+
+def time_stage(fn: Callable[[], Any], repeat: int, max_seconds: float, warmup: int = 2) -> Dict[str, float]:
+    """Median and p90 wall time (ms) of ``fn()`` over up to ``repeat`` runs (at least 3, within ``max_seconds``)"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    deadline = time.perf_counter() + max_seconds
+    while len(times) < repeat and (len(times) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"median_ms": round(statistics.median(times), 4),
+            "p90_ms": round(times[min(len(times) - 1, int(len(times) * 0.9))], 4),
+            "runs": len(times)}
+
+
+def sample_files() -> Dict[str, bytes]:
+    """The largest bundled JPEG and PNG"""
+    files = {}
+    for kind, pattern in (("jpeg", "*.jpg"), ("png", "*.png")):
+        paths = sorted(ASSETS_DIR.glob(pattern), key=lambda path: path.stat().st_size)
+        if paths:
+            files[kind] = paths[-1].read_bytes()
+    if not files:
+        raise SystemExit(f"❌ No sample images in {ASSETS_DIR}")
+    return files
+
+
+def random_checkpoint(directory: Path) -> Path:
+    """A seeded, randomly initialized ResNet18 saved like a training checkpoint"""
+    torch.manual_seed(0)
+    path = directory / "random_resnet18.pth"
+    torch.save({"model_state_dict": build_resnet18(NUM_CLASSES).state_dict(),
+                "classes": [f"Breed_{i}" for i in range(NUM_CLASSES)]}, path)
+    return path
+
+
+def usable_checkpoint(path: Path) -> bool:
+    """True if ``path`` exists and loads (not e.g. a Git LFS pointer)"""
+    try:
+        load_eager(path, "cpu")
+        return True
+    except Exception:
+        return False
+
+
+def load_backend(name: str, checkpoint: Path, workdir: Path):
+    """(backend, channels_last) for one of BACKENDS, exported into ``workdir`` when needed"""
+    device = torch.device("cpu")
+    if name == "eager":
+        return TorchBackend(load_eager(checkpoint, device, channels_last=True), device), True
+    if name == "torchscript":
+        from export_model import export_torchscript
+        output = workdir / "model.torchscript.pt"
+        export_torchscript(str(checkpoint), str(output))
+        return TorchBackend(load_torchscript(output, device), device), True
+    from export_model import export_onnx
+    output = workdir / "model.onnx"
+    export_onnx(str(checkpoint), str(output))
+    return OnnxRuntimeBackend(str(output), intra_op_threads=torch.get_num_threads()), False
+
+
+def result_dicts(top_probs: List[List[float]], top_indices: List[List[int]]) -> List[Dict[str, Any]]:
+    """Response bodies as the servers build them"""
+    results = []
+    for probs, indices in zip(top_probs, top_indices):
+        top_predictions = [{"breed": f"Breed_{idx}", "confidence": prob} for prob, idx in zip(probs, indices)]
+        results.append({"prediction": top_predictions[0]["breed"], "confidence": top_predictions[0]["confidence"],
+                        "top_predictions": top_predictions, "status": "success", "model_version": "0123456789ab"})
+    return results
+
+
+def multipart_body(data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="photo.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def parse_upload(body: bytes):
+    parts = MultipartReader(get_boundary(CONTENT_TYPE), max_bytes=len(body)).read(
+        io.BufferedReader(io.BytesIO(body)), len(body))
+    return next(part.data for part in parts if part.name == "file")
+
+
+def training_loader_stage(workdir: Path, images: List[Path], num_workers: int, batch_size: int = 8):
+    """ms per batch for one epoch of the trainer's ImageFolder + DataLoader over copies of the sample photos"""
+    from torch.utils.data import DataLoader
+    from torchvision import datasets
+
+    root = workdir / "train"
+    if not root.exists():
+        for index in range(64):
+            source = images[index % len(images)]
+            target = root / f"class_{index % 4}" / f"{index:03d}{source.suffix}"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(source.read_bytes())
+    dataset = datasets.ImageFolder(str(root), transform=Preprocessor(), loader=decode_image)
+    batches = (len(dataset) + batch_size - 1) // batch_size
+
+    def epoch():
+        for _ in DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers):
+            pass
+
+    return epoch, batches
+
+
+def run_stages(args, workdir: Path) -> Dict[str, Dict[str, float]]:
+    """Time every selected stage; returns {stage: timings}"""
+    results = {}
+
+    def selected(stage: str) -> bool:
+        return not args.stages or any(stage.startswith(prefix) or f"/{prefix}" in stage for prefix in args.stages)
+
+    def record(stage: str, fn: Callable[[], Any], per: int = 1):
+        if not selected(stage):
+            return
+        timings = time_stage(fn, args.repeat, args.max_seconds)
+        if per > 1:
+            timings = {key: round(value / per, 4) if key != "runs" else value for key, value in timings.items()}
+        results[stage] = timings
+        print(f"   {stage:<28} {timings['median_ms']:>10.3f} ms  (p90 {timings['p90_ms']:.3f}, {timings['runs']} runs)")
+
+    files = sample_files()
+    upload = files.get("jpeg") or files["png"]
+    body = multipart_body(upload)
+    record("multipart/parse", lambda: parse_upload(body))
+    for kind, data in files.items():
+        record(f"decode/{kind}", lambda data=data: decode_image(data))
+    image = decode_image(upload)
+
+    if usable_checkpoint(args.checkpoint):
+        checkpoint = args.checkpoint
+        print(f"🧠 Model: {checkpoint}")
+    else:
+        checkpoint = random_checkpoint(workdir)
+        print(f"🧠 Model: random ResNet18 ({args.checkpoint} is missing or does not load)")
+    top = None
+    backend_stages = ["preprocess_b1", "topk_b32"] + [f"forward_b{size}" for size in FORWARD_BATCH_SIZES]
+    for name in args.backends:
+        if not any(selected(f"{name}/{stage}") for stage in backend_stages):
+            continue
+        try:
+            backend, channels_last = load_backend(name, checkpoint, workdir)
+        except Exception as e:
+            print(f"   ⚠️ {name}: unavailable ({type(e).__name__}: {e})")
+            continue
+        preprocessor = backend.make_preprocessor(channels_last)
+        record(f"{name}/preprocess_b1", lambda: preprocessor.batch([preprocessor.pixels(image)]))
+        pixels = preprocessor.pixels(image)
+        for batch_size in FORWARD_BATCH_SIZES:
+            batch = preprocessor.batch([pixels] * batch_size)
+            batch = batch.copy() if isinstance(batch, np.ndarray) else batch.clone(memory_format=torch.preserve_format)
+            record(f"{name}/forward_b{batch_size}", lambda batch=batch: backend.forward(batch))
+        probabilities = backend.forward(batch)
+        record(f"{name}/topk_b{FORWARD_BATCH_SIZES[-1]}", lambda: backend.topk(probabilities, 3))
+        top = backend.topk(probabilities, 3)
+
+    if top is None:
+        probabilities = np.random.default_rng(0).random((FORWARD_BATCH_SIZES[-1], NUM_CLASSES), dtype=np.float32)
+        top = (np.sort(probabilities, axis=1)[:, ::-1][:, :3].tolist(), np.argsort(-probabilities)[:, :3].tolist())
+    single = result_dicts(top[0][:1], top[1][:1])[0]
+    batch_response = {"results": result_dicts(*top), "count": len(top[0]), "status": "success"}
+    # The servers send indented JSON
+    record("json/encode_b1", lambda: json.dumps(single, indent=2).encode("utf-8"))
+    record(f"json/encode_b{FORWARD_BATCH_SIZES[-1]}", lambda: json.dumps(batch_response, indent=2).encode("utf-8"))
+
+    images = sorted(ASSETS_DIR.glob("*.jpg")) + sorted(ASSETS_DIR.glob("*.png"))
+    for num_workers in (0, args.loader_workers):
+        epoch, batches = training_loader_stage(workdir, images, num_workers)
+        record(f"train/loader_w{num_workers}", epoch, per=batches)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """Print each stage against the baseline; returns the stages that regressed"""
+    regressions = []
+    print(f"\n{'stage':<28} | {'median ms':>10} | {'baseline':>10} | {'change':>8} |")
+    print("-" * 72)
+    for stage, timings in results.items():
+        current = timings["median_ms"]
+        reference = baseline.get(stage, {}).get("median_ms")
+        if reference is None:
+            print(f"{stage:<28} | {current:>10.3f} | {'-':>10} | {'new':>8} |")
+            continue
+        change = current / reference - 1.0 if reference else 0.0
+        regressed = change > tolerance and current - reference > MIN_REGRESSION_MS
+        if regressed:
+            regressions.append(stage)
+        print(f"{stage:<28} | {current:>10.3f} | {reference:>10.3f} | {change:>+7.1%} | "
+              f"{'❌ regression' if regressed else '✅'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every inference stage against a per-machine baseline")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT,
+                        help="Model to time (a random ResNet18 when it does not exist)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="Only stages whose name starts with or contains /PREFIX (e.g. forward decode train)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per stage")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Stop a stage after this long (min 3 runs)")
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads(), help="torch/ONNX Runtime threads")
+    parser.add_argument("--loader-workers", type=int, default=2, help="DataLoader workers for the training stage")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fail when a stage's median is more than this fraction slower than the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--baseline-dir", type=Path, default=BASELINES_DIR)
+    parser.add_argument("--quick", action="store_true", help="Fewer runs per stage (5, at most 2 s)")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.max_seconds = 5, 2.0
+    torch.set_num_threads(args.threads)
+    # DataLoader warns when --loader-workers exceeds the CPU count; the stage is timed either way
+    warnings.filterwarnings("ignore", message="This DataLoader will create")
+
+    fingerprint = machine_fingerprint(args.threads)
+    baseline_path = args.baseline_dir / f"{fingerprint['id']}.json"
+    print("⏱️ Stage benchmark suite")
+    print("=" * 72)
+    print(f"🖥️ {fingerprint['cpu']} | {args.threads} threads | torch {fingerprint['torch']} | "
+          f"onnxruntime {fingerprint['onnxruntime']} | fingerprint {fingerprint['id']}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_stages(args, Path(workdir))
+
+    baseline: Optional[Dict[str, Any]] = None
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+    regressions = compare(results, baseline["stages"] if baseline else {}, args.tolerance)
+
+    new_stages = [stage for stage in results if baseline is None or stage not in baseline["stages"]]
+    if args.update_baseline or new_stages:
+        # Stages without a baseline (new machine, backend or stage) are added; existing ones only on request
+        stages = dict(baseline["stages"]) if baseline else {}
+        stages.update(results if args.update_baseline else {stage: results[stage] for stage in new_stages})
+        args.baseline_dir.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({"machine": fingerprint, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                             "stages": stages}, indent=2) + "\n")
+        print(f"\n💾 Baseline saved to {baseline_path}")
+
+    if regressions and not args.update_baseline:
+        print(f"\n❌ {len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\n✅ No stage regressed by more than {args.tolerance:.0%} against {baseline_path.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+ONNX Export Equivalence Check
+Exports a fixed-seed, random-weight ResNet18 checkpoint with export_model.py's export_onnx and compares what the
+onnxruntime backend serves (NumPy preprocessing, ORT session, softmax and top-k) with the eager PyTorch model on the
+app's sample photos and random images, at several batch sizes. Needs torch, onnx and onnxruntime, not the trained
+checkpoint. Exits with status 1 if a logit differs by more than --tolerance or a top-k prediction changes.
+
+Usage: python benchmarks/check_onnx_export.py [--classes 124] [--top-k 5] [--tolerance 1e-3]
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import torch
+
+from backends import OnnxRuntimeBackend
+from export_model import MAX_LOGIT_DIFF, SAMPLE_IMAGES_DIR, export_onnx
+from image_decode import decode_image
+from model_loading import build_resnet18, load_eager
+from preprocessing import Preprocessor
+
+BATCH_SIZES = (1, 3, 8)
+
+
+def write_checkpoint(path: str, num_classes: int, seed: int):
+    """Training-format checkpoint of a ResNet18 with random weights and random BatchNorm statistics"""
+    torch.manual_seed(seed)
+    model = build_resnet18(num_classes)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            # Untrained statistics are 0/1, which would hide a mishandled BatchNorm
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.2, 0.2)
+    torch.save({"model_state_dict": model.state_dict(), "classes": [f"breed_{i}" for i in range(num_classes)],
+                "epoch": 0, "val_acc": 0.0}, path)
+
+
+def input_pixels(count: int, seed: int):
+    """HWC uint8 pixels of the sample photos followed by random images"""
+    preprocessor = Preprocessor()
+    paths = sorted(SAMPLE_IMAGES_DIR.glob("*.jpg")) + sorted(SAMPLE_IMAGES_DIR.glob("*.png"))
+    pixels = [preprocessor.pixels(decode_image(str(path))).numpy() for path in paths[:count]]
+    generator = np.random.default_rng(seed)
+    pixels += [generator.integers(0, 256, (224, 224, 3), dtype=np.uint8) for _ in range(count - len(pixels))]
+    return pixels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the ONNX export against the PyTorch model")
+    parser.add_argument("--classes", type=int, default=124, help="Output classes of the random model")
+    parser.add_argument("--top-k", type=int, default=5, help="Predictions compared per image")
+    parser.add_argument("--tolerance", type=float, default=MAX_LOGIT_DIFF, help="Largest allowed logit difference")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🔍 ONNX export equivalence check (random-weight ResNet18)")
+    print("=" * 72)
+    top_k = f"top-{args.top_k}"
+    print(f"{'batch':>6} | {'max logit diff':>14} | {'max prob diff':>13} | {'top-1':>6} | {top_k:>6}")
+    print("-" * 72)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint, output = str(Path(tmp, "model.pth")), str(Path(tmp, "model.onnx"))
+        write_checkpoint(checkpoint, args.classes, args.seed)
+        export_onnx(checkpoint, output)
+        eager = load_eager(checkpoint, "cpu").module
+        backend = OnnxRuntimeBackend(output)
+        if backend.classes != [f"breed_{i}" for i in range(args.classes)]:
+            print("❌ The class list embedded in the ONNX file does not match the checkpoint")
+            failed = True
+
+        # Each side uses its own serving preprocessing: torch for the eager model, NumPy for ORT
+        torch_preprocessor, numpy_preprocessor = Preprocessor(), Preprocessor(use_numpy=True)
+        pixels = input_pixels(max(BATCH_SIZES), args.seed)
+        for batch_size in BATCH_SIZES:
+            chunk = pixels[:batch_size]
+            with torch.no_grad():
+                logits = eager(torch_preprocessor.batch([torch.from_numpy(p) for p in chunk]))
+            expected_probs, expected_indices = torch.topk(torch.softmax(logits, dim=1), args.top_k, dim=1)
+            batch = numpy_preprocessor.batch(chunk)
+            onnx_logits = backend.session.run(None, {backend.input_name: batch})[0]
+            probs, indices = backend.topk(backend.forward(batch), args.top_k)
+
+            logit_diff = np.abs(onnx_logits - logits.numpy()).max()
+            prob_diff = np.abs(np.array(probs) - expected_probs.numpy()).max()
+            top1 = np.mean(np.array(indices)[:, 0] == expected_indices[:, 0].numpy())
+            topk = np.mean(np.all(np.array(indices) == expected_indices.numpy(), axis=1))
+            failed |= logit_diff > args.tolerance or topk < 1.0
+            print(f"{batch_size:>6} | {logit_diff:>14.2e} | {prob_diff:>13.2e} | {top1:>6.0%} | {topk:>6.0%}")
+
+    print("-" * 72)
+    if failed:
+        print(f"❌ The ONNX export differs from the PyTorch model (tolerance {args.tolerance:g})")
+        sys.exit(1)
+    print(f"✅ The ONNX export matches the PyTorch model (tolerance {args.tolerance:g}, same top-{args.top_k})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Load Generator for the Cattle AI Servers
+Drives /predict or /predict/batch on any of the servers over asyncio HTTP/1.1, either closed-loop (a fixed number of
+clients sending back to back), open-loop (Poisson arrivals at a fixed rate, whether or not the server keeps up) or by
+replaying a recorded JSONL trace, and prints throughput, latency percentiles and error rates as JSON.
+
+Pair it with --backend fake on the server to measure the serving layer without the model.
+
+Usage: python benchmarks/loadgen.py [--url http://127.0.0.1:8001] [--mode closed|open] [--concurrency 8]
+                                    [--rate 50] [--duration 30] [--sizes original 1024 224] [--batch N]
+                                    [--upload multipart|rgb8|npy]
+                                    [--replay traffic/traffic.jsonl [--speed 1.0]] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / "assets"
+BOUNDARY = "dart-http-boundary-loadgen0123456789"
+
+# Upload formats: encoded files in a multipart body, or pixels resized on the client (see pixel_upload.py)
+UPLOADS = ("multipart", "rgb8", "npy")
+PIXEL_SIZE = (224, 224)
+
+# Latency percentiles in the report
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def log(message: str):
+    """Progress goes to stderr so stdout is only the JSON report"""
+    print(message, file=sys.stderr)
+
+
+class Payload:
+    """One image to upload"""
+
+    def __init__(self, name: str, data: bytes, content_type: str):
+        self.name = name
+        self.data = data
+        self.content_type = content_type
+
+
+def load_payloads(sizes: List[str], directory: Path = ASSETS_DIR) -> List[Payload]:
+    """The bundled photos, each as-is ("original") and/or re-encoded as JPEG with its longest side at each size"""
+    paths = sorted(directory.glob("*.jpg")) + sorted(directory.glob("*.png"))
+    if not paths:
+        raise SystemExit(f"❌ No images in {directory}")
+    payloads = []
+    for path in paths:
+        data = path.read_bytes()
+        for size in sizes:
+            if size == "original":
+                content_type = "image/png" if path.suffix == ".png" else "image/jpeg"
+                payloads.append(Payload(path.name, data, content_type))
+                continue
+            from PIL import Image
+            image = Image.open(io.BytesIO(data)).convert("RGB")
+            image.thumbnail((int(size), int(size)))
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=90)
+            payloads.append(Payload(f"{path.stem}_{size}.jpg", buffer.getvalue(), "image/jpeg"))
+    return payloads
+
+
+def multipart_body(field: str, payloads: List[Payload], nonce: Optional[bytes] = None) -> bytes:
+    """A Flutter-style multipart/form-data upload of ``payloads`` under ``field``.
+
+    ``nonce`` is appended after each image's data; decoders ignore trailing
+    bytes, so the pixels (and a fake backend's prediction) are unchanged but
+    the server's prediction cache never hits.
+    """
+    chunks = []
+    for payload in payloads:
+        chunks.append((
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{payload.name}"\r\n'
+            f"Content-Type: {payload.content_type}\r\n\r\n"
+        ).encode())
+        chunks.append(payload.data)
+        if nonce:
+            chunks.append(nonce)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(chunks)
+
+
+def resize_pixels(payload: Payload):
+    """The payload resized to the model input on the client, as a HxWx3 uint8 array (what a device would send)"""
+    import numpy as np
+    from PIL import Image
+    image = Image.open(io.BytesIO(payload.data)).convert("RGB").resize(PIXEL_SIZE[::-1], Image.Resampling.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def pixel_body(upload: str, pixels: List) -> Tuple[bytes, str, Dict[str, str]]:
+    """Body, content type and extra headers of an application/x-rgb8 or .npy upload of N resized images"""
+    import numpy as np
+    stacked = np.ascontiguousarray(np.stack(pixels))
+    if upload == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, stacked)
+        return buffer.getvalue(), "application/x-npy", {}
+    count, height, width, _ = stacked.shape
+    return stacked.tobytes(), "application/x-rgb8", {
+        "X-Image-Count": str(count), "X-Image-Height": str(height), "X-Image-Width": str(width)}
+
+
+class Request:
+    """One HTTP request to send"""
+
+    def __init__(self, method: str, path: str, body: bytes = b"", content_type: Optional[str] = None,
+                 images: int = 0, trace: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.images = images
+        self.trace = trace
+        self.headers = headers or {}
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection (servers that answer Connection: close get a new one per request)"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, request: Request) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        headers = [f"{request.method} {request.path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                   f"Content-Length: {len(request.body)}"]
+        if request.content_type:
+            headers.append(f"Content-Type: {request.content_type}")
+        headers += [f"{name}: {value}" for name, value in request.headers.items()]
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + request.body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed before the response")
+        status = int(status_line.split()[1])
+        length = None
+        keep_alive = status_line.startswith(b"HTTP/1.1")
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection":
+                keep_alive = value.strip().lower() == "keep-alive"
+        if length is None:
+            body = await self.reader.read()
+            keep_alive = False
+        else:
+            body = await self.reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class ConnectionPool:
+    """Idle connections reused by whichever task sends next"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.idle: List[Connection] = []
+
+    def acquire(self) -> Connection:
+        return self.idle.pop() if self.idle else Connection(self.host, self.port)
+
+    def release(self, connection: Connection, healthy: bool):
+        if healthy and connection.writer is not None:
+            self.idle.append(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle.clear()
+
+
+def classify(status: int, body: bytes) -> Optional[str]:
+    """None for a successful prediction, else the error kind"""
+    if status != 200:
+        return f"http_{status}"
+    try:
+        result = json.loads(body)
+    except ValueError:
+        return "invalid_json"
+    # The servers answer some failures (bad image, mock fallback errors) with 200 and an error field
+    if isinstance(result, dict) and ("error" in result or result.get("status") == "error"):
+        return "app_error"
+    return None
+
+
+class LoadGenerator:
+    """Sends requests and collects one sample per request"""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.pool = ConnectionPool(self.host, self.port)
+        self.samples: List[Dict[str, Any]] = []
+
+    async def send(self, request: Request) -> Dict[str, Any]:
+        connection = self.pool.acquire()
+        started = time.perf_counter()
+        sample = {"sent_at": started, "images": request.images, "bytes": len(request.body)}
+        healthy = False
+        try:
+            status, body = await asyncio.wait_for(connection.request(request), self.timeout)
+            sample["status"] = status
+            sample["error"] = classify(status, body)
+            healthy = True
+        except asyncio.TimeoutError:
+            sample["status"] = None
+            sample["error"] = "timeout"
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            sample["status"] = None
+            sample["error"] = "connection"
+        sample["latency_ms"] = (time.perf_counter() - started) * 1000.0
+        self.pool.release(connection, healthy)
+        if request.trace is not None:
+            sample["trace"] = request.trace
+        self.samples.append(sample)
+        return sample
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Poll /ready until the server answers anything but 503 (servers without /ready answer 404)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            connection = Connection(self.host, self.port)
+            try:
+                status, _ = await asyncio.wait_for(connection.request(Request("GET", "/ready")), 5.0)
+                if status != 503:
+                    return True
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+                pass
+            finally:
+                connection.close()
+            await asyncio.sleep(0.5)
+        return False
+
+    async def closed_loop(self, make_request, concurrency: int, duration: float):
+        """``concurrency`` clients each send their next request as soon as the previous one is answered"""
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                await self.send(make_request())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, make_request, rate: float, duration: float, max_outstanding: int):
+        """Poisson arrivals at ``rate`` per second; arrivals beyond ``max_outstanding`` in flight are dropped"""
+        arrivals = random.Random(0)
+        started = time.perf_counter()
+        next_at = started
+        tasks = set()
+        while True:
+            next_at += arrivals.expovariate(rate)
+            if next_at - started >= duration:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks = {task for task in tasks if not task.done()}
+            if len(tasks) >= max_outstanding:
+                self.samples.append({"sent_at": time.perf_counter(), "status": None, "error": "dropped",
+                                     "latency_ms": None, "images": 0, "bytes": 0})
+                continue
+            tasks.add(asyncio.ensure_future(self.send(make_request())))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def replay(self, requests: List[Tuple[float, Request]], speed: float):
+        """Send each request at its recorded offset from the first, divided by ``speed``"""
+        started = time.perf_counter()
+        tasks = []
+        for offset, request in requests:
+            await asyncio.sleep(max(0.0, started + offset / speed - time.perf_counter()))
+            tasks.append(asyncio.ensure_future(self.send(request)))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def upload_field(endpoint: str) -> str:
+    """Multipart field the servers read images from on ``endpoint``"""
+    return "files" if endpoint.rstrip("/").endswith("/batch") else "file"
+
+
+def trace_files(path: Path) -> List[Path]:
+    """A trace file, or every trace in a recording directory (per-worker and rotated ones included)"""
+    if path.is_dir():
+        return sorted(candidate for candidate in path.glob("*.jsonl*") if candidate.is_file())
+    return [path]
+
+
+def request_for(record: Dict[str, Any], root: Path, payloads: List[Payload]) -> Request:
+    """The request a trace record describes, with its recorded images or the closest-sized bundled photos"""
+    endpoint = record.get("path") or record["endpoint"]
+    method = record.get("method", "POST" if endpoint.startswith("/predict") else "GET")
+    if method != "POST":
+        return Request(method, endpoint, trace=record)
+
+    blobs = [root / blob for blob in record.get("blobs") or []]
+    if blobs and all(blob.exists() for blob in blobs):
+        images = []
+        for blob in blobs:
+            data = blob.read_bytes()
+            content_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+            images.append(Payload(blob.name[:12], data, content_type))
+    else:
+        count = max(1, record.get("images") or 1)
+        size = (record.get("size") or 0) / count
+        images = [min(payloads, key=lambda payload: abs(len(payload.data) - size))] * count
+
+    content_type = record.get("content_type") or "multipart/form-data"
+    if content_type == "application/json":
+        body = json.dumps({"image": base64.b64encode(images[0].data).decode("ascii")}).encode()
+    elif content_type.startswith("multipart/"):
+        body = multipart_body(upload_field(endpoint), images)
+        content_type = f"multipart/form-data; boundary={BOUNDARY}"
+    else:
+        body = images[0].data
+    return Request(method, endpoint, body, content_type, len(images), trace=record)
+
+
+def load_trace(path: Path, payloads: List[Payload]) -> List[Tuple[float, Request]]:
+    """(offset seconds, request) for every record in a JSONL trace (file or recording directory).
+
+    Each line is a request record as traffic_recorder.py writes it: ``ts``
+    (epoch seconds), ``path`` (or ``endpoint``), optional ``method``,
+    ``content_type``, ``size``, ``images`` and ``blobs`` (the recorded
+    images, relative to the trace). Without blobs, the bundled photo closest
+    to the recorded size is sent. Lines that are not request records are
+    skipped.
+    """
+    records = []
+    skipped = 0
+    for trace in trace_files(path):
+        with open(trace) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if (not isinstance(record, dict) or "ts" not in record
+                        or not (record.get("path") or record.get("endpoint"))):
+                    skipped += 1
+                    continue
+                records.append(record)
+    if skipped:
+        log(f"⚠️ Skipped {skipped} lines of {path} that are not request records")
+    records.sort(key=lambda record: record["ts"])
+
+    root = path if path.is_dir() else path.parent
+    return [(record["ts"] - records[0]["ts"], request_for(record, root, payloads)) for record in records]
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100.0 * len(values)) - 1))]
+
+
+def build_report(samples: List[Dict[str, Any]], elapsed: float, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Throughput, latency of successful requests and error rates"""
+    ok = [sample for sample in samples if sample["error"] is None]
+    latencies = sorted(sample["latency_ms"] for sample in ok)
+    errors: Dict[str, int] = {}
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        if sample["error"] is not None:
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+        if sample["status"] is not None:
+            statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    latency = {f"p{p:g}": round(percentile(latencies, p), 3) for p in PERCENTILES} if latencies else {}
+    if latencies:
+        latency["mean"] = round(sum(latencies) / len(latencies), 3)
+        latency["max"] = round(latencies[-1], 3)
+    return {
+        **config,
+        "elapsed_s": round(elapsed, 3),
+        "requests": len(samples),
+        "ok": len(ok),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "goodput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "images_per_second": round(sum(sample["images"] for sample in ok) / elapsed, 2) if elapsed else None,
+        "error_rate": round(1.0 - len(ok) / len(samples), 5) if samples else None,
+        "errors": errors,
+        "status_counts": statuses,
+        "latency_ms": latency,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test a Cattle AI server")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Server base URL")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: --concurrency clients back to back; open: Poisson arrivals at --rate")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients in closed-loop mode")
+    parser.add_argument("--rate", type=float, default=50.0, help="Requests per second in open-loop mode")
+    parser.add_argument("--max-outstanding", type=int, default=1024,
+                        help="Open-loop arrivals beyond this many in flight are dropped (and counted as errors)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to send for")
+    parser.add_argument("--sizes", nargs="+", default=["original"],
+                        help="Payloads: 'original' asset files and/or JPEGs re-encoded to this longest side")
+    parser.add_argument("--batch", type=int, default=0, help="Images per request to /predict/batch (0 = /predict)")
+    parser.add_argument("--upload", choices=UPLOADS, default="multipart",
+                        help="multipart: encoded files; rgb8/npy: pixels resized to 224x224 here (no server decode)")
+    parser.add_argument("--repeat-payloads", action="store_true",
+                        help="Send identical bytes each time (lets the server's prediction cache answer)")
+    parser.add_argument("--replay", type=Path, default=None,
+                        help="Replay this JSONL trace (or recording directory) at its recorded pacing instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay pacing multiplier (2 = twice as fast)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--ready-timeout", type=float, default=120.0,
+                        help="Seconds to wait for /ready before starting")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the JSON report here")
+    return parser.parse_args()
+
+
+async def run(args) -> Dict[str, Any]:
+    payloads = load_payloads(args.sizes)
+    generator = LoadGenerator(args.url, args.timeout)
+    if not await generator.wait_ready(args.ready_timeout):
+        raise SystemExit(f"❌ {args.url} did not become ready within {args.ready_timeout:g}s")
+
+    endpoint = "/predict/batch" if args.batch else "/predict"
+    choices = itertools.cycle(payloads)
+    counter = itertools.count()
+    if args.upload != "multipart":
+        # Resized once up front, as a device would before sending; pixel uploads bypass the prediction cache
+        resized = itertools.cycle([resize_pixels(payload) for payload in payloads])
+        bodies = itertools.cycle([pixel_body(args.upload, [next(resized) for _ in range(max(1, args.batch))])
+                                  for _ in range(len(payloads))])
+
+    def make_request() -> Request:
+        if args.upload != "multipart":
+            body, content_type, headers = next(bodies)
+            return Request("POST", endpoint, body, content_type, max(1, args.batch), headers=headers)
+        images = [next(choices) for _ in range(max(1, args.batch))]
+        nonce = None if args.repeat_payloads else f"{os.getpid()}-{next(counter)}".encode()
+        return Request("POST", endpoint, multipart_body(upload_field(endpoint), images, nonce),
+                       f"multipart/form-data; boundary={BOUNDARY}", len(images))
+
+    config = {"target": args.url, "mode": "replay" if args.replay else args.mode,
+              "endpoint": None if args.replay else endpoint, "upload": args.upload,
+              "payloads": len(payloads),
+              "payload_kb_mean": round(sum(len(payload.data) for payload in payloads) / len(payloads) / 1024, 1)}
+    if args.upload != "multipart":
+        config["payload_kb_mean"] = round(PIXEL_SIZE[0] * PIXEL_SIZE[1] * 3 / 1024, 1)
+    started = time.perf_counter()
+    if args.replay:
+        trace = load_trace(args.replay, payloads)
+        config.update({"trace": str(args.replay), "speed": args.speed})
+        log(f"🔁 Replaying {len(trace)} requests from {args.replay} at {args.speed:g}x")
+        await generator.replay(trace, args.speed)
+    elif args.mode == "closed":
+        config["concurrency"] = args.concurrency
+        log(f"🔁 Closed loop: {args.concurrency} clients for {args.duration:g}s -> {args.url}{endpoint}")
+        await generator.closed_loop(make_request, args.concurrency, args.duration)
+    else:
+        config["rate"] = args.rate
+        log(f"🔁 Open loop: {args.rate:g} req/s for {args.duration:g}s -> {args.url}{endpoint}")
+        await generator.open_loop(make_request, args.rate, args.duration, args.max_outstanding)
+    elapsed = time.perf_counter() - started
+    generator.pool.close()
+    return build_report(generator.samples, elapsed, config)
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+        log(f"💾 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Traffic Replay
+Sends a trace recorded with --record-traffic to a server again, at the recorded pacing or faster, and compares each
+request's latency and status with what was recorded. Per-request deltas go to a JSONL file; a JSON summary (the
+loadgen.py report plus delta percentiles and the largest slowdowns) goes to stdout.
+
+Usage: python benchmarks/replay_traffic.py TRACE [--url http://127.0.0.1:8001] [--speed 1.0]
+                                           [--deltas replay_deltas.jsonl] [--output summary.json]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from loadgen import LoadGenerator, build_report, load_payloads, load_trace, log, percentile
+
+# Largest per-request slowdowns listed in the summary
+WORST_COUNT = 10
+
+
+def request_deltas(samples: List[Dict[str, Any]], first_ts: float) -> List[Dict[str, Any]]:
+    """One row per replayed request, in trace order: recorded vs replayed latency and status"""
+    rows = []
+    for sample in sorted(samples, key=lambda sample: sample["trace"]["ts"]):
+        record = sample["trace"]
+        recorded_ms = record.get("latency_ms")
+        replay_ms = round(sample["latency_ms"], 3)
+        rows.append({
+            "offset_s": round(record["ts"] - first_ts, 6),
+            "method": record.get("method"),
+            "path": record.get("path") or record.get("endpoint"),
+            "images": sample["images"],
+            "request_id": record.get("request_id"),
+            "recorded_status": record.get("status"),
+            "status": sample["status"],
+            "error": sample["error"],
+            "recorded_ms": recorded_ms,
+            "replay_ms": replay_ms,
+            "delta_ms": round(replay_ms - recorded_ms, 3) if recorded_ms is not None else None,
+        })
+    return rows
+
+
+def summarize_deltas(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Delta percentiles, status changes and the largest slowdowns.
+
+    Latency is only compared between requests answered with the recorded
+    status: a request shed with 429 in one run and served in the other says
+    nothing about speed, and is counted under ``status_changed`` instead.
+    """
+    comparable = [row for row in rows if row["delta_ms"] is not None and row["status"] == row["recorded_status"]]
+    deltas = sorted(row["delta_ms"] for row in comparable)
+    changed = [row for row in rows if row["recorded_status"] is not None and row["status"] != row["recorded_status"]]
+    return {
+        "compared": len(deltas),
+        "delta_ms": {f"p{p:g}": percentile(deltas, p) for p in (1, 50, 90, 99)} if deltas else {},
+        "status_changed": len(changed),
+        "status_changes": sorted({f"{row['recorded_status']}->{row['status']}" for row in changed}),
+        "slowest": sorted(comparable, key=lambda row: row["delta_ms"], reverse=True)[:WORST_COUNT],
+    }
+
+
+async def replay(args) -> Dict[str, Any]:
+    payloads = load_payloads(["original"])
+    trace = load_trace(args.trace, payloads)
+    if not trace:
+        raise SystemExit(f"❌ No request records in {args.trace}")
+    generator = LoadGenerator(args.url, args.timeout)
+    if not await generator.wait_ready(args.ready_timeout):
+        raise SystemExit(f"❌ {args.url} did not become ready within {args.ready_timeout:g}s")
+
+    span = trace[-1][0]
+    log(f"🔁 Replaying {len(trace)} requests ({span:.1f}s recorded) at {args.speed:g}x -> {args.url}")
+    started = time.perf_counter()
+    await generator.replay(trace, args.speed)
+    elapsed = time.perf_counter() - started
+    generator.pool.close()
+
+    rows = request_deltas(generator.samples, trace[0][1].trace["ts"])
+    with open(args.deltas, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    log(f"💾 Per-request deltas written to {args.deltas}")
+
+    report = build_report(generator.samples, elapsed, {
+        "target": args.url, "mode": "replay", "trace": str(args.trace), "speed": args.speed,
+        "recorded_span_s": round(span, 3),
+    })
+    report["comparison"] = summarize_deltas(rows)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against a Cattle AI server")
+    parser.add_argument("trace", type=Path, help="traffic.jsonl, or the --record-traffic directory")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Server base URL")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Pacing multiplier: 1 = recorded pacing, 10 = ten times as fast")
+    parser.add_argument("--deltas", type=Path, default=Path("replay_deltas.jsonl"),
+                        help="Per-request comparison output (JSON lines)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--ready-timeout", type=float, default=120.0,
+                        help="Seconds to wait for /ready before starting")
+    parser.add_argument("--output", type=Path, default=None, help="Also write the JSON summary here")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    report = asyncio.run(replay(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
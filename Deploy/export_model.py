@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Export the Cattle Breed Model for Serving
+Writes a frozen TorchScript, ONNX or slim (weights-only safetensors) version of a training checkpoint, with the class
+list embedded, next to the checkpoint.
+
+Usage: python export_model.py [--checkpoint models/stable_cattle_model.pth] [--format torchscript|onnx|slim] [--fp16]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import time
+import warnings
+from pathlib import Path
+
+import torch
+
+from backends import OnnxRuntimeBackend, onnx_path
+from image_decode import decode_image
+from model_loading import (CLASSES_FILE, METADATA_FILE, exported_path, load_eager, load_slim, load_torchscript,
+                           slim_path)
+from prediction_cache import compute_model_version
+from preprocessing import Preprocessor
+from slim_checkpoint import write_tensors
+
+# Same default as the servers' MODEL_PATH
+DEFAULT_CHECKPOINT = "models/stable_cattle_model.pth"
+
+# App sample photos used to check an export against the eager model
+SAMPLE_IMAGES_DIR = Path(__file__).resolve().parent.parent / "assets"
+ONNX_OPSET = 17
+
+# Largest logit difference from the eager model an export may have (fp16 weights round more)
+MAX_LOGIT_DIFF = 1e-3
+MAX_LOGIT_DIFF_FP16 = 5e-2
+
+
+def export_metadata(checkpoint_path: str, loaded, model_format: str, channels_last: bool) -> dict:
+    stat = os.stat(checkpoint_path)
+    return {
+        "format": model_format,
+        "architecture": "resnet18",
+        "source": os.path.basename(checkpoint_path),
+        "source_version": compute_model_version(checkpoint_path),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "num_classes": loaded.module.fc.out_features,
+        "input_size": [224, 224],
+        "channels_last": channels_last,
+        "torch_version": torch.__version__,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **loaded.info,
+    }
+
+
+def export_torchscript(checkpoint_path: str, output_path: str, channels_last: bool = True) -> dict:
+    """Script, freeze and save the checkpoint's model; returns the embedded metadata"""
+    loaded = load_eager(checkpoint_path, "cpu", channels_last=channels_last)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        # freeze() inlines the weights as constants and folds Conv+BN; the result is inference-only
+        frozen = torch.jit.freeze(torch.jit.script(loaded.module))
+        metadata = export_metadata(checkpoint_path, loaded, "torchscript-frozen", channels_last)
+        torch.jit.save(frozen, output_path, _extra_files={
+            CLASSES_FILE: json.dumps(loaded.classes),
+            METADATA_FILE: json.dumps(metadata),
+        })
+    return metadata
+
+
+def export_onnx(checkpoint_path: str, output_path: str) -> dict:
+    """Export the checkpoint's model to ONNX with a dynamic batch axis; returns the embedded metadata"""
+    import onnx
+
+    loaded = load_eager(checkpoint_path, "cpu")
+    # The TorchScript-based exporter handles ResNet18 without the onnxscript dependency of the dynamo one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        torch.onnx.export(loaded.module, (torch.randn(1, 3, 224, 224),), output_path,
+                          input_names=["input"], output_names=["logits"],
+                          dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                          opset_version=ONNX_OPSET, do_constant_folding=True, **legacy)
+
+    metadata = export_metadata(checkpoint_path, loaded, "onnx", False)
+    metadata["opset"] = ONNX_OPSET
+    model = onnx.load(output_path)
+    for key, value in (("classes", json.dumps(loaded.classes)), ("metadata", json.dumps(metadata))):
+        entry = model.metadata_props.add()
+        entry.key, entry.value = key, value
+    onnx.save(model, output_path)
+    return metadata
+
+
+def export_slim(checkpoint_path: str, output_path: str, fp16: bool = False, channels_last: bool = True) -> dict:
+    """Write the Conv+BN-fused weights alone (no optimizer state, no pickle) in the safetensors layout"""
+    loaded = load_eager(checkpoint_path, "cpu", optimize=True)
+    tensors = {}
+    for name, tensor in loaded.module.state_dict().items():
+        if fp16 and tensor.is_floating_point():
+            tensor = tensor.half()
+        if channels_last and tensor.dim() == 4:
+            tensor = tensor.permute(0, 2, 3, 1)  # OHWI bytes load straight into a channels-last model
+        tensors[name] = tensor.contiguous()
+
+    metadata = export_metadata(checkpoint_path, loaded, "slim", channels_last)
+    metadata.update({"dtype": "float16" if fp16 else "float32", "fused": "conv-bn",
+                     "layout": "channels_last" if channels_last else "contiguous"})
+    write_tensors(tensors, output_path, {"classes": json.dumps(loaded.classes), "metadata": json.dumps(metadata)})
+    return metadata
+
+
+def sample_batch(limit: int = 8) -> torch.Tensor:
+    """Preprocessed batch of the app's sample photos (random inputs if none are found)"""
+    paths = sorted(SAMPLE_IMAGES_DIR.glob("*.jpg")) + sorted(SAMPLE_IMAGES_DIR.glob("*.png"))
+    if not paths:
+        return torch.randn(4, 3, 224, 224)
+    preprocessor = Preprocessor()
+    return preprocessor.batch([preprocessor.pixels(decode_image(str(path))) for path in paths[:limit]]).clone()
+
+
+def verify_export(checkpoint_path: str, output_path: str, model_format: str = "torchscript"):
+    """(max logit difference, top-1 agreement) of the export vs the eager model on the sample images"""
+    eager = load_eager(checkpoint_path, "cpu").module
+    inputs = sample_batch()
+    with torch.no_grad():
+        expected = eager(inputs)
+        if model_format == "onnx":
+            session = OnnxRuntimeBackend(output_path).session
+            actual = torch.from_numpy(session.run(None, {"input": inputs.numpy()})[0])
+        elif model_format == "slim":
+            actual = load_slim(output_path, "cpu").module(inputs)
+        else:
+            actual = load_torchscript(output_path, "cpu").module(inputs.contiguous(memory_format=torch.channels_last))
+    agreement = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+    return (expected - actual).abs().max().item(), agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a training checkpoint for serving")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Training checkpoint (.pth)")
+    parser.add_argument("--format", choices=["torchscript", "onnx", "slim"], default="torchscript",
+                        help="torchscript: used by the torch backend; onnx: for --backend onnxruntime; "
+                             "slim: weights only, memory-mapped by the torch backend")
+    parser.add_argument("--output", default=None,
+                        help="Output file (default: <checkpoint>.torchscript.pt, .onnx or .safetensors, "
+                             "where the servers look for it)")
+    parser.add_argument("--no-channels-last", action="store_true",
+                        help="Keep NCHW weights (the servers feed channels-last batches by default)")
+    parser.add_argument("--fp16", action="store_true",
+                        help="slim: store fp16 weights (half the file; widened to fp32 in memory at load)")
+    args = parser.parse_args()
+
+    if args.format == "onnx":
+        output_path = args.output or onnx_path(args.checkpoint)
+    elif args.format == "slim":
+        output_path = args.output or slim_path(args.checkpoint)
+    else:
+        output_path = args.output or exported_path(args.checkpoint)
+    print(f"📦 Exporting {args.checkpoint} -> {output_path} ({args.format})")
+    started = time.perf_counter()
+    if args.format == "onnx":
+        metadata = export_onnx(args.checkpoint, output_path)
+    elif args.format == "slim":
+        metadata = export_slim(args.checkpoint, output_path, fp16=args.fp16,
+                               channels_last=not args.no_channels_last)
+    else:
+        metadata = export_torchscript(args.checkpoint, output_path, channels_last=not args.no_channels_last)
+    print(f"✅ Exported {metadata['num_classes']} classes in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(output_path) / 1024 / 1024:.1f} MB)")
+
+    max_diff, agreement = verify_export(args.checkpoint, output_path, args.format)
+    print(f"🔍 Sample images vs eager model: max logit difference {max_diff:.2e}, top-1 agreement {agreement:.0%}")
+    if max_diff > (MAX_LOGIT_DIFF_FP16 if args.fp16 else MAX_LOGIT_DIFF) or agreement < 1.0:
+        raise SystemExit("❌ Export does not match the eager model")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
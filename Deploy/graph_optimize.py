@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Inference Graph Optimization for the Cattle Breed Model
+torch.fx passes that fuse every Conv+BatchNorm pair and, optionally, fold the ImageNet normalization into the first
+convolution so the model takes ``pixel / 255`` directly and preprocessing only scales.
+"""
+
+from typing import Sequence, Tuple
+
+import torch
+import torch.fx as fx
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from preprocessing import IMAGENET_MEAN, IMAGENET_STD, INPUT_SIZE
+
+
+class NormalizedInputConv2d(nn.Conv2d):
+    """A first convolution with ``(x - mean) / std`` folded into its weights and bias.
+
+    Dividing by std folds exactly into the weights. Subtracting the mean folds
+    into the bias only away from the borders: the original convolution
+    zero-pads the *normalized* image, i.e. pads with ``-mean / std`` in raw
+    pixel terms, while this one pads the raw image with zeros. The difference
+    is a constant that only touches the outer rows and columns of the output,
+    so it is precomputed for the model input size and added back to those
+    strips after the convolution.
+    """
+
+    def __init__(self, conv: nn.Conv2d, mean: Sequence[float], std: Sequence[float],
+                 input_size: Tuple[int, int] = INPUT_SIZE):
+        if isinstance(conv.padding, str):
+            raise ValueError(f"cannot fold normalization into a convolution with padding={conv.padding!r}")
+        weight = conv.weight.detach()
+        super().__init__(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride,
+                         padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True,
+                         device=weight.device, dtype=weight.dtype)
+        bias = conv.bias.detach() if conv.bias is not None else torch.zeros_like(self.bias)
+        mean = torch.tensor(mean, dtype=weight.dtype, device=weight.device).view(1, -1, 1, 1)
+        std = torch.tensor(std, dtype=weight.dtype, device=weight.device).view(1, -1, 1, 1)
+        with torch.no_grad():
+            self.weight.copy_(weight / std)
+            self.bias.copy_(bias - (weight * mean / std).sum(dim=(1, 2, 3)))
+
+            # Output of both versions for a black image: equal in the interior, different along the borders
+            black = torch.zeros(1, conv.in_channels, *input_size, dtype=weight.dtype, device=weight.device)
+            expected = conv((black - mean) / std)
+            correction = (expected - nn.Conv2d.forward(self, black))[0]
+
+        # Output rows/columns whose receptive field reaches into the padding
+        height, width = correction.shape[1:]
+        self.output_size = [height, width]
+        self.top, self.bottom = self._padded_edges(height, input_size[0], 0)
+        self.left, self.right = self._padded_edges(width, input_size[1], 1)
+        inner = slice(self.top, height - self.bottom)
+        self.register_buffer("top_correction", correction[:, :self.top].clone())
+        self.register_buffer("bottom_correction", correction[:, height - self.bottom:].clone())
+        self.register_buffer("left_correction", correction[:, inner, :self.left].clone())
+        self.register_buffer("right_correction", correction[:, inner, width - self.right:].clone())
+
+    def _padded_edges(self, outputs: int, inputs: int, dim: int) -> Tuple[int, int]:
+        """(leading, trailing) output positions along ``dim`` that read padding"""
+        stride, padding, dilation = self.stride[dim], self.padding[dim], self.dilation[dim]
+        span = dilation * (self.kernel_size[dim] - 1)
+        starts = [i * stride - padding for i in range(outputs)]
+        leading = sum(1 for start in starts if start < 0)
+        trailing = sum(1 for start in starts if start + span > inputs - 1)
+        return min(leading, outputs), min(trailing, outputs - leading)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self._conv_forward(x, self.weight, self.bias)
+        height, width = out.shape[-2], out.shape[-1]
+        if [height, width] != self.output_size:
+            raise ValueError("input size differs from the one the normalization was folded for")
+        out[:, :, :self.top] += self.top_correction
+        out[:, :, height - self.bottom:] += self.bottom_correction
+        out[:, :, self.top:height - self.bottom, :self.left] += self.left_correction
+        out[:, :, self.top:height - self.bottom, width - self.right:] += self.right_correction
+        return out
+
+
+def _replace_module(model: fx.GraphModule, name: str, module: nn.Module):
+    parent_name, _, attribute = name.rpartition(".")
+    setattr(model.get_submodule(parent_name) if parent_name else model, attribute, module)
+
+
+def fuse_conv_bn(model: nn.Module) -> fx.GraphModule:
+    """Trace ``model`` and fold every BatchNorm that directly follows a convolution into it (eval mode)"""
+    traced = fx.symbolic_trace(model.eval())
+    modules = dict(traced.named_modules())
+    for node in list(traced.graph.nodes):
+        if node.op != "call_module" or not isinstance(modules[node.target], nn.BatchNorm2d):
+            continue
+        source = node.args[0]
+        if (not isinstance(source, fx.Node) or source.op != "call_module"
+                or not isinstance(modules[source.target], nn.Conv2d) or len(source.users) > 1):
+            continue
+        fused = fuse_conv_bn_eval(modules[source.target], modules[node.target])
+        _replace_module(traced, source.target, fused)
+        node.replace_all_uses_with(source)
+        traced.graph.erase_node(node)
+    traced.graph.lint()
+    traced.delete_all_unused_submodules()
+    traced.recompile()
+    return traced
+
+
+def fold_input_normalization(model: fx.GraphModule, mean: Sequence[float] = IMAGENET_MEAN,
+                             std: Sequence[float] = IMAGENET_STD,
+                             input_size: Tuple[int, int] = INPUT_SIZE) -> fx.GraphModule:
+    """Fold ``(x - mean) / std`` into the convolution that consumes the model input"""
+    modules = dict(model.named_modules())
+    inputs = [node for node in model.graph.nodes if node.op == "placeholder"]
+    users = list(inputs[0].users) if len(inputs) == 1 else []
+    if (len(users) != 1 or users[0].op != "call_module"
+            or not isinstance(modules[users[0].target], nn.Conv2d)):
+        raise ValueError("the model input does not feed a single convolution")
+    conv = modules[users[0].target]
+    if conv.padding_mode != "zeros":
+        raise ValueError(f"cannot fold normalization into a convolution with {conv.padding_mode} padding")
+    _replace_module(model, users[0].target, NormalizedInputConv2d(conv, mean, std, input_size))
+    model.recompile()
+    return model
+
+
+def optimize_model(model: nn.Module, fold_normalization: bool = False) -> fx.GraphModule:
+    """Conv+BN fusion, then (optionally) the input normalization folded into the first convolution.
+
+    The result expects ``pixel / 255`` when ``fold_normalization`` is set, and
+    keeps the memory format of the original weights. Folding is off by
+    default: Preprocessor already normalizes in the same single pass it
+    needs to convert to float, so folding saves nothing there, while the
+    border correction costs more than that pass and keeps TorchScript from
+    fusing conv1 (see benchmarks/bench_graph_optimize.py).
+    """
+    channels_last = next(model.parameters()).is_contiguous(memory_format=torch.channels_last)
+    optimized = fuse_conv_bn(model)
+    if fold_normalization:
+        optimized = fold_input_normalization(optimized)
+    if channels_last:
+        optimized.to(memory_format=torch.channels_last)
+    return optimized.eval()
\ No newline at end of file
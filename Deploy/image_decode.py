@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Reduced-Resolution Image Decoding
+Decodes uploads straight to the smallest size the 224x224 model input needs, shared by the servers and the CLI.
+"""
+
+import os
+from typing import Tuple, Union
+
+from PIL import Image
+
+from multipart_utils import payload_stream
+
+# Model input size (width, height)
+MODEL_INPUT_SIZE = (224, 224)
+
+# EXIF orientation -> transpose that makes the image upright (as in ImageOps.exif_transpose)
+_EXIF_ORIENTATION_TAG = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def _orientation(image: Image.Image) -> int:
+    """EXIF orientation of an opened image (1 when absent or unreadable)"""
+    try:
+        return int(image.getexif().get(_EXIF_ORIENTATION_TAG, 1))
+    except Exception:
+        return 1
+
+
+def decode_image(source: Union[bytes, bytearray, memoryview, str, os.PathLike],
+                 min_size: Tuple[int, int] = MODEL_INPUT_SIZE) -> Image.Image:
+    """Decode an upload (bytes or a path) into an upright RGB image no smaller than ``min_size``.
+
+    JPEGs are decoded with libjpeg DCT scaling (``Image.draft``) at 1/2, 1/4
+    or 1/8 scale, whichever is the smallest that still covers ``min_size``,
+    so a 12 MP phone photo is never materialized at full resolution. Other
+    formats (PNG, WebP, ...) are decoded in full and then box-reduced by the
+    largest integer factor that keeps ``min_size``. EXIF orientation is
+    applied, and palette/alpha/greyscale/CMYK images are converted to RGB.
+    The caller still resizes to the exact model input size.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        image = Image.open(source)
+    else:
+        image = Image.open(payload_stream(source))
+
+    # Sizes below are in the stored orientation; rotation is applied last, on the small image
+    orientation = _orientation(image)
+    target = min_size[::-1] if orientation in _TRANSPOSED_ORIENTATIONS else min_size
+    if image.format == "JPEG":
+        image.draft("RGB", target)
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+    return image
+
+
+def decode_image_full(source: Union[bytes, bytearray, memoryview, str, os.PathLike]) -> Image.Image:
+    """Previous full-resolution decode (no EXIF handling), kept as the benchmark reference"""
+    if isinstance(source, (str, os.PathLike)):
+        image = Image.open(source)
+    else:
+        image = Image.open(payload_stream(source))
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
\ No newline at end of file
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Dynamic Micro-Batching for Cattle Breed Inference
+Collects single-image requests from handler threads and runs them as one stacked forward pass.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+# Default batching configuration
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+class InferenceBatcher:
+    """Queues pending inputs and runs them through a batch function in groups.
+
+    Handler threads call ``submit(item)`` and block on the returned future.
+    A single worker thread waits for the first pending item, then keeps
+    collecting until either ``max_batch_size`` items are queued or
+    ``max_wait_ms`` has elapsed, and hands the whole group to ``batch_fn``.
+    ``batch_fn`` must return one result per input, in order.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 name: str = "inference-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+        self._stopped = False
+
+        # Tuning statistics
+        self.batches_run = 0
+        self.items_processed = 0
+        self.max_batch_seen = 0
+        self.last_batch_size = 0
+        self.batch_size_counts: Dict[int, int] = {}
+
+    def _ensure_worker(self):
+        """Start the worker thread (again after a fork, threads do not survive it)"""
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        self._worker_pid = os.getpid()
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one input and return a future for its result"""
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Batcher has been stopped")
+            self._ensure_worker()
+            self._queue.append((item, future))
+            self._cond.notify()
+        return future
+
+    def stop(self):
+        """Stop accepting work; queued items are still processed"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _collect(self) -> List:
+        """Wait for the first item, then fill the batch until it is full or the wait expires"""
+        with self._cond:
+            while not self._queue:
+                if self._stopped:
+                    return []
+                self._cond.wait()
+
+            deadline = time.perf_counter() + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self._stopped:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} inputs")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+            size = len(items)
+            self.batches_run += 1
+            self.items_processed += size
+            self.last_batch_size = size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and achieved batch sizes, for /status"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "batches_run": self.batches_run,
+            "items_processed": self.items_processed,
+            "avg_batch_size": round(self.items_processed / self.batches_run, 2) if self.batches_run else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size_seen": self.max_batch_seen,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+        }
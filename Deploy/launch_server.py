@@ -2,55 +2,370 @@
 """
 Launcher for the Cattle AI Server
 This script ensures the server starts with proper error handling and logging.
+
+With --workers N (N > 1, Linux/macOS) it runs a pre-fork supervisor instead:
+the model is loaded once before forking (an eager model's weights are moved
+to shared memory, a slim file's stay memory-mapped and TorchScript constants
+are shared copy-on-write), and N forked workers accept connections on the
+same port. With --backend onnxruntime each
+worker loads its own ONNX Runtime session after the fork instead. With
+--watch-model every worker polls the model files and hot-reloads on its own
+(POST /admin/reload only reaches the worker that accepted it); a reloaded
+model is private to its worker rather than shared, and so are --candidate
+and --shadow models, which every worker loads after the fork.
 """
 
 import os
 import sys
+import signal
+import socket
+import argparse
 import subprocess
+import time
 from pathlib import Path
 
-def main():
-    """Launch the cattle AI server"""
-    
-    # Get the directory where this script is located
-    script_dir = Path(__file__).parent.absolute()
-    server_script = script_dir / "cattle_ai_server.py"
-    
-    print("🐄 Cattle AI Server Launcher")
-    print("=" * 40)
-    print(f"Script directory: {script_dir}")
+SERVER_SCRIPT = "robust_cattle_server.py"
+SERVER_PORT = 8001
+
+# Workers that die sooner than this after starting are restarted with a delay
+MIN_WORKER_UPTIME = 5.0
+RESTART_DELAY = 2.0
+
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Launch the Cattle AI Server")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of pre-forked worker processes (1 = single server process)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                        help="Serving engine used by each worker")
+    parser.add_argument("--backend", choices=["torch", "onnxruntime", "fake"], default="torch",
+                        help="Inference backend (onnxruntime serves the ONNX export from export_model.py, "
+                             "fake simulates the model for load testing)")
+    parser.add_argument("--fake-latency", default=None,
+                        help="Fake backend latency per forward pass, e.g. constant:20 or lognormal:20,0.5 (ms)")
+    parser.add_argument("--fake-per-item-ms", type=float, default=None,
+                        help="Fake backend latency added per image after the first in a batch")
+    parser.add_argument("--quantized", action="store_true",
+                        help="Serve the INT8 model from quantize_model.py (torch backend)")
+    parser.add_argument("--fold-normalization", action="store_true",
+                        help="Fold the input normalization into the first convolution (torch backend, checkpoint)")
+    parser.add_argument("--watch-model", action="store_true",
+                        help="Reload the model without downtime when its files change")
+    parser.add_argument("--admin-token", default=None,
+                        help="Allow POST /admin/reload from other hosts with this bearer token")
+    parser.add_argument("--warmup-rounds", type=int, default=None,
+                        help="Warmup forward passes per batch size before a worker accepts connections "
+                             "(0 = none, default: the server's WARMUP_ROUNDS)")
+    parser.add_argument("--candidate", action="append", default=[],
+                        metavar="NAME=PATH[,weight=PCT][,backend=B][,quantized]",
+                        help="Route PCT percent of /predict traffic to this model too (repeatable)")
+    parser.add_argument("--shadow", action="append", default=[], metavar="NAME=PATH[,backend=B][,quantized]",
+                        help="Compare this model with the primary in the background (repeatable)")
+    parser.add_argument("--record-traffic", default=None, metavar="DIR",
+                        help="Record a sample of requests under DIR (pre-fork workers write traffic.workerN.jsonl)")
+    parser.add_argument("--record-sample-rate", type=float, default=None, help="Fraction of requests recorded")
+    parser.add_argument("--record-payloads", action="store_true", help="Also store the uploaded images")
+    parser.add_argument("--uds", nargs="?", const="", default=None, metavar="PATH",
+                        help="Also answer local scripts on a Unix socket (every worker accepts on it; "
+                             "default path from uds_daemon.py)")
+    parser.add_argument("--reuseport", action="store_true",
+                        help="Give each worker its own SO_REUSEPORT socket instead of sharing one listening socket")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--log-file", default=None,
+                        help="JSON-lines log file (pre-fork workers append .workerN before the extension)")
+    return parser.parse_args()
+
+
+def run_single(script_dir: Path, args):
+    """Run the server as a single child process (original launcher behaviour)"""
+    server_script = script_dir / SERVER_SCRIPT
     print(f"Server script: {server_script}")
     print()
-    
+
     # Check if server script exists
     if not server_script.exists():
         print(f"❌ Error: Server script not found at {server_script}")
         input("Press Enter to exit...")
         return
-    
-    # Change to the script directory
-    os.chdir(script_dir)
-    print(f"Working directory: {os.getcwd()}")
-    print()
-    
+
     try:
         # Launch the server
         print("🚀 Starting Cattle AI Server...")
         print("   Press Ctrl+C to stop the server")
         print()
-        
+
         # Run the server script
-        subprocess.run([sys.executable, "cattle_ai_server.py"], check=True)
-        
+        command = [sys.executable, SERVER_SCRIPT, "--port", str(args.port), "--engine", args.engine,
+                   "--backend", args.backend, "--log-level", args.log_level]
+        if args.quantized:
+            command.append("--quantized")
+        if args.fold_normalization:
+            command.append("--fold-normalization")
+        if args.fake_latency:
+            command += ["--fake-latency", args.fake_latency]
+        if args.fake_per_item_ms is not None:
+            command += ["--fake-per-item-ms", str(args.fake_per_item_ms)]
+        if args.watch_model:
+            command.append("--watch-model")
+        if args.admin_token:
+            command += ["--admin-token", args.admin_token]
+        if args.warmup_rounds is not None:
+            command += ["--warmup-rounds", str(args.warmup_rounds)]
+        for spec in args.candidate:
+            command += ["--candidate", spec]
+        for spec in args.shadow:
+            command += ["--shadow", spec]
+        if args.record_traffic:
+            command += ["--record-traffic", args.record_traffic]
+        if args.record_sample_rate is not None:
+            command += ["--record-sample-rate", str(args.record_sample_rate)]
+        if args.record_payloads:
+            command.append("--record-payloads")
+        if args.uds is not None:
+            command += ["--uds", args.uds] if args.uds else ["--uds"]
+        if args.log_file:
+            command += ["--log-file", args.log_file]
+        subprocess.run(command, check=True)
+
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except subprocess.CalledProcessError as e:
         print(f"\n❌ Server exited with error code {e.returncode}")
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
-    
+
     print("\n✅ Launcher finished")
     input("Press Enter to exit...")
 
+
+def create_listen_socket(port: int, reuseport: bool) -> socket.socket:
+    """Bind a listening socket that forked workers can accept on"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", port))
+    sock.listen(128)
+    # Idle workers that lose the accept race return to select() instead of blocking
+    sock.setblocking(False)
+    return sock
+
+
+class PreforkSupervisor:
+    """Loads the model once, forks workers that share it, and restarts any that crash"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}  # pid -> (worker index, start time)
+        self.listen_sock = None
+        self.uds_path = None
+        self.uds_sock = None
+        self.stopping = False
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+
+    def load_shared_model(self):
+        """Load the model in the supervisor so forked workers share its weights"""
+        import robust_cattle_server as server
+        self.server = server
+        server.QUANTIZED = self.args.quantized
+        server.FOLD_NORMALIZATION = self.args.fold_normalization
+        server.ADMIN_TOKEN = self.args.admin_token
+        if self.args.fake_latency:
+            server.FAKE_LATENCY = self.args.fake_latency
+        if self.args.fake_per_item_ms is not None:
+            server.FAKE_PER_ITEM_MS = self.args.fake_per_item_ms
+        if self.args.record_sample_rate is not None:
+            server.RECORD_SAMPLE_RATE = self.args.record_sample_rate
+        server.RECORD_PAYLOADS = self.args.record_payloads
+        if self.args.warmup_rounds is not None:
+            server.WARMUP_ROUNDS = self.args.warmup_rounds
+
+        if self.args.backend == "onnxruntime":
+            # ONNX Runtime sessions own thread pools that do not survive fork; each worker loads its own
+            return
+        if self.args.backend == "fake":
+            # No weights to share
+            return
+        server.model_instance = server.CattleBreedModel(server.MODEL_PATH, server.BREEDS_FILE)
+        server.model_instance.load_model()
+        if server.model_instance.model_format == "slim":
+            # Weights are views of the memory-mapped file; share_memory() would copy them out of the page cache
+            print("✅ Model weights memory-mapped from the slim file (shared page cache)")
+        elif server.model_instance.model is not None and server.model_instance.model_format.startswith("eager"):
+            # Weight storage is mapped shared, so workers never copy it (not even on refcount writes)
+            server.model_instance.model.share_memory()
+            print("✅ Model weights placed in shared memory")
+        elif server.model_instance.model is not None:
+            # Frozen TorchScript holds its weights as constants, out of share_memory()'s reach
+            print("✅ Model loaded before forking (TorchScript weights shared copy-on-write)")
+
+    def spawn(self, index: int):
+        """Fork one worker"""
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker(index)  # never returns
+        self.workers[pid] = (index, time.time())
+        print(f"👷 Worker {index} started (pid {pid})")
+
+    def run_worker(self, index: int):
+        """Worker process body: accept on the shared port with a slice of the CPU threads"""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        server = self.server
+        exit_code = 0
+        try:
+            # The logging writer thread does not survive fork, and workers must not share one rotating file
+            log_file = self.args.log_file
+            if log_file:
+                root, ext = os.path.splitext(log_file)
+                log_file = f"{root}.worker{index}{ext}"
+            server.setup_logging(level=self.args.log_level, log_file=log_file, fmt=server.LOG_FORMAT,
+                                 debug_sample_rate=server.LOG_DEBUG_SAMPLE_RATE)
+
+            if self.args.record_traffic:
+                # One trace per worker (rotation is not safe across processes); the blob store is shared
+                server.traffic_recorder = server.create_traffic_recorder(self.args.record_traffic,
+                                                                         f"traffic.worker{index}.jsonl")
+
+            if self.args.backend == "onnxruntime":
+                server.ONNX_INTRA_OP_THREADS = self.threads_per_worker
+            elif server.TORCH_AVAILABLE:
+                server.torch.set_num_threads(self.threads_per_worker)
+
+            # Loads the ONNX session, reloader, registry (threads do not survive fork) and warms up with this
+            # worker's thread count before it accepts, so connections only go to warmed workers
+            server.readiness = server.Readiness(started=time.monotonic())
+            server.start_up(self.args.backend, self.args.candidate, self.args.shadow,
+                            watch_model=self.args.watch_model, warmup_rounds=server.WARMUP_ROUNDS)
+            if not server.readiness.ready:
+                raise RuntimeError(server.readiness.error)
+            if self.uds_sock is not None:
+                server.uds_daemon = server.start_uds_daemon(self.uds_path, sock=self.uds_sock)
+
+            sock = self.listen_sock
+            if self.args.reuseport:
+                sock = create_listen_socket(self.args.port, reuseport=True)
+
+            if self.args.engine == "asyncio":
+                server.run_async_server(server.handle_request, self.args.port, sock=sock,
+                                        max_workers=self.threads_per_worker * 2,
+                                        max_body_bytes=server.MAX_UPLOAD_BYTES,
+                                        allow_headers='Content-Type, Authorization, X-Deadline-Ms',
+                                        endpoints=server.ENDPOINTS, admission=server.admission,
+                                        admission_paths=('/predict', '/predict/batch'),
+                                        deadline_ms=server.DEFAULT_DEADLINE_MS)
+            else:
+                httpd = server.ThreadedHTTPServer(("", self.args.port), server.CattleAIHandler,
+                                                  bind_and_activate=False)
+                httpd.socket.close()
+                httpd.socket = sock
+                server.server_instance = httpd
+                httpd.serve_forever()
+        except Exception as e:
+            print(f"❌ Worker {index} error: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop(self, *_):
+        """Terminate all workers"""
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Start the workers and supervise them until interrupted"""
+        print(f"🔧 Pre-fork mode: {self.args.workers} workers x {self.threads_per_worker} "
+              f"{'ONNX Runtime' if self.args.backend == 'onnxruntime' else 'torch'} threads")
+        self.load_shared_model()
+
+        if not self.args.reuseport:
+            self.listen_sock = create_listen_socket(self.args.port, reuseport=False)
+        if self.args.uds is not None:
+            # Bound once here, like the TCP socket, so that every worker accepts on it
+            from uds_daemon import bind_socket, default_socket_path
+            self.uds_path = self.args.uds or default_socket_path()
+            self.uds_sock = bind_socket(self.uds_path)
+
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        signal.signal(signal.SIGTERM, self.stop)
+        print(f"\n🚀 Listening on port {self.args.port}. Press Ctrl+C to stop.\n")
+
+        try:
+            while self.workers:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                if pid not in self.workers:
+                    continue
+
+                index, started = self.workers.pop(pid)
+                if self.stopping:
+                    continue
+
+                code = os.waitstatus_to_exitcode(status)
+                print(f"⚠️ Worker {index} (pid {pid}) exited with code {code}, restarting")
+                if time.time() - started < MIN_WORKER_UPTIME:
+                    time.sleep(RESTART_DELAY)
+                self.spawn(index)
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping workers...")
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.stop()
+            while self.workers:
+                try:
+                    pid, _ = os.wait()
+                except ChildProcessError:
+                    break
+                self.workers.pop(pid, None)
+
+        if self.uds_sock is not None:
+            self.uds_sock.close()
+            os.unlink(self.uds_path)
+        print("✅ All workers stopped")
+
+
+def main():
+    """Launch the cattle AI server"""
+    args = parse_args()
+
+    # Get the directory where this script is located
+    script_dir = Path(__file__).parent.absolute()
+
+    print("🐄 Cattle AI Server Launcher")
+    print("=" * 40)
+    print(f"Script directory: {script_dir}")
+
+    # Change to the script directory
+    os.chdir(script_dir)
+    print(f"Working directory: {os.getcwd()}")
+
+    if args.workers <= 1:
+        run_single(script_dir, args)
+        return
+
+    if not hasattr(os, "fork"):
+        print("⚠️ Pre-fork workers need os.fork (Linux/macOS); starting a single server instead")
+        run_single(script_dir, args)
+        return
+
+    if args.reuseport and not hasattr(socket, "SO_REUSEPORT"):
+        print("⚠️ SO_REUSEPORT not available, sharing one listening socket")
+        args.reuseport = False
+
+    sys.path.insert(0, str(script_dir))
+    PreforkSupervisor(args).run()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Request Metrics for the Cattle AI Servers
+Per-stage latency histograms and request counters with lock-free per-thread accumulators, rendered for /status and /metrics.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels); +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Request path stages, in the order they happen
+STAGES = ("body_read", "multipart_parse", "decode", "preprocess", "normalize", "forward", "topk",
+          "serialize", "total")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _ThreadStats:
+    """Accumulators written only by their owning thread, so updates need no lock"""
+
+    __slots__ = ("histograms", "requests", "started", "finished")
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], List[float]] = {}  # key -> [count, sum, bucket counts...]
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.started = 0
+        self.finished = 0
+
+
+class MetricsRegistry:
+    """Collects stage latencies and request counts from every server thread.
+
+    Each thread records into its own ``_ThreadStats`` (found through a
+    ``threading.local``), so the hot path is a dict lookup, a bisect and a few
+    integer adds with no lock. Readers merge all threads' accumulators when
+    /status or /metrics is requested; stats of threads that have exited
+    (one per connection under ThreadingMixIn) are folded into a retired total
+    so memory stays bounded.
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._lock = threading.Lock()  # guards registration and merging only
+        self._threads: List[Tuple[threading.Thread, _ThreadStats]] = []
+        self._retired = _ThreadStats()
+        self.started_at = time.time()
+
+    def _stats(self) -> _ThreadStats:
+        stats = getattr(self._local, "stats", None)
+        if stats is None:
+            stats = self._local.stats = _ThreadStats()
+            with self._lock:
+                self._threads.append((threading.current_thread(), stats))
+                if len(self._threads) > 256:
+                    self._retire_dead()
+        return stats
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        """Record one stage duration for an endpoint"""
+        request_stages = getattr(self._local, "request_stages", None)
+        if request_stages is not None:
+            request_stages[stage] = request_stages.get(stage, 0.0) + seconds
+        histograms = self._stats().histograms
+        entry = histograms.get((endpoint, stage))
+        if entry is None:
+            entry = histograms[(endpoint, stage)] = [0, 0.0] + [0] * (len(self.buckets) + 1)
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2 + bisect_left(self.buckets, seconds)] += 1
+
+    def request_started(self):
+        """Count a request in flight and start collecting its own stage timings on this thread"""
+        self._stats().started += 1
+        self._local.request_stages = {}
+
+    def request_finished(self, endpoint: str, status_code: int) -> Dict[str, float]:
+        """Count a finished request; returns the stage timings observed on this thread since it started"""
+        stats = self._stats()
+        stats.finished += 1
+        key = (endpoint, status_code)
+        stats.requests[key] = stats.requests.get(key, 0) + 1
+        request_stages = getattr(self._local, "request_stages", None) or {}
+        self._local.request_stages = None
+        return request_stages
+
+    def _retire_dead(self):
+        """Fold accumulators of exited threads into the retired totals (lock held)"""
+        alive = []
+        for thread, stats in self._threads:
+            if thread.is_alive():
+                alive.append((thread, stats))
+            else:
+                self._merge_into(self._retired, stats)
+        self._threads = alive
+
+    @staticmethod
+    def _merge_into(target: _ThreadStats, source: _ThreadStats):
+        for key, entry in list(source.histograms.items()):
+            merged = target.histograms.get(key)
+            if merged is None:
+                target.histograms[key] = list(entry)
+            else:
+                for i, value in enumerate(entry):
+                    merged[i] += value
+        for key, count in list(source.requests.items()):
+            target.requests[key] = target.requests.get(key, 0) + count
+        target.started += source.started
+        target.finished += source.finished
+
+    def snapshot(self) -> _ThreadStats:
+        """Merged view of all threads (slightly stale values from running threads are fine)"""
+        with self._lock:
+            self._retire_dead()
+            total = _ThreadStats()
+            self._merge_into(total, self._retired)
+            for _, stats in self._threads:
+                self._merge_into(total, stats)
+        return total
+
+    def quantile(self, entry: List[float], q: float) -> float:
+        """Estimate a quantile from bucket counts by linear interpolation within the bucket"""
+        count = entry[0]
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for i, upper in enumerate(self.buckets):
+            in_bucket = entry[2 + i]
+            if cumulative + in_bucket >= rank and in_bucket:
+                return lower + (upper - lower) * (rank - cumulative) / in_bucket
+            cumulative += in_bucket
+            lower = upper
+        return self.buckets[-1]
+
+    def requests_total(self) -> int:
+        snapshot = self.snapshot()
+        return sum(snapshot.requests.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counts and per-endpoint, per-stage p50/p90/p99 in milliseconds, for /status"""
+        snapshot = self.snapshot()
+        latency: Dict[str, Dict[str, Any]] = {}
+        for (endpoint, stage), entry in sorted(snapshot.histograms.items(),
+                                               key=lambda item: (item[0][0], _stage_order(item[0][1]))):
+            stage_stats = {"count": entry[0], "avg_ms": round(entry[1] / entry[0] * 1000.0, 3)}
+            for q in QUANTILES:
+                stage_stats[f"p{int(q * 100)}_ms"] = round(self.quantile(entry, q) * 1000.0, 3)
+            latency.setdefault(endpoint, {})[stage] = stage_stats
+        return {
+            "requests_total": sum(snapshot.requests.values()),
+            "in_flight": snapshot.started - snapshot.finished,
+            "latency": latency,
+        }
+
+    def render_prometheus(self, extra: Optional[List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]] = None) -> str:
+        """Prometheus text exposition of the histograms, request counters and ``extra`` samples.
+
+        ``extra`` is a list of ``(name, type, help, [(labels, value), ...])``
+        metric families supplied by the server (cache, admission, model info).
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        lines.append("# HELP cattle_requests_total Requests handled, by endpoint and status code")
+        lines.append("# TYPE cattle_requests_total counter")
+        for (endpoint, status_code), count in sorted(snapshot.requests.items()):
+            lines.append(f'cattle_requests_total{{endpoint="{endpoint}",code="{status_code}"}} {count}')
+
+        lines.append("# HELP cattle_requests_in_flight Requests currently being handled")
+        lines.append("# TYPE cattle_requests_in_flight gauge")
+        lines.append(f"cattle_requests_in_flight {snapshot.started - snapshot.finished}")
+
+        histograms = sorted(snapshot.histograms.items(), key=lambda item: (item[0][0], _stage_order(item[0][1])))
+        lines.append("# HELP cattle_stage_latency_seconds Request path latency by endpoint and stage")
+        lines.append("# TYPE cattle_stage_latency_seconds histogram")
+        for (endpoint, stage), entry in histograms:
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            cumulative = 0
+            for i, upper in enumerate(self.buckets):
+                cumulative += entry[2 + i]
+                lines.append(f'cattle_stage_latency_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+            lines.append(f'cattle_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {entry[0]}')
+            lines.append(f"cattle_stage_latency_seconds_sum{{{labels}}} {entry[1]:.6f}")
+            lines.append(f"cattle_stage_latency_seconds_count{{{labels}}} {entry[0]}")
+
+        lines.append("# HELP cattle_stage_latency_quantile_seconds Estimated latency quantiles from the histogram buckets")
+        lines.append("# TYPE cattle_stage_latency_quantile_seconds gauge")
+        for (endpoint, stage), entry in histograms:
+            for q in QUANTILES:
+                lines.append(f'cattle_stage_latency_quantile_seconds{{endpoint="{endpoint}",stage="{stage}",'
+                             f'quantile="{q}"}} {self.quantile(entry, q):.6f}')
+
+        for name, metric_type, help_text, samples in extra or []:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _stage_order(stage: str) -> int:
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry shared by the servers, the asyncio engine and the model code
+METRICS = MetricsRegistry()
\ No newline at end of file
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Model Loading for the Cattle AI Servers and CLI
+Loads a frozen TorchScript export or a memory-mapped slim file (export_model.py) when one is present, otherwise
+builds ResNet18 from the checkpoint.
+"""
+
+import inspect
+import json
+import os
+import time
+import warnings
+import zipfile
+from typing import Any, Dict, List, Optional
+
+import torch
+import torch.nn as nn
+
+from prediction_cache import compute_model_version
+from serving_resnet import ResNet18
+from slim_checkpoint import load_tensors, read_metadata
+
+# Frozen TorchScript export written next to the checkpoint by export_model.py, and the INT8 one by quantize_model.py
+TORCHSCRIPT_SUFFIX = ".torchscript.pt"
+INT8_SUFFIX = ".int8.torchscript.pt"
+
+# Weights-only, memory-mapped serving file written by export_model.py --format slim
+SLIM_SUFFIX = ".safetensors"
+CLASSES_FILE = "classes.json"
+METADATA_FILE = "metadata.json"
+
+
+class LoadedModel:
+    """An inference-ready model and what the servers need to know about it"""
+
+    def __init__(self, module, classes: Optional[List[str]], model_format: str, path: str,
+                 version: str, info: Optional[Dict[str, Any]] = None):
+        self.module = module
+        self.classes = classes
+        self.format = model_format  # "eager", "eager-fused", "slim", "slim-fp16", "torchscript" or "torchscript-int8"
+        self.path = path
+        self.version = version  # content hash of the source checkpoint (prediction cache key)
+        self.info = info or {}
+        self.load_seconds = 0.0
+
+    @property
+    def normalization_folded(self) -> bool:
+        """Whether the model takes ``pixel / 255`` (ImageNet normalization folded into its first convolution)"""
+        return self.info.get("input_normalization") == "folded"
+
+
+def exported_path(checkpoint_path) -> str:
+    """Where export_model.py writes the TorchScript export of a checkpoint"""
+    path = str(checkpoint_path)
+    if path.endswith(TORCHSCRIPT_SUFFIX):
+        return path
+    return os.path.splitext(path)[0] + TORCHSCRIPT_SUFFIX
+
+
+def quantized_path(checkpoint_path) -> str:
+    """Where quantize_model.py writes the INT8 export of a checkpoint"""
+    path = str(checkpoint_path)
+    if path.endswith(INT8_SUFFIX):
+        return path
+    return os.path.splitext(path)[0] + INT8_SUFFIX
+
+
+def slim_path(checkpoint_path) -> str:
+    """Where export_model.py --format slim writes the serving file of a checkpoint"""
+    path = str(checkpoint_path)
+    if path.endswith(SLIM_SUFFIX):
+        return path
+    return os.path.splitext(path)[0] + SLIM_SUFFIX
+
+
+def build_resnet18(num_classes: int) -> nn.Module:
+    """The training architecture: torchvision ResNet18 with a ``num_classes`` head"""
+    from torchvision import models
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model
+
+
+def read_checkpoint(checkpoint_path, device="cpu"):
+    """(state_dict, classes or None, checkpoint info) from a training checkpoint or a bare state dict"""
+    checkpoint = torch.load(checkpoint_path, map_location=device, weights_only=False)
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        info = {key: checkpoint[key] for key in ('epoch', 'val_acc') if key in checkpoint}
+        return checkpoint['model_state_dict'], checkpoint.get('classes'), info
+    return checkpoint, None, {}
+
+
+def load_eager(checkpoint_path, device="cpu", channels_last: bool = False, optimize: bool = False,
+               fold_normalization: bool = False) -> LoadedModel:
+    """Build ResNet18 and load the checkpoint weights into it.
+
+    ``optimize`` runs the graph_optimize.py passes for inference (Conv+BN
+    fusion, and the input normalization folded into conv1 with
+    ``fold_normalization``); the result is no longer trainable.
+    """
+    state_dict, classes, info = read_checkpoint(checkpoint_path, device)
+    model = build_resnet18(state_dict['fc.weight'].shape[0])
+    model.load_state_dict(state_dict)
+    model.to(device)
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    model.eval()
+    model_format = "eager"
+    if optimize:
+        from graph_optimize import optimize_model
+        model = optimize_model(model, fold_normalization=fold_normalization)
+        model_format = "eager-fused"
+        if fold_normalization:
+            info["input_normalization"] = "folded"
+    return LoadedModel(model, classes, model_format, str(checkpoint_path),
+                       compute_model_version(checkpoint_path), info)
+
+
+def untrained_model(num_classes: int, checkpoint_path, device="cpu", channels_last: bool = False) -> LoadedModel:
+    """Randomly initialized ResNet18, used when no checkpoint is available"""
+    model = build_resnet18(num_classes).to(device)
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    model.eval()
+    return LoadedModel(model, None, "eager", str(checkpoint_path), compute_model_version(checkpoint_path))
+
+
+def load_slim(path, device="cpu") -> LoadedModel:
+    """Build ResNet18 without allocating weights and point it at the memory-mapped slim file.
+
+    On CPU with fp32 storage nothing is copied: parameters are views of the
+    page cache, shared by every process serving the file. fp16 storage is
+    widened to fp32 at load, which takes private memory again.
+    """
+    tensors, file_metadata = load_tensors(path)
+    metadata = json.loads(file_metadata.get("metadata", "{}"))
+    classes = json.loads(file_metadata.get("classes", "null"))
+
+    # No torchvision import and no weight allocation: parameters are assigned from the mapping below
+    with torch.device("meta"):
+        model = ResNet18(tensors["fc.weight"].shape[0], fused=metadata.get("fused") == "conv-bn")
+    for name, tensor in tensors.items():
+        if tensor.dim() == 4 and metadata.get("layout") == "channels_last":
+            tensor = tensor.permute(0, 3, 1, 2)  # stored OHWI: a channels-last OIHW view, no copy
+        if tensor.is_floating_point() and tensor.dtype != torch.float32:
+            tensor = tensor.float()
+        tensors[name] = tensor.to(device)
+    if "assign" in inspect.signature(model.load_state_dict).parameters:
+        model.load_state_dict(tensors, assign=True)
+    else:  # torch < 2.1: allocate, then copy out of the mapping
+        model.to_empty(device=device)
+        model.load_state_dict(tensors)
+    model.eval()
+
+    model_format = "slim"
+    version = metadata.get("source_version") or compute_model_version(path)
+    if metadata.get("dtype") == "float16":
+        # fp16-rounded weights give slightly different predictions, so they get their own cache entries
+        model_format = "slim-fp16"
+        version = f"{version}-fp16"
+    return LoadedModel(model, classes, model_format, str(path), version, metadata)
+
+
+def load_torchscript(path, device="cpu") -> LoadedModel:
+    """Load a frozen TorchScript export with its embedded class list and metadata"""
+    extra_files = {CLASSES_FILE: "", METADATA_FILE: ""}
+    with warnings.catch_warnings():
+        # TorchScript is deprecated upstream but remains the portable frozen format for torch>=2.0
+        warnings.simplefilter("ignore", FutureWarning)
+        module = torch.jit.load(str(path), map_location=device, _extra_files=extra_files)
+        try:
+            # Frozen-graph rewrites (prepacked conv weights etc.); they cannot be saved, so run them here
+            module = torch.jit.optimize_for_inference(module)
+        except Exception:
+            pass
+    metadata = json.loads(extra_files[METADATA_FILE] or "{}")
+    classes = json.loads(extra_files[CLASSES_FILE] or "null")
+    version = metadata.get("source_version") or compute_model_version(path)
+    model_format = "torchscript"
+    if metadata.get("dtype") == "int8":
+        # INT8 predictions differ slightly from the fp32 ones, so they get their own cache entries
+        model_format = "torchscript-int8"
+        version = f"{version}-int8"
+    return LoadedModel(module, classes, model_format, str(path), version, metadata)
+
+
+def read_export_metadata(export_file) -> Dict[str, Any]:
+    """Metadata embedded in an export, read from the archive (or slim header) without loading the model"""
+    if str(export_file).endswith(SLIM_SUFFIX):
+        return json.loads(read_metadata(export_file).get("metadata", "{}"))
+    with zipfile.ZipFile(export_file) as archive:
+        for name in archive.namelist():
+            if name.endswith(f"/extra/{METADATA_FILE}"):
+                return json.loads(archive.read(name) or b"{}")
+    return {}
+
+
+def export_is_current(export_file, checkpoint_path) -> bool:
+    """Whether an export was made from this checkpoint (size/mtime first, content hash if they differ)"""
+    if not os.path.exists(checkpoint_path):
+        return True  # deployed without the training checkpoint: the export is all there is
+    metadata = read_export_metadata(export_file)
+    stat = os.stat(checkpoint_path)
+    if metadata.get("source_size") == stat.st_size and metadata.get("source_mtime_ns") == stat.st_mtime_ns:
+        return True
+    return metadata.get("source_version") == compute_model_version(checkpoint_path)
+
+
+def load_inference_model(checkpoint_path, device="cpu", channels_last: bool = False,
+                         prefer_exported: bool = True, quantized: bool = False,
+                         fold_normalization: bool = False) -> Optional[LoadedModel]:
+    """Load the model for serving; returns None when neither the checkpoint nor an export exists.
+
+    A TorchScript export or slim file next to the checkpoint (in that order)
+    is used when it was made from that checkpoint (a stale one is ignored
+    with a warning), so starting up skips unpickling the checkpoint.
+    ``channels_last`` applies to the eager model; exports bake in their layout.
+    With ``quantized`` the INT8 export (CPU only) is tried first, falling back
+    to the fp32 model when it is missing or stale. A model built from the
+    checkpoint gets Conv+BN fusion (graph_optimize.py; TorchScript exports
+    are already fused by freezing); check ``normalization_folded`` on the
+    result to pick the matching Preprocessor.
+    """
+    started = time.perf_counter()
+    export_file = exported_path(checkpoint_path)
+    candidates = [export_file, slim_path(checkpoint_path)] if prefer_exported else []
+    if quantized:
+        int8_file = quantized_path(checkpoint_path)
+        if str(device) != "cpu":
+            print("⚠️ The INT8 model runs on CPU only, serving the fp32 model")
+        elif not os.path.exists(int8_file):
+            print(f"⚠️ {int8_file} not found, serving the fp32 model (run quantize_model.py)")
+        else:
+            candidates.insert(0, int8_file)
+    loaded = None
+    for candidate in candidates:
+        if loaded is not None or not os.path.exists(candidate):
+            continue
+        try:
+            if not export_is_current(candidate, checkpoint_path):
+                print(f"⚠️ {candidate} was exported from a different checkpoint, ignoring it "
+                      f"(re-run {'quantize_model.py' if candidate.endswith(INT8_SUFFIX) else 'export_model.py'})")
+            elif candidate.endswith(SLIM_SUFFIX):
+                loaded = load_slim(candidate, device)
+            else:
+                loaded = load_torchscript(candidate, device)
+        except Exception as e:
+            print(f"⚠️ Could not load export {candidate}: {e}")
+    if loaded is None and os.path.exists(checkpoint_path) and str(checkpoint_path) not in candidates:
+        loaded = load_eager(checkpoint_path, device, channels_last, optimize=True,
+                            fold_normalization=fold_normalization)
+    if loaded is not None:
+        loaded.load_seconds = time.perf_counter() - started
+    return loaded
\ No newline at end of file
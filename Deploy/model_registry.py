@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Model Registry for the Cattle AI Servers
+Holds candidate models next to the primary one, routes a configurable share of /predict traffic to each, and runs
+shadow models on a background executor to compare them with the primary without touching the response path.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import MetricsRegistry
+from server_logging import get_logger
+
+PRIMARY_NAME = "primary"
+
+# Shadow executor defaults: worker threads, and queued comparisons beyond which new ones are dropped
+DEFAULT_SHADOW_WORKERS = 1
+DEFAULT_SHADOW_MAX_PENDING = 64
+
+logger = get_logger("registry")
+
+
+def parse_model_spec(spec: str) -> Dict[str, Any]:
+    """``name=path[,weight=PCT][,backend=torch|onnxruntime][,quantized]`` -> dict"""
+    name, _, rest = spec.partition("=")
+    path, *options = rest.split(",")
+    if not name or not path:
+        raise ValueError(f"model spec {spec!r} is not name=path[,weight=PCT][,backend=B][,quantized]")
+    if name == PRIMARY_NAME:
+        raise ValueError(f"{PRIMARY_NAME!r} is reserved for the main model")
+    parsed = {"name": name, "path": path, "weight": 0.0, "backend": None, "quantized": False}
+    for option in options:
+        key, _, value = option.partition("=")
+        if key == "weight":
+            parsed["weight"] = float(value)
+        elif key == "backend":
+            parsed["backend"] = value
+        elif key == "quantized" and not value:
+            parsed["quantized"] = True
+        else:
+            raise ValueError(f"unknown option {option!r} in model spec {spec!r}")
+    return parsed
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), or None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def weights_bytes(model) -> Optional[int]:
+    """Size of a loaded model's weights: its tensors, or the file they were loaded from
+    (frozen TorchScript inlines weights as graph constants and ONNX Runtime keeps its own copy)"""
+    backend = getattr(model, "backend", None)
+    if backend is None:
+        return None
+    module = backend.model
+    if hasattr(module, "parameters"):
+        tensors = list(module.parameters()) + list(module.buffers())
+        if tensors:
+            return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    try:
+        return os.path.getsize(backend.path)
+    except (OSError, TypeError):
+        return None
+
+
+class RegisteredModel:
+    """A loaded candidate model with its share of traffic"""
+
+    def __init__(self, name: str, model, weight: float = 0.0, shadow: bool = False,
+                 load_rss_bytes: Optional[int] = None):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.shadow = shadow
+        self.weights_bytes = weights_bytes(model)
+        self.load_rss_bytes = load_rss_bytes
+
+        # Shadow comparisons against the primary
+        self.compared = 0
+        self.top1_agree = 0
+        self.top3_agree = 0
+        self.errors = 0
+
+
+class ModelRegistry:
+    """The primary model plus routed and shadow candidates.
+
+    ``get_primary()`` returns the current primary model (the server's
+    ``model_instance``, which hot reload may swap). Routed candidates get
+    ``weight`` percent of /predict requests each and the primary the rest.
+    Shadow candidates never answer a request: after the primary answers,
+    ``shadow()`` queues the same image for them on a background executor and
+    records top-1/top-3 agreement and latency; when more than
+    ``shadow_max_pending`` comparisons are waiting, new ones are dropped
+    instead of queued.
+    """
+
+    def __init__(self, get_primary: Callable[[], Any], shadow_workers: int = DEFAULT_SHADOW_WORKERS,
+                 shadow_max_pending: int = DEFAULT_SHADOW_MAX_PENDING):
+        self.get_primary = get_primary
+        self.shadow_workers = max(1, shadow_workers)
+        self.shadow_max_pending = shadow_max_pending
+        self.candidates: Dict[str, RegisteredModel] = {}
+        self.latency = MetricsRegistry()
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self.shadow_dropped = 0
+
+    def load(self, name: str, build_model: Callable[[], Any], weight: float = 0.0,
+             shadow: bool = False) -> RegisteredModel:
+        """Build a candidate with ``build_model()`` and register it; ValueError if it is unusable"""
+        if name == PRIMARY_NAME or name in self.candidates:
+            raise ValueError(f"a model named {name!r} is already registered")
+        if shadow and weight:
+            raise ValueError(f"shadow model {name!r} cannot also take routed traffic")
+        routed = sum(entry.weight for entry in self.candidates.values())
+        if weight < 0 or routed + weight > 100:
+            raise ValueError(f"routing weights must be >= 0 and add up to at most 100 (got {routed + weight:g})")
+        before = rss_bytes()
+        model = build_model()
+        after = rss_bytes()
+        if not model.is_loaded or model.backend is None:
+            raise ValueError(f"model {name!r} did not load")
+        entry = RegisteredModel(name, model, weight, shadow,
+                                after - before if before is not None and after is not None else None)
+        self.candidates[name] = entry
+        return entry
+
+    @property
+    def shadows(self) -> List[RegisteredModel]:
+        return [entry for entry in self.candidates.values() if entry.shadow]
+
+    def route(self) -> Tuple[str, Any]:
+        """(name, model) that should answer the next /predict request"""
+        point = random.random() * 100.0
+        for entry in self.candidates.values():
+            if entry.weight and not entry.shadow:
+                if point < entry.weight:
+                    return entry.name, entry.model
+                point -= entry.weight
+        return PRIMARY_NAME, self.get_primary()
+
+    def observe(self, name: str, seconds: float):
+        """Record how long ``name`` took to answer a request"""
+        self.latency.observe(name, "predict", seconds)
+
+    def shadow(self, image_data: bytes, primary_result: Dict[str, Any], primary_seconds: float):
+        """Queue shadow predictions for an image the primary answered (returns immediately)"""
+        # Mock, failed and cached primary answers are no baseline for a comparison
+        if (not self.candidates or "error" in primary_result or "note" in primary_result
+                or primary_result.get("cached")):
+            return
+        for entry in self.shadows:
+            with self._lock:
+                if self._pending >= self.shadow_max_pending:
+                    self.shadow_dropped += 1
+                    continue
+                self._pending += 1
+                if self._executor is None or self._executor_pid != os.getpid():
+                    # Executor threads do not survive fork
+                    self._executor_pid = os.getpid()
+                    self._executor = ThreadPoolExecutor(max_workers=self.shadow_workers,
+                                                        thread_name_prefix="shadow")
+            self._executor.submit(self._run_shadow, entry, image_data, primary_result, primary_seconds)
+
+    def _run_shadow(self, entry: RegisteredModel, image_data: bytes, primary_result: Dict[str, Any],
+                    primary_seconds: float):
+        try:
+            started = time.perf_counter()
+            result = entry.model.predict(image_data)
+            seconds = time.perf_counter() - started
+            self.latency.observe(entry.name, "shadow", seconds)
+            if "error" in result:
+                entry.errors += 1
+                logger.warning("Shadow prediction failed", extra={"model": entry.name, "error": result["error"]})
+                return
+            top1 = result["prediction"] == primary_result["prediction"]
+            top3 = primary_result["prediction"] in [item["breed"] for item in result["top_predictions"]]
+            entry.compared += 1
+            entry.top1_agree += top1
+            entry.top3_agree += top3
+            logger.info("shadow", extra={
+                "model": entry.name, "model_version": result.get("model_version"),
+                "prediction": result["prediction"], "primary_prediction": primary_result["prediction"],
+                "top1_agree": top1, "top3_agree": top3,
+                "duration_ms": round(seconds * 1000.0, 3), "primary_duration_ms": round(primary_seconds * 1000.0, 3),
+            })
+        except Exception:
+            entry.errors += 1
+            logger.exception("Shadow prediction failed", extra={"model": entry.name})
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-model role, traffic share, memory and latency, and shadow agreement, for /status"""
+        latency = self.latency.get_stats()["latency"]
+        primary = self.get_primary()
+        routed = sum(entry.weight for entry in self.candidates.values() if not entry.shadow)
+        models = {PRIMARY_NAME: {
+            "role": "primary",
+            "weight": round(100.0 - routed, 3),
+            "model_version": getattr(primary, "model_version", None),
+            "model_format": getattr(primary, "model_format", None),
+            "weights_mb": _mb(weights_bytes(primary)),
+            "load_rss_mb": None,
+            "latency": latency.get(PRIMARY_NAME, {}),
+        }}
+        for entry in self.candidates.values():
+            stats = {
+                "role": "shadow" if entry.shadow else "candidate",
+                "weight": entry.weight,
+                "model_version": entry.model.model_version,
+                "model_format": entry.model.model_format,
+                "weights_mb": _mb(entry.weights_bytes),
+                "load_rss_mb": _mb(entry.load_rss_bytes),
+                "latency": latency.get(entry.name, {}),
+            }
+            if entry.shadow:
+                stats.update({
+                    "compared": entry.compared,
+                    "top1_agreement": round(entry.top1_agree / entry.compared, 4) if entry.compared else None,
+                    "top3_agreement": round(entry.top3_agree / entry.compared, 4) if entry.compared else None,
+                    "errors": entry.errors,
+                })
+            models[entry.name] = stats
+        return {"models": models, "shadow_pending": self._pending, "shadow_dropped": self.shadow_dropped}
+
+
+def _mb(size: Optional[int]) -> Optional[float]:
+    return round(size / (1024 * 1024), 2) if size is not None else None
\ No newline at end of file
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Zero-Downtime Model Reload for the Cattle AI Servers
+Loads a replacement model on a background thread, checks it on golden images and then swaps it in. Requests that
+already hold the old model finish on it; the old model's threads are released after a grace period.
+"""
+
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Golden images: the app's bundled photos (the same ones the export and benchmark checks use)
+GOLDEN_IMAGES_DIR = Path(__file__).resolve().parent.parent / "assets"
+GOLDEN_IMAGE_LIMIT = 4
+
+# Default watcher poll interval, and how long a replaced model is kept for requests still running on it
+DEFAULT_POLL_SECONDS = 2.0
+DEFAULT_RETIRE_AFTER_SECONDS = 60.0
+
+
+def golden_images(directory: Path = GOLDEN_IMAGES_DIR, limit: int = GOLDEN_IMAGE_LIMIT) -> List[bytes]:
+    """Encoded bytes of up to ``limit`` sample photos, in a stable order"""
+    paths = sorted(directory.glob("*.jpg")) + sorted(directory.glob("*.png"))
+    return [path.read_bytes() for path in paths[:limit]]
+
+
+def file_signature(paths: Sequence) -> Tuple:
+    """(path, mtime, size) of every existing path; changes whenever one is written, replaced or removed"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ModelReloader:
+    """Replaces the serving model without stopping the server.
+
+    ``build_model()`` returns a new, loaded model object (the server's model
+    class), ``get_model()`` the one currently serving and ``swap_model(model)``
+    makes the new one current, which must be a single reference assignment so
+    handlers that already captured the old model keep using it. A reload runs
+    in order: build, validate on the golden images (which also warms the
+    batch path), swap, and after ``retire_after_seconds`` call the old
+    model's ``retire()``. A model that fails to load or validate is discarded
+    and the current one keeps serving.
+
+    ``start_watching()`` polls ``watch_paths`` and reloads once a change has
+    been stable for one poll interval, so a checkpoint still being copied is
+    not picked up half-written.
+    """
+
+    def __init__(self, build_model: Callable[[], Any], get_model: Callable[[], Any],
+                 swap_model: Callable[[Any], None], watch_paths: Sequence = (),
+                 poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 retire_after_seconds: float = DEFAULT_RETIRE_AFTER_SECONDS,
+                 golden: Optional[List[bytes]] = None):
+        self.build_model = build_model
+        self.get_model = get_model
+        self.swap_model = swap_model
+        self.watch_paths = list(watch_paths)
+        self.poll_seconds = poll_seconds
+        self.retire_after_seconds = retire_after_seconds
+        self.golden = golden if golden is not None else golden_images()
+
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._worker = None
+        self._watcher = None
+        self._watcher_pid = None
+        self._stopped = threading.Event()
+
+        # Counters for /status
+        self.reloads = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def request_reload(self, reason: str = "admin", force: bool = True) -> bool:
+        """Start a reload on a background thread; False if one is already running"""
+        with self._lock:
+            if self.in_progress:
+                return False
+            self._worker = threading.Thread(target=self.reload, args=(reason, force),
+                                            name="model-reload", daemon=True)
+            self._worker.start()
+            return True
+
+    @property
+    def in_progress(self) -> bool:
+        return self._reload_lock.locked() or (self._worker is not None and self._worker.is_alive())
+
+    def reload(self, reason: str = "admin", force: bool = True) -> Dict[str, Any]:
+        """Build, validate and swap in a new model; returns (and records) the outcome.
+
+        Without ``force`` a model with the same version and format as the
+        current one is discarded instead of swapped in.
+        """
+        with self._reload_lock:
+            return self._reload(reason, force)
+
+    def _reload(self, reason: str, force: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        current = self.get_model()
+        result = {"reason": reason, "started_at": time.time(),
+                  "previous_version": getattr(current, "model_version", None)}
+        candidate = None
+        try:
+            candidate = self.build_model()
+            result["version"] = candidate.model_version
+            result["format"] = candidate.model_format
+            error = self.validate(candidate)
+            if error is not None:
+                raise ValueError(error)
+            if (not force and current is not None and current.is_loaded
+                    and (candidate.model_version, candidate.model_format)
+                    == (current.model_version, current.model_format)):
+                result["status"] = "unchanged"
+                self.skipped += 1
+                self._retire(candidate, delay=0.0)
+            else:
+                self.swap_model(candidate)
+                result["status"] = "swapped"
+                self.reloads += 1
+                if current is not None:
+                    self._retire(current, delay=self.retire_after_seconds)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+            self.failures += 1
+            if candidate is not None:
+                self._retire(candidate, delay=0.0)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self.last_result = result
+        status = {"swapped": "✅ Model reloaded", "unchanged": "ℹ️ Model unchanged, kept",
+                  "failed": "❌ Model reload failed, kept"}[result["status"]]
+        print(f"{status}: {result.get('previous_version')} -> {result.get('version')} "
+              f"({reason}, {result['seconds']:.2f}s){' - ' + result['error'] if 'error' in result else ''}")
+        return result
+
+    def validate(self, model) -> Optional[str]:
+        """None if ``model`` loaded and gives sane predictions for every golden image, else the reason"""
+        if not model.is_loaded or model.backend is None:
+            return "model did not load (the server would fall back to mock predictions)"
+        if not self.golden:
+            return None
+        results = model.predict_batch(self.golden)
+        for index, result in enumerate(results):
+            if "error" in result:
+                return f"golden image {index}: {result['error']}"
+            confidence = result.get("confidence")
+            if result.get("prediction") not in model.breeds:
+                return f"golden image {index}: unknown breed {result.get('prediction')!r}"
+            if not isinstance(confidence, float) or not math.isfinite(confidence) or not 0.0 <= confidence <= 1.0:
+                return f"golden image {index}: invalid confidence {confidence!r}"
+        return None
+
+    def _retire(self, model, delay: float):
+        retire = getattr(model, "retire", None)
+        if retire is None:
+            return
+        if delay <= 0:
+            retire()
+            return
+        timer = threading.Timer(delay, retire)
+        timer.daemon = True
+        timer.start()
+
+    def start_watching(self):
+        """Start the file watcher thread (again after a fork, threads do not survive it)"""
+        if not self.watch_paths:
+            return
+        if self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return
+        self._stopped.clear()
+        self._watcher_pid = os.getpid()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        """Stop the file watcher"""
+        self._stopped.set()
+
+    def _watch(self):
+        """Watcher loop: reload once the watched files changed and then stayed the same for one poll"""
+        active = file_signature(self.watch_paths)
+        previous = active
+        while not self._stopped.wait(self.poll_seconds):
+            current = file_signature(self.watch_paths)
+            if current != active and current == previous and current:
+                # Recorded before loading: a write during the reload triggers another one
+                active = current
+                self.reload(reason="file change", force=False)
+            previous = current
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Reload counters and the last outcome, for /status"""
+        return {
+            "watching": [str(path) for path in self.watch_paths] if self._watcher is not None else [],
+            "in_progress": self.in_progress,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "golden_images": len(self.golden),
+            "last": self.last_result,
+        }
\ No newline at end of file
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Multipart Upload Helpers
+Shared multipart/form-data parsing and image checks for the cattle AI servers.
+"""
+
+import email
+import io
+import re
+import time
+from email.parser import BytesHeaderParser
+from typing import Any, Dict, List, Optional
+
+# Common image file signatures (JPEG, PNG, GIF, WebP/RIFF)
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG', b'GIF8', b'RIFF')
+MIN_IMAGE_BYTES = 100
+
+# Upload limits and read size
+DEFAULT_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised before reading a request body that exceeds the upload limit"""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Upload of {size} bytes exceeds the {limit} byte limit")
+        self.size = size
+        self.limit = limit
+
+
+class MultipartPart:
+    """One form-data part; ``data`` is a memoryview into the request body buffer"""
+
+    __slots__ = ("name", "filename", "content_type", "data")
+
+    def __init__(self, name: Optional[str], filename: Optional[str], content_type: str, data: memoryview):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview, so decoders need no full copy"""
+
+    def __init__(self, view):
+        self._view = memoryview(view).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def payload_stream(data):
+    """File object over upload bytes without copying them"""
+    if isinstance(data, bytes):
+        return io.BytesIO(data)  # BytesIO shares an immutable bytes buffer
+    return BufferReader(data)
+
+
+def get_boundary(content_type: str) -> str:
+    """Extract the multipart boundary from a Content-Type header"""
+    boundary_match = re.search(r'boundary=([^;\r\n]+)', content_type)
+    if not boundary_match:
+        raise ValueError("No boundary found in multipart data")
+    return boundary_match.group(1).strip().strip('"')
+
+
+class MultipartReader:
+    """Incremental multipart/form-data parser.
+
+    The body is read from the socket in ``chunk_size`` pieces straight into one
+    preallocated buffer (the only copy of the upload), and boundary delimiters
+    are located as each chunk arrives. Parts are returned as memoryview slices
+    of that buffer, so the file payload reaches the image decoder uncopied.
+    """
+
+    def __init__(self, boundary: str, max_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+                 chunk_size: int = READ_CHUNK_SIZE):
+        self.boundary = boundary.encode('latin-1')
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._delimiter = b"\r\n--" + self.boundary
+
+    def read(self, rfile, content_length: int,
+             timings: Optional[Dict[str, float]] = None) -> List[MultipartPart]:
+        """Read ``content_length`` bytes from ``rfile`` and split them into parts.
+        
+        If ``timings`` is given, the seconds spent receiving the body (including
+        the incremental delimiter scan) and splitting the parts are stored under
+        ``body_read`` and ``multipart_parse``.
+        """
+        if content_length > self.max_bytes:
+            raise UploadTooLarge(content_length, self.max_bytes)
+
+        started = time.perf_counter()
+        buf = bytearray(content_length)
+        view = memoryview(buf)
+        delimiters = []
+        filled = 0
+        scan_from = 0
+        overlap = len(self._delimiter) - 1
+
+        while filled < content_length:
+            n = rfile.readinto(view[filled:min(filled + self.chunk_size, content_length)])
+            if not n:
+                raise ValueError(f"Request body ended after {filled} of {content_length} bytes")
+            filled += n
+            scan_from = self._scan(buf, scan_from, filled, delimiters)
+            scan_from = max(scan_from, filled - overlap)
+
+        if timings is None:
+            return self._split(buf, view, delimiters)
+        read_done = time.perf_counter()
+        parts = self._split(buf, view, delimiters)
+        timings["body_read"] = read_done - started
+        timings["multipart_parse"] = time.perf_counter() - read_done
+        return parts
+
+    def parse(self, body) -> List[MultipartPart]:
+        """Split an already-read body (bytes or bytearray) into parts"""
+        if len(body) > self.max_bytes:
+            raise UploadTooLarge(len(body), self.max_bytes)
+        view = memoryview(body)
+        delimiters = []
+        self._scan(body, 0, len(body), delimiters)
+        return self._split(body, view, delimiters)
+
+    def _scan(self, buf, start: int, end: int, delimiters: List[int]) -> int:
+        """Record delimiter positions found in buf[start:end]; return where to resume"""
+        if not delimiters and start == 0:
+            # The opening delimiter has no leading CRLF
+            opening = b"--" + self.boundary
+            if end < len(opening):
+                return 0
+            if buf.startswith(opening):
+                delimiters.append(-2)
+                start = len(opening)
+        while True:
+            pos = buf.find(self._delimiter, start, end)
+            if pos < 0:
+                return start
+            delimiters.append(pos)
+            start = pos + len(self._delimiter)
+
+    def _split(self, buf, view: memoryview, delimiters: List[int]) -> List[MultipartPart]:
+        """Turn consecutive delimiter positions into parts"""
+        if not delimiters:
+            raise ValueError("Failed to parse multipart data")
+
+        parts = []
+        for start, end in zip(delimiters, delimiters[1:]):
+            segment_start = start + len(self._delimiter)
+            header_end = buf.find(b"\r\n\r\n", segment_start, end)
+            if header_end < 0:
+                continue
+            # Headers follow the CRLF that ends the delimiter line
+            line_end = buf.find(b"\r\n", segment_start, end)
+            headers = BytesHeaderParser().parsebytes(bytes(view[line_end + 2:header_end + 4]))
+            parts.append(MultipartPart(
+                name=headers.get_param('name', header='content-disposition'),
+                filename=headers.get_filename(),
+                content_type=headers.get_content_type(),
+                data=view[header_end + 4:end],
+            ))
+        return parts
+
+
+def read_multipart(rfile, content_type: str, content_length: int,
+                   max_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+                   timings: Optional[Dict[str, float]] = None) -> List[MultipartPart]:
+    """Stream a multipart/form-data request body from ``rfile`` into parts"""
+    return MultipartReader(get_boundary(content_type), max_bytes=max_bytes).read(rfile, content_length, timings)
+
+
+def parse_multipart_email(content_type: str, body: bytes) -> List[Dict[str, Any]]:
+    """Previous email-module based parser, kept as the benchmark reference.
+
+    Each part is returned as a dict with ``name``, ``filename``,
+    ``content_type`` and ``data`` (the decoded payload bytes).
+    """
+    boundary = get_boundary(content_type)
+
+    # Give the email parser a proper MIME header to work from
+    mime_header = f"Content-Type: multipart/form-data; boundary={boundary}\r\n\r\n".encode()
+    msg = email.message_from_bytes(mime_header + body)
+    if not msg.is_multipart():
+        raise ValueError("Failed to parse multipart data")
+
+    parts = []
+    for part in msg.get_payload():
+        parts.append({
+            "name": part.get_param('name', header='content-disposition'),
+            "filename": part.get_filename(),
+            "content_type": part.get_content_type(),
+            "data": part.get_payload(decode=True) or b"",
+        })
+    return parts
+
+
+def is_image_data(data) -> bool:
+    """Check that a payload is large enough and starts with a known image signature"""
+    return len(data) > MIN_IMAGE_BYTES and bytes(data[:4]).startswith(IMAGE_SIGNATURES)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Pre-decoded Pixel Uploads for the Cattle AI Servers
+Reads /predict and /predict/batch bodies that carry images already resized to the model input on the device, as
+N x H x W x 3 uint8 RGB: either raw bytes (application/x-rgb8 with X-Image-* dimension headers) or a NumPy .npy
+file (application/x-npy). The body is read into one writable buffer that Preprocessor.from_buffer wraps in place,
+so neither PIL nor a copy is involved.
+"""
+
+import ast
+import struct
+from typing import Tuple
+
+from preprocessing import INPUT_SIZE
+
+RGB8_CONTENT_TYPE = "application/x-rgb8"
+NPY_CONTENT_TYPE = "application/x-npy"
+PIXEL_CONTENT_TYPES = (RGB8_CONTENT_TYPE, NPY_CONTENT_TYPE)
+
+# Dimension headers of an application/x-rgb8 body (the count defaults to 1)
+COUNT_HEADER = "X-Image-Count"
+HEIGHT_HEADER = "X-Image-Height"
+WIDTH_HEADER = "X-Image-Width"
+
+NPY_MAGIC = b"\x93NUMPY"
+NPY_UINT8 = ("|u1", "<u1", ">u1", "u1")
+# Same limit as numpy.load
+NPY_MAX_HEADER_BYTES = 10000
+
+
+def is_pixel_upload(content_type: str) -> bool:
+    """Whether a Content-Type is one of the pre-decoded pixel formats"""
+    return content_type.split(';')[0].strip().lower() in PIXEL_CONTENT_TYPES
+
+
+def read_body(rfile, length: int) -> bytearray:
+    """The request body in a writable buffer (tensors wrapping it need not copy or warn)"""
+    body = bytearray(length)
+    view = memoryview(body)
+    filled = 0
+    while filled < length:
+        read = rfile.readinto(view[filled:])
+        if not read:
+            raise ValueError(f"Body ended after {filled} of {length} bytes")
+        filled += read
+    return body
+
+
+def _header_int(headers, name: str, default=None) -> int:
+    value = headers.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"Missing {name} header")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def _npy_shape(body) -> Tuple[Tuple[int, ...], int]:
+    """Shape and data offset of a C-ordered uint8 .npy file"""
+    if bytes(body[:6]) != NPY_MAGIC or len(body) < 10:
+        raise ValueError("Not a .npy file")
+    major = body[6]
+    if major == 1:
+        (header_length,) = struct.unpack_from("<H", body, 8)
+        start = 10
+    elif major in (2, 3):
+        (header_length,) = struct.unpack_from("<I", body, 8)
+        start = 12
+    else:
+        raise ValueError(f"Unsupported .npy version {major}")
+    if header_length > NPY_MAX_HEADER_BYTES:
+        raise ValueError(".npy header too large")
+    try:
+        header = ast.literal_eval(bytes(body[start:start + header_length]).decode("latin-1"))
+        descr, fortran_order, shape = header["descr"], header["fortran_order"], tuple(header["shape"])
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        raise ValueError("Malformed .npy header")
+    if descr not in NPY_UINT8:
+        raise ValueError(f".npy array must be uint8, got {descr}")
+    if fortran_order:
+        raise ValueError(".npy array must be C-ordered")
+    return shape, start + header_length
+
+
+def parse_pixel_upload(body, content_type: str, headers, size: Tuple[int, int] = INPUT_SIZE,
+                       max_images: int = 1) -> Tuple[int, int]:
+    """(image count, data offset) of a validated pixel upload of ``size`` (height, width) RGB images.
+
+    Raises ValueError when the dimensions, dtype or length do not match.
+    """
+    if content_type.split(';')[0].strip().lower() == NPY_CONTENT_TYPE:
+        shape, offset = _npy_shape(body)
+        if len(shape) == 3:
+            shape = (1,) + shape
+        if len(shape) != 4:
+            raise ValueError(f".npy shape must be (N, H, W, 3), got {shape}")
+        count, height, width, channels = shape
+    else:
+        offset = 0
+        count = _header_int(headers, COUNT_HEADER, 1)
+        height = _header_int(headers, HEIGHT_HEADER)
+        width = _header_int(headers, WIDTH_HEADER)
+        channels = 3
+    if (height, width, channels) != (size[0], size[1], 3):
+        raise ValueError(f"Images must be {size[0]}x{size[1]}x3 RGB, got {height}x{width}x{channels}")
+    if count < 1:
+        raise ValueError("No images in upload")
+    if count > max_images:
+        raise ValueError(f"{count} images sent, at most {max_images} allowed here")
+    expected = offset + count * height * width * channels
+    if len(body) != expected:
+        raise ValueError(f"Expected {expected} bytes for {count} images, got {len(body)}")
+    return count, offset
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Prediction Cache
+Remembers predictions by image hash + model id and version, with LRU/TTL eviction and an optional SQLite tier.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Default cache limits
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 3600.0
+
+# SQLite tier limits (the whole file, shared by every model using it) and how often they are enforced
+DEFAULT_DISK_MAX_ENTRIES = 100000
+DEFAULT_DISK_MAX_BYTES = 256 * 1024 * 1024
+DISK_SWEEP_INTERVAL_SECONDS = 60.0
+
+
+def compute_model_version(model_path) -> str:
+    """Short content hash of a model checkpoint, used to key and invalidate cached predictions"""
+    if not model_path or not os.path.exists(model_path):
+        return "untrained"
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of prediction results keyed by sha256(model id + model version + image bytes).
+
+    Entries expire after ``ttl_seconds`` and the least recently used ones are
+    evicted once either ``max_entries`` or ``max_bytes`` (approximate JSON size
+    of the cached results) is exceeded. When ``disk_path`` is given, entries are
+    also written to a SQLite database so they survive server restarts. At most
+    every ``DISK_SWEEP_INTERVAL_SECONDS`` a write also deletes expired rows and
+    then the oldest ones until the database is within ``disk_max_entries`` and
+    ``disk_max_bytes``.
+
+    Several models (registry candidates, a hot-reloaded model next to the one
+    it replaces) may share the database; ``model_id`` names the model this
+    cache belongs to. It is part of the key, so models never see each other's
+    results even under the same version string, and a version change only
+    drops that model's entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 disk_path: Optional[str] = None, model_id: str = "",
+                 disk_max_entries: int = DEFAULT_DISK_MAX_ENTRIES,
+                 disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.model_id = model_id
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.model_version = None
+
+        self._entries = OrderedDict()  # key -> (created, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._next_sweep = 0.0
+
+        # Counters for /status
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.disk_evictions = 0
+        self.disk_expirations = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str):
+        """Open (or create) the SQLite second tier"""
+        directory = os.path.dirname(disk_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, model_version TEXT, created REAL, result TEXT, model_id TEXT DEFAULT '')"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(predictions)")]
+        if "model_id" not in columns:
+            # Databases from before model_id was recorded
+            self._db.execute("ALTER TABLE predictions ADD COLUMN model_id TEXT DEFAULT ''")
+        self._db.execute("CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)")
+        with self._lock:
+            self._sweep_disk(time.time())
+
+    def make_key(self, image_data: bytes) -> str:
+        """Content address for an image under this model and its current version"""
+        digest = hashlib.sha256(f"{self.model_id}\0{self.model_version or ''}\0".encode())
+        digest.update(image_data)
+        return digest.hexdigest()
+
+    def set_model_version(self, model_version: str):
+        """Switch to a new model version, dropping everything cached for older versions of this model"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            if self.model_version is not None:
+                self.invalidations += 1
+            self.model_version = model_version
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE model_id = ? AND model_version != ?",
+                                 (self.model_id, model_version))
+
+    def get(self, image_data: bytes) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for these image bytes, or None"""
+        key = self.make_key(image_data)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, _, result = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result)
+                self._remove(key)
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, result FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[0] <= self.ttl_seconds:
+                    result = json.loads(row[1])
+                    self._insert(key, row[0], result, len(row[1]))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def put(self, image_data: bytes, result: Dict[str, Any]):
+        """Cache a successful prediction result"""
+        key = self.make_key(image_data)
+        encoded = json.dumps(result)
+        created = time.time()
+        with self._lock:
+            self._insert(key, created, dict(result), len(encoded))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, model_version, created, result, model_id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, self.model_version, created, encoded, self.model_id)
+                )
+                if created >= self._next_sweep:
+                    self._sweep_disk(created)
+
+    def clear(self):
+        """Drop all entries cached for this model"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE model_id = ?", (self.model_id,))
+
+    def _insert(self, key: str, created: float, result: Dict[str, Any], size: int):
+        """Add an entry and evict least recently used ones until within limits (lock held)"""
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (created, size, result)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _sweep_disk(self, now: float):
+        """Delete expired rows, then the oldest ones beyond the disk limits (lock held)"""
+        self._next_sweep = now + DISK_SWEEP_INTERVAL_SECONDS
+        expired = self._db.execute("DELETE FROM predictions WHERE created < ?", (now - self.ttl_seconds,))
+        self.disk_expirations += expired.rowcount
+        # Keep the newest rows while both the running row count and byte total are within the limits
+        evicted = self._db.execute(
+            "DELETE FROM predictions WHERE key IN ("
+            "SELECT key FROM (SELECT key, ROW_NUMBER() OVER newest AS row, SUM(LENGTH(result)) OVER newest AS size "
+            "FROM predictions WINDOW newest AS (ORDER BY created DESC)) WHERE row > ? OR size > ?)",
+            (self.disk_max_entries, self.disk_max_bytes)
+        )
+        self.disk_evictions += evicted.rowcount
+
+    def _remove(self, key: str):
+        """Remove one in-memory entry (lock held)"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy, for /status"""
+        lookups = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "disk_tier": self.disk_path,
+            "disk_max_entries": self.disk_max_entries,
+            "disk_max_bytes": self.disk_max_bytes,
+            "disk_evictions": self.disk_evictions,
+            "disk_expirations": self.disk_expirations,
+        }
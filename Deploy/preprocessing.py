@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared Image Preprocessing
+Resize and ImageNet-normalize decoded images for the model, used by the servers, the CLI and the trainer.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None  # ONNX Runtime serving uses the NumPy path
+
+try:
+    from PIL import Image
+    RESAMPLE_BILINEAR = Image.Resampling.BILINEAR
+except ImportError:
+    Image = None
+    RESAMPLE_BILINEAR = 2
+
+# Model input size (height, width) and the ImageNet statistics the model was trained with
+INPUT_SIZE = (224, 224)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Buffers in the pool shared_batch() draws from: how many batches threads can normalize and run at once
+DEFAULT_SHARED_BUFFERS = 4
+
+
+class Preprocessor:
+    """Turns decoded RGB images into a normalized float batch.
+
+    ``pixels()`` resizes to the model input exactly like torchvision's
+    ``Resize`` on a PIL image (bilinear with antialiasing) and returns the
+    HWC uint8 pixels. ``batch()`` then writes ``pixel * 1/(255*std) - mean/std``
+    for every image into a preallocated NCHW float buffer in a single fused
+    ``addcmul`` per image, replacing ToTensor + Normalize (three passes and
+    two float temporaries). The buffer is per thread, grows to the largest
+    batch seen and is reused, so steady-state batches allocate no float
+    memory. It can be channels-last (matching a channels-last model) and
+    pinned for asynchronous host-to-GPU copies. Servers that run batches on
+    short-lived per-connection threads use ``shared_batch()`` instead, which
+    draws from a pool of at most ``max_shared_buffers`` buffers shared by all
+    threads, so a new thread does not allocate (and pin) a buffer of its own.
+
+    With ``use_numpy`` (or when torch is not installed) pixels and batches
+    are NumPy arrays instead, normalized with two in-place ufuncs into an
+    NCHW float32 buffer, which is what ONNX Runtime takes.
+
+    ``normalize=False`` only scales to ``pixel / 255``, for models with the
+    normalization folded into their first convolution (graph_optimize.py).
+    """
+
+    def __init__(self, size: Tuple[int, int] = INPUT_SIZE,
+                 mean: Sequence[float] = IMAGENET_MEAN, std: Sequence[float] = IMAGENET_STD,
+                 channels_last: bool = False, pin_memory: bool = False, use_numpy: bool = False,
+                 normalize: bool = True, max_shared_buffers: int = DEFAULT_SHARED_BUFFERS):
+        self.height, self.width = size
+        self.use_numpy = use_numpy or torch is None
+        self.channels_last = channels_last and not self.use_numpy
+        self.pin_memory = pin_memory and not self.use_numpy and torch.cuda.is_available()
+        if not normalize:
+            mean, std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        scale = [1.0 / (255.0 * s) for s in std]
+        shift = [-m / s for m, s in zip(mean, std)]
+        self.normalize = any(shift)
+        if self.use_numpy:
+            self._scale = np.array(scale, dtype=np.float32).reshape(3, 1, 1)
+            self._shift = np.array(shift, dtype=np.float32).reshape(3, 1, 1)
+        else:
+            self._scale = torch.tensor(scale).view(3, 1, 1)
+            self._shift = torch.tensor(shift).view(3, 1, 1)
+        self.max_shared_buffers = max_shared_buffers
+        self._init_buffers()
+
+    def _init_buffers(self):
+        self._local = threading.local()
+        self._shared = []  # free shared buffers
+        self._shared_lock = threading.Lock()
+        self._shared_slots = threading.BoundedSemaphore(self.max_shared_buffers)
+
+    def __getstate__(self):
+        # DataLoader workers pickle the transform; buffers are rebuilt on demand
+        state = dict(self.__dict__)
+        for name in ("_local", "_shared", "_shared_lock", "_shared_slots"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_buffers()
+
+    def pixels(self, image):
+        """Resize a decoded RGB image to the model input; returns HWC uint8 pixels"""
+        if image.size != (self.width, self.height):
+            image = image.resize((self.width, self.height), RESAMPLE_BILINEAR)
+        pixels = np.array(image, dtype=np.uint8)
+        return pixels if self.use_numpy else torch.from_numpy(pixels)
+
+    def from_buffer(self, buffer, count: int, offset: int = 0) -> List:
+        """HWC uint8 pixels of ``count`` images already at the input size, packed in ``buffer``.
+
+        Wraps the memory in place (``torch.frombuffer``, or ``np.frombuffer``
+        on the NumPy path) and returns a view per image, so ``buffer`` must
+        outlive them. A writable buffer such as a bytearray keeps torch from
+        warning about read-only memory.
+        """
+        shape = (count, self.height, self.width, 3)
+        length = count * self.height * self.width * 3
+        if self.use_numpy:
+            images = np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset).reshape(shape)
+        else:
+            images = torch.frombuffer(buffer, dtype=torch.uint8, count=length, offset=offset).view(shape)
+        return list(images)
+
+    def normalize_into(self, pixels, out):
+        """Fused uint8 HWC -> normalized float CHW, written into ``out``"""
+        if self.use_numpy:
+            np.multiply(pixels.transpose(2, 0, 1), self._scale, out=out)
+            return np.add(out, self._shift, out=out) if self.normalize else out
+        if not self.normalize:
+            return torch.mul(pixels.permute(2, 0, 1), self._scale, out=out)
+        return torch.addcmul(self._shift, pixels.permute(2, 0, 1), self._scale, out=out)
+
+    def _empty(self, *shape):
+        if self.use_numpy:
+            return np.empty(shape, dtype=np.float32)
+        return torch.empty(shape)
+
+    def _allocate(self, batch_size: int):
+        if self.use_numpy:
+            return self._empty(batch_size, 3, self.height, self.width)
+        memory_format = torch.channels_last if self.channels_last else torch.contiguous_format
+        buffer = torch.empty((batch_size, 3, self.height, self.width), memory_format=memory_format)
+        return buffer.pin_memory() if self.pin_memory else buffer
+
+    def _buffer(self, batch_size: int):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = self._allocate(batch_size)
+            self._local.buffer = buffer
+        return buffer
+
+    def _normalize_batch(self, buffer, pixel_list: List):
+        batch = buffer[:len(pixel_list)]
+        for pixels, out in zip(pixel_list, batch):
+            self.normalize_into(pixels, out)
+        return batch
+
+    def batch(self, pixel_list: List):
+        """Normalize HWC uint8 pixels into this thread's reusable NCHW float buffer.
+
+        The returned tensor is a view that the next ``batch()`` call on the
+        same thread overwrites, so it must be consumed (or copied to the
+        device) before then.
+        """
+        return self._normalize_batch(self._buffer(len(pixel_list)), pixel_list)
+
+    @contextmanager
+    def shared_batch(self, pixel_list: List):
+        """``batch()`` into a buffer from the pool shared by all threads, valid inside the ``with`` block.
+
+        Waits while all ``max_shared_buffers`` buffers are in use. A buffer
+        smaller than the batch is replaced by a larger one, so the pool
+        converges on the largest batch size and then allocates nothing.
+        """
+        self._shared_slots.acquire()
+        buffer = None
+        try:
+            with self._shared_lock:
+                if self._shared:
+                    buffer = self._shared.pop()
+            if buffer is None or buffer.shape[0] < len(pixel_list):
+                buffer = self._allocate(len(pixel_list))
+            yield self._normalize_batch(buffer, pixel_list)
+        finally:
+            if buffer is not None:
+                with self._shared_lock:
+                    self._shared.append(buffer)
+            self._shared_slots.release()
+
+    def __call__(self, image):
+        """One normalized CHW tensor in fresh memory, a drop-in for a torchvision transform (e.g. datasets)"""
+        return self.normalize_into(self.pixels(image), self._empty(3, self.height, self.width))
\ No newline at end of file
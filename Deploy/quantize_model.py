@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+INT8 Quantization of the Cattle Breed Model
+Post-training static quantization (FX graph mode, x86/fbgemm kernels) calibrated on dataset images. The INT8
+TorchScript export is written next to the checkpoint only if its accuracy stays within --max-drop of the fp32 model.
+
+Usage: python quantize_model.py [--checkpoint models/stable_cattle_model.pth] [--data-dir ../datasets/CattleBreed]
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import time
+import warnings
+from pathlib import Path
+
+import torch
+
+from export_model import DEFAULT_CHECKPOINT, SAMPLE_IMAGES_DIR, export_metadata
+from image_decode import decode_image
+from model_loading import CLASSES_FILE, METADATA_FILE, load_eager, quantized_path
+from preprocessing import Preprocessor
+
+# Training dataset (ImageFolder layout, one directory per breed), as in cattle_dataset.yaml
+DEFAULT_DATA_DIR = str(Path(__file__).resolve().parent.parent / "datasets" / "CattleBreed")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# Calibration and evaluation images are disjoint random samples of the dataset
+CALIBRATION_IMAGES = 256
+EVAL_IMAGES = 1000
+EVAL_BATCH_SIZE = 32
+
+# Largest allowed top-1 drop vs fp32, in percentage points (agreement with fp32 when there are no labels)
+MAX_TOP1_DROP = 1.0
+
+
+def quantization_engine() -> str:
+    """x86 kernels (fbgemm + oneDNN) where available, plain fbgemm on older torch"""
+    engines = torch.backends.quantized.supported_engines
+    return "x86" if "x86" in engines else "fbgemm"
+
+
+def dataset_samples(data_dir: str, classes, seed: int = 0):
+    """Shuffled (path, label) pairs from an ImageFolder directory; labels index ``classes`` by directory name"""
+    root = Path(data_dir)
+    folders = sorted(path for path in root.iterdir() if path.is_dir())
+    names = classes or [folder.name for folder in folders]
+    samples = []
+    for folder in folders:
+        label = names.index(folder.name) if folder.name in names else None
+        samples += [(str(path), label) for path in sorted(folder.rglob("*"))
+                    if path.suffix.lower() in IMAGE_EXTENSIONS]
+    random.Random(seed).shuffle(samples)
+    return samples
+
+
+def sample_images():
+    """The app's sample photos, unlabeled (fallback when the dataset is not available)"""
+    paths = sorted(SAMPLE_IMAGES_DIR.glob("*.jpg")) + sorted(SAMPLE_IMAGES_DIR.glob("*.png"))
+    return [(str(path), None) for path in paths]
+
+
+def batches(samples, preprocessor: Preprocessor, batch_size: int = EVAL_BATCH_SIZE):
+    """(normalized batch, labels) chunks; the batch is the preprocessor's reused buffer"""
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        pixels = [preprocessor.pixels(decode_image(path)) for path, _ in chunk]
+        yield preprocessor.batch(pixels), [label for _, label in chunk]
+
+
+def quantize(model: torch.nn.Module, calibration, engine: str) -> torch.nn.Module:
+    """Static INT8 quantization: insert observers, run the calibration batches, convert"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = engine
+    example = torch.randn(1, 3, 224, 224)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (example,))
+        with torch.no_grad():
+            for batch, _ in calibration:
+                prepared(batch)
+        return convert_fx(prepared)
+
+
+def evaluate(fp32: torch.nn.Module, int8: torch.nn.Module, evaluation) -> dict:
+    """Top-1/top-5 of both models against the labels, and INT8 agreement with the fp32 predictions"""
+    counts = {"images": 0, "labeled": 0, "fp32_top1": 0, "fp32_top5": 0, "int8_top1": 0, "int8_top5": 0,
+              "agree_top1": 0, "fp32_top1_in_int8_top5": 0}
+    with torch.no_grad():
+        for batch, labels in evaluation:
+            expected = fp32(batch).topk(5, dim=1).indices
+            actual = int8(batch).topk(5, dim=1).indices
+            for want, got, label in zip(expected.tolist(), actual.tolist(), labels):
+                counts["images"] += 1
+                counts["agree_top1"] += want[0] == got[0]
+                counts["fp32_top1_in_int8_top5"] += want[0] in got
+                if label is not None:
+                    counts["labeled"] += 1
+                    counts["fp32_top1"] += want[0] == label
+                    counts["fp32_top5"] += label in want
+                    counts["int8_top1"] += got[0] == label
+                    counts["int8_top5"] += label in got
+
+    def percent(key, total):
+        return round(100.0 * counts[key] / total, 2) if total else None
+
+    return {
+        "images": counts["images"],
+        "labeled_images": counts["labeled"],
+        "fp32_top1": percent("fp32_top1", counts["labeled"]),
+        "fp32_top5": percent("fp32_top5", counts["labeled"]),
+        "int8_top1": percent("int8_top1", counts["labeled"]),
+        "int8_top5": percent("int8_top5", counts["labeled"]),
+        "agreement_top1": percent("agree_top1", counts["images"]),
+        "agreement_top5": percent("fp32_top1_in_int8_top5", counts["images"]),
+    }
+
+
+def top1_drop(accuracy: dict) -> float:
+    """Top-1 loss in percentage points (vs the labels, or vs the fp32 predictions without labels)"""
+    if accuracy["labeled_images"]:
+        return accuracy["fp32_top1"] - accuracy["int8_top1"]
+    return 100.0 - accuracy["agreement_top1"]
+
+
+def freeze(model: torch.nn.Module) -> torch.jit.ScriptModule:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.jit.freeze(torch.jit.script(model))
+
+
+def median_ms(model, inputs: torch.Tensor, repeat: int = 10) -> float:
+    """Median forward latency on ``inputs`` after warmup"""
+    with torch.no_grad():
+        for _ in range(3):
+            model(inputs)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model(inputs)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize a training checkpoint to INT8 for CPU serving")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Training checkpoint (.pth)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="ImageFolder dataset for calibration/eval")
+    parser.add_argument("--calibration-images", type=int, default=CALIBRATION_IMAGES)
+    parser.add_argument("--eval-images", type=int, default=EVAL_IMAGES)
+    parser.add_argument("--max-drop", type=float, default=MAX_TOP1_DROP,
+                        help="Refuse to write the export if top-1 drops by more than this many points")
+    parser.add_argument("--output", default=None,
+                        help="Output file (default: <checkpoint>.int8.torchscript.pt, where the servers look for it)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the calibration/evaluation sample")
+    args = parser.parse_args()
+
+    output_path = args.output or quantized_path(args.checkpoint)
+    engine = quantization_engine()
+    loaded = load_eager(args.checkpoint, "cpu")
+    fp32 = loaded.module
+
+    if os.path.isdir(args.data_dir):
+        samples = dataset_samples(args.data_dir, loaded.classes, args.seed)
+        calibration = samples[:args.calibration_images]
+        evaluation = samples[args.calibration_images:args.calibration_images + args.eval_images]
+        print(f"📂 {len(samples)} images in {args.data_dir}: "
+              f"{len(calibration)} for calibration, {len(evaluation)} for evaluation")
+    else:
+        # Without the dataset, calibrate and compare on the app's sample photos (fp32 agreement only)
+        calibration = evaluation = sample_images()
+        print(f"⚠️ {args.data_dir} not found, using {len(calibration)} sample images from {SAMPLE_IMAGES_DIR} "
+              f"(accuracy is measured as agreement with the fp32 model)")
+    if not calibration or not evaluation:
+        raise SystemExit("❌ No images for calibration and evaluation")
+
+    preprocessor = Preprocessor()
+    print(f"🔧 Quantizing {args.checkpoint} ({engine} kernels)...")
+    started = time.perf_counter()
+    int8 = quantize(fp32, batches(calibration, preprocessor), engine)
+    print(f"✅ Calibrated and converted in {time.perf_counter() - started:.1f}s")
+
+    accuracy = evaluate(fp32, int8, batches(evaluation, preprocessor))
+    drop = top1_drop(accuracy)
+    if accuracy["labeled_images"]:
+        print(f"🎯 Top-1 {accuracy['fp32_top1']:.2f}% -> {accuracy['int8_top1']:.2f}%, "
+              f"top-5 {accuracy['fp32_top5']:.2f}% -> {accuracy['int8_top5']:.2f}% "
+              f"({accuracy['labeled_images']} labeled images)")
+    print(f"🎯 Agreement with fp32: top-1 {accuracy['agreement_top1']:.2f}%, "
+          f"fp32 top-1 within INT8 top-5 {accuracy['agreement_top5']:.2f}% ({accuracy['images']} images)")
+
+    scripted = freeze(int8)
+    reference = freeze(copy.deepcopy(fp32).to(memory_format=torch.channels_last))
+    inputs = {size: torch.randn(size, 3, 224, 224).contiguous(memory_format=torch.channels_last)
+              for size in (1, 8)}
+    latency = {f"b{size}": (median_ms(reference, batch), median_ms(scripted, batch))
+               for size, batch in inputs.items()}
+
+    if drop > args.max_drop:
+        raise SystemExit(f"❌ Top-1 dropped {drop:.2f} points (limit {args.max_drop:.2f}), "
+                         f"not writing {output_path}")
+
+    metadata = export_metadata(args.checkpoint, loaded, "torchscript-int8", False)
+    metadata.update({"dtype": "int8", "quantization": f"fx-static-{engine}", "accuracy": accuracy})
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        torch.jit.save(scripted, output_path, _extra_files={
+            CLASSES_FILE: json.dumps(loaded.classes),
+            METADATA_FILE: json.dumps(metadata),
+        })
+
+    fp32_mb = sum(t.numel() * t.element_size() for t in fp32.state_dict().values()) / 1024 / 1024
+    int8_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"\n📦 Wrote {output_path}")
+    print(f"{'':>12} | {'fp32':>9} | {'int8':>9} | {'change':>8}")
+    print("-" * 48)
+    print(f"{'size MB':>12} | {fp32_mb:>9.1f} | {int8_mb:>9.1f} | {int8_mb / fp32_mb:>7.2f}x")
+    for name, (before, after) in latency.items():
+        print(f"{name + ' ms':>12} | {before:>9.1f} | {after:>9.1f} | {before / after:>6.2f}x faster")
+    if accuracy["labeled_images"]:
+        print(f"{'top-1 %':>12} | {accuracy['fp32_top1']:>9.2f} | {accuracy['int8_top1']:>9.2f} | "
+              f"{accuracy['int8_top1'] - accuracy['fp32_top1']:>+8.2f}")
+        print(f"{'top-5 %':>12} | {accuracy['fp32_top5']:>9.2f} | {accuracy['int8_top5']:>9.2f} | "
+              f"{accuracy['int8_top5'] - accuracy['fp32_top5']:>+8.2f}")
+    else:
+        print(f"{'top-1 agree':>12} | {100.0:>9.2f} | {accuracy['agreement_top1']:>9.2f} | "
+              f"{accuracy['agreement_top1'] - 100.0:>+8.2f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
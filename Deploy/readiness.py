@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Startup Readiness for the Cattle AI Servers
+Tracks the startup phases of a server process (loading, warming, ready) for the /live and /ready probes, plus the
+time it took to become ready and the latency of the first prediction it served.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Taken when a server first imports this module, before torch and the model code are imported
+PROCESS_STARTED = time.monotonic()
+
+
+class Readiness:
+    """Startup phase of this process.
+
+    ``/live`` only needs the process to answer; ``/ready`` answers 200 once
+    ``mark_ready()`` has been called, i.e. the model is loaded and warmed,
+    so a load balancer does not send traffic to a cold instance. Phase
+    durations, time-to-ready (from ``started``, the process start by
+    default) and the first prediction's latency are kept for /status.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = PROCESS_STARTED if started is None else started
+        self.phase = "starting"
+        self.phase_seconds: Dict[str, float] = {}
+        self.time_to_ready: Optional[float] = None
+        self.first_request_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._phase_started = self.started
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def enter(self, phase: str):
+        """Finish the current phase and start ``phase``"""
+        now = time.monotonic()
+        with self._lock:
+            self.phase_seconds[self.phase] = round(now - self._phase_started, 3)
+            self.phase = phase
+            self._phase_started = now
+
+    def mark_ready(self):
+        self.enter("ready")
+        self.time_to_ready = round(time.monotonic() - self.started, 3)
+        self._ready.set()
+
+    def mark_failed(self, error: str):
+        self.error = error
+        self.enter("failed")
+
+    def record_prediction(self, seconds: float) -> bool:
+        """Keep the latency of the first prediction served after becoming ready; True if this was it"""
+        if self.first_request_ms is not None or not self.ready:
+            return False
+        with self._lock:
+            if self.first_request_ms is not None:
+                return False
+            self.first_request_ms = round(seconds * 1000.0, 3)
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Phase, timings and error, for /ready and /status"""
+        return {
+            "phase": self.phase,
+            "ready": self.ready,
+            "time_to_ready_s": self.time_to_ready,
+            "phase_seconds": dict(self.phase_seconds),
+            "first_request_ms": self.first_request_ms,
+            "error": self.error,
+        }
\ No newline at end of file
@@ -7,14 +7,19 @@ A stable standalone server that runs continuously to provide cattle breed predic
 import os
 import sys
 import json
+import random
+import argparse
 import socket
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
 import base64
+import hmac
 import io
+import ipaddress
 import traceback
 
 # HTTP Server imports
@@ -22,17 +27,19 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 from socketserver import ThreadingMixIn
 
+# Imported before torch so time-to-ready counts from here
+from readiness import Readiness
+
 # AI/ML imports
 try:
     import torch
     import torch.nn as nn
-    import torchvision.transforms as transforms
-    from torchvision import models
+    from model_loading import load_inference_model, untrained_model, exported_path, quantized_path, slim_path
     TORCH_AVAILABLE = True
     print("✅ PyTorch successfully imported")
 except ImportError as e:
     print(f"⚠️ PyTorch import error: {e}")
-    print("   Server will continue with mock predictions")
+    print("   Server will continue with mock predictions (unless run with --backend onnxruntime)")
     TORCH_AVAILABLE = False
     # Mock classes for when torch is not available
     class MockTensor:
@@ -40,12 +47,13 @@ except ImportError as e:
     
     torch = None
     nn = None
-    transforms = None
-    models = None
+    load_inference_model = None
+    untrained_model = None
+    exported_path = quantized_path = slim_path = None
 except Exception as e:
     print(f"⚠️ PyTorch loading error (DLL/dependency issue): {e}")
     print("   This might be due to missing Visual C++ Redistributable or CUDA issues")
-    print("   Server will continue with mock predictions")
+    print("   Server will continue with mock predictions (unless run with --backend onnxruntime)")
     TORCH_AVAILABLE = False
     # Mock classes for when torch has loading issues
     class MockTensor:
@@ -53,12 +61,14 @@ except Exception as e:
     
     torch = None
     nn = None  
-    transforms = None
-    models = None
+    load_inference_model = None
+    untrained_model = None
+    exported_path = quantized_path = slim_path = None
 
 # Image processing (separate from PyTorch)
 try:
     from PIL import Image
+    from image_decode import decode_image
     PIL_AVAILABLE = True
     print("✅ PIL successfully imported")
 except ImportError as e:
@@ -66,14 +76,130 @@ except ImportError as e:
     PIL_AVAILABLE = False
     Image = None
 
+from inference_batcher import InferenceBatcher
+from backends import (BACKENDS, DEFAULT_FAKE_LATENCY, FakeBackend, TorchBackend, OnnxRuntimeBackend, onnx_path,
+                      parse_latency)
+from multipart_utils import read_multipart, is_image_data, UploadTooLarge
+from pixel_upload import is_pixel_upload, parse_pixel_upload, read_body
+from prediction_cache import PredictionCache
+from async_engine import run_async_server, DEFAULT_EXECUTOR_WORKERS, EXECUTOR_SPARE_WORKERS
+from admission import AdmissionController, AdmissionRejected, parse_deadline
+from model_reloader import ModelReloader, golden_images, DEFAULT_POLL_SECONDS, DEFAULT_RETIRE_AFTER_SECONDS
+from model_registry import (ModelRegistry, parse_model_spec, PRIMARY_NAME, DEFAULT_SHADOW_WORKERS,
+                            DEFAULT_SHADOW_MAX_PENDING)
+from traffic_recorder import TrafficRecorder, note_images, DEFAULT_SAMPLE_RATE, TRACE_FILE
+from uds_daemon import InferenceDaemon, ServiceUnavailable, DEFAULT_SOCKET_PATH
+from metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+from server_logging import get_logger, setup_logging, stop_logging, new_request_id, request_id_var, dropped_records
+
 # Configuration
 SERVER_PORT = 8001
 MODEL_PATH = "models/stable_cattle_model.pth"
 BREEDS_FILE = "models/breeds.json"
 
+# Micro-batching: up to BATCH_MAX_SIZE images or BATCH_MAX_WAIT_MS per forward pass
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 5.0
+
+# Inference backend: "torch" (TorchScript export or checkpoint) or "onnxruntime" (models/*.onnx, no torch
+# needed); ONNX Runtime intra-op threads (0 = one per physical core) and inter-op threads
+INFERENCE_BACKEND = "torch"
+ONNX_INTRA_OP_THREADS = 0
+ONNX_INTER_OP_THREADS = 1
+
+# "fake" backend (benchmarks/loadgen.py): deterministic predictions with no model, taking FAKE_LATENCY per forward
+# pass (a distribution spec, see backends.parse_latency) plus FAKE_PER_ITEM_MS per image after the first
+FAKE_LATENCY = DEFAULT_FAKE_LATENCY
+FAKE_PER_ITEM_MS = 0.0
+
+# Torch backend on CPU: serve the INT8 export from quantize_model.py (falls back to fp32 when it is missing)
+QUANTIZED = False
+
+# Torch backend, checkpoint only: fold the ImageNet normalization into conv1 (graph_optimize.py) and only scale
+# pixels to [0, 1] in preprocessing. TorchScript exports are served unfolded
+FOLD_NORMALIZATION = False
+
+# Warmup before /ready answers 200: this many forward passes at every batch size the batcher can form
+WARMUP_ROUNDS = 2
+
+# Preprocessing: run the model and the batch buffer channels-last (faster convolutions on CPU and GPU)
+CHANNELS_LAST = True
+
+# /predict/batch: maximum files per request and parallel image decoders
+BATCH_MAX_FILES = 32
+DECODE_WORKERS = 4
+
+# Uploads larger than this are rejected with 413 before the body is read
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+# Prediction cache: keyed by image hash + model id and version; set CACHE_DISK_PATH to persist across restarts
+# (the SQLite file is capped at CACHE_DISK_MAX_ENTRIES rows and CACHE_DISK_MAX_BYTES of results)
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_TTL_SECONDS = 3600
+CACHE_DISK_PATH = None  # e.g. "cache/predictions.sqlite"
+CACHE_DISK_MAX_ENTRIES = 100000
+CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+
+# Admission control for /predict and /predict/batch: concurrent predictions, waiting requests,
+# per-client-IP cap, and the deadline used when a request has no X-Deadline-Ms header
+ADMISSION_MAX_IN_FLIGHT = 8
+ADMISSION_MAX_QUEUE = 32
+ADMISSION_PER_CLIENT = 4
+DEFAULT_DEADLINE_MS = 30000  # matches ApiConfig.requestTimeout in the Flutter app
+
+# Hot reload: poll the model files for changes (--watch-model) and accept POST /admin/reload from localhost,
+# or from anywhere with "Authorization: Bearer <ADMIN_TOKEN>"; a replaced model keeps serving the requests
+# that already hold it for RELOAD_RETIRE_SECONDS
+WATCH_MODEL = False
+WATCH_POLL_SECONDS = DEFAULT_POLL_SECONDS
+RELOAD_RETIRE_SECONDS = DEFAULT_RETIRE_AFTER_SECONDS
+ADMIN_TOKEN = None
+
+# Model registry: extra models loaded next to MODEL_PATH, as "name=path[,weight=PCT][,backend=B][,quantized]".
+# CANDIDATE_MODELS answer weight percent of /predict requests; SHADOW_MODELS only re-run the primary's requests on
+# SHADOW_WORKERS background threads and log how often they agree (at most SHADOW_MAX_PENDING queued)
+CANDIDATE_MODELS = []
+SHADOW_MODELS = []
+SHADOW_WORKERS = DEFAULT_SHADOW_WORKERS
+SHADOW_MAX_PENDING = DEFAULT_SHADOW_MAX_PENDING
+
+# Traffic recording (opt-in): RECORD_SAMPLE_RATE of the app's requests go to RECORD_TRAFFIC_DIR/traffic.jsonl for
+# benchmarks/replay_traffic.py, with the uploaded images too when RECORD_PAYLOADS is set
+RECORD_TRAFFIC_DIR = None  # e.g. "traffic"
+RECORD_SAMPLE_RATE = DEFAULT_SAMPLE_RATE
+RECORD_PAYLOADS = False
+RECORDED_ENDPOINTS = ('/health', '/breeds', '/predict', '/predict/batch')
+
+# Local inference daemon (opt-in): scripts on this host (predict_cattle.py, batch jobs) get predictions from the
+# primary model over a Unix socket at UDS_PATH (framing in uds_daemon.py), without HTTP, admission control or the
+# prediction cache; at most UDS_MAX_IN_FLIGHT of their predictions run at once
+UDS_PATH = None  # e.g. DEFAULT_SOCKET_PATH
+UDS_MAX_IN_FLIGHT = ADMISSION_MAX_IN_FLIGHT
+
+# Logging: JSON lines through a background writer; DEBUG detail (per-part upload info) is sampled
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_FILE = None  # e.g. "logs/server.jsonl" (rotated at 50 MB)
+LOG_DEBUG_SAMPLE_RATE = 0.01
+
+logger = get_logger("server")
+
+# Endpoints that get their own metrics labels; anything else is counted as "other"
+ENDPOINTS = ('/health', '/live', '/ready', '/breeds', '/status', '/metrics', '/predict', '/predict/batch',
+             '/admin/reload')
+
 # Global server instance
 server_instance = None
 model_instance = None
+model_reloader = None
+registry = None
+traffic_recorder = None
+uds_daemon = None
+readiness = Readiness()
+admission = AdmissionController(max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+                                max_queue=ADMISSION_MAX_QUEUE,
+                                per_client_limit=ADMISSION_PER_CLIENT)
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
@@ -83,13 +209,29 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 class CattleBreedModel:
     """Handles the cattle breed prediction model"""
     
-    def __init__(self, model_path: str, breeds_file: str):
+    def __init__(self, model_path: str, breeds_file: str, backend: Optional[str] = None,
+                 quantized: Optional[bool] = None):
         self.model_path = model_path
         self.breeds_file = breeds_file
+        self.backend_name = backend or INFERENCE_BACKEND
+        self.quantized = QUANTIZED if quantized is None else quantized
+        self.backend = None
         self.model = None
         self.breeds = []
-        self.transform = None
+        self.preprocessor = None
         self.is_loaded = False
+        self.batcher = None
+        self.decode_pool = None
+        self.model_version = None
+        self.model_format = None
+        self.cache = PredictionCache(max_entries=CACHE_MAX_ENTRIES,
+                                     max_bytes=CACHE_MAX_BYTES,
+                                     ttl_seconds=CACHE_TTL_SECONDS,
+                                     disk_path=CACHE_DISK_PATH,
+                                     disk_max_entries=CACHE_DISK_MAX_ENTRIES,
+                                     disk_max_bytes=CACHE_DISK_MAX_BYTES,
+                                     model_id=f"{self.backend_name}:{model_path}"
+                                              + (":quantized" if self.quantized else ""))
         
         # Only initialize PyTorch components if available
         if TORCH_AVAILABLE:
@@ -100,9 +242,9 @@ class CattleBreedModel:
             print("⚠️ PyTorch not available - device set to None")
         
     def load_model(self):
-        """Load the PyTorch model and breed labels"""
+        """Load the model through the configured backend, and the breed labels"""
         try:
-            if not TORCH_AVAILABLE:
+            if not TORCH_AVAILABLE and self.backend_name == "torch":
                 print("⚠️ PyTorch not available, using mock predictions")
                 self.breeds = ["Holstein Friesian", "Jersey", "Angus", "Brahman", "Hereford", "Gyr", "Sahiwal"]
                 return True
@@ -119,39 +261,49 @@ class CattleBreedModel:
                 print("⚠️ Breeds file not found, using default labels")
                 self.breeds = [f"Breed_{i}" for i in range(124)]
             
-            # Create model architecture
-            self.model = models.resnet18(weights=None)  # Updated parameter name
-            num_classes = len(self.breeds)
-            self.model.fc = nn.Linear(self.model.fc.in_features, num_classes)
-            
-            # Load trained weights
-            if os.path.exists(self.model_path):
-                checkpoint = torch.load(self.model_path, map_location=self.device)
-                
-                # Handle different checkpoint formats
-                if 'model_state_dict' in checkpoint:
-                    state_dict = checkpoint['model_state_dict']
-                    if 'classes' in checkpoint:
-                        self.breeds = checkpoint['classes']
-                    print(f"✅ Loaded checkpoint from epoch {checkpoint.get('epoch', 'unknown')}")
-                else:
-                    state_dict = checkpoint
-                
-                self.model.load_state_dict(state_dict)
-                print("✅ Model weights loaded successfully")
+            if self.backend_name == "fake":
+                # No model at all: the serving layer alone, for load testing
+                self.backend = FakeBackend(len(self.breeds), latency=FAKE_LATENCY, per_item_ms=FAKE_PER_ITEM_MS)
+                self.device = self.backend.device
+                print(f"✅ Using the fake backend ({FAKE_LATENCY} ms per forward pass)")
+            elif self.backend_name == "onnxruntime":
+                # ONNX export from export_model.py --format onnx; runs without torch
+                started = time.perf_counter()
+                self.backend = OnnxRuntimeBackend(onnx_path(self.model_path),
+                                                  intra_op_threads=ONNX_INTRA_OP_THREADS,
+                                                  inter_op_threads=ONNX_INTER_OP_THREADS)
+                self.device = self.backend.device
+                print(f"✅ Loaded ONNX model from {onnx_path(self.model_path)} in "
+                      f"{time.perf_counter() - started:.2f}s (ONNX Runtime, CPU)")
             else:
-                print("⚠️ Model file not found, using untrained model")
+                # Prefers the frozen TorchScript export (export_model.py) over rebuilding ResNet18 from the checkpoint
+                loaded = load_inference_model(self.model_path, self.device, channels_last=CHANNELS_LAST,
+                                              quantized=self.quantized,
+                                              fold_normalization=FOLD_NORMALIZATION)
+                if loaded is not None:
+                    print(f"✅ Loaded {loaded.format} model from {loaded.path} in {loaded.load_seconds:.2f}s "
+                          f"(epoch {loaded.info.get('epoch', 'unknown')})")
+                else:
+                    print("⚠️ Model file not found, using untrained model")
+                    loaded = untrained_model(len(self.breeds), self.model_path, self.device, CHANNELS_LAST)
+                self.backend = TorchBackend(loaded, self.device)
             
-            self.model.to(self.device)
-            self.model.eval()
+            self.model = self.backend.model
+            self.model_format = self.backend.format
+            self.model_version = self.backend.version
+            if self.backend.classes:
+                self.breeds = self.backend.classes
             
-            # Define image preprocessing
-            self.transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                                   std=[0.229, 0.224, 0.225])
-            ])
+            # Shared with the CLI and trainer: fused normalize into a reused (pinned on GPU) batch buffer
+            self.preprocessor = self.backend.make_preprocessor(CHANNELS_LAST)
+            
+            # Requests from all handler threads share one batched forward pass
+            self.batcher = InferenceBatcher(self._forward_batch,
+                                            max_batch_size=BATCH_MAX_SIZE,
+                                            max_wait_ms=BATCH_MAX_WAIT_MS)
+            
+            # Cached predictions from a different checkpoint are dropped
+            self.cache.set_model_version(self.model_version)
             
             self.is_loaded = True
             print("🎉 Cattle breed model loaded successfully!")
@@ -163,17 +315,47 @@ class CattleBreedModel:
             self.breeds = ["Holstein Friesian", "Jersey", "Angus", "Brahman", "Hereford", "Gyr", "Sahiwal"]
             return True  # Continue with mock predictions
     
+    def warmup(self, rounds: int = WARMUP_ROUNDS) -> float:
+        """Run the request path at every batch size the batcher can form and return the seconds spent.
+        
+        The first requests would otherwise pay for image decoder plugin
+        imports, allocator growth and per-shape kernel selection (oneDNN,
+        TorchScript profiling, ONNX Runtime).
+        """
+        if self.backend is None or not PIL_AVAILABLE or not self.is_loaded or rounds <= 0:
+            return 0.0
+        started = time.perf_counter()
+        images = golden_images()
+        if not images:
+            buffer = io.BytesIO()
+            Image.new("RGB", (256, 256), (128, 128, 128)).save(buffer, "JPEG")
+            images = [buffer.getvalue()]
+        pixels = [self._load_tensor(image_data, 'warmup') for image_data in images]
+        for size in range(1, self.batcher.max_batch_size + 1):
+            batch = [pixels[i % len(pixels)] for i in range(size)]
+            for _ in range(rounds):
+                self._forward_batch(batch, 'warmup')
+        # Starts the batcher thread
+        self.batcher.submit(pixels[0]).result()
+        return time.perf_counter() - started
+    
+    def retire(self):
+        """Release the batcher and decode threads of a model that has been replaced (queued work still runs)"""
+        if self.batcher:
+            self.batcher.stop()
+        if self.decode_pool:
+            self.decode_pool.shutdown(wait=False)
+    
     def predict(self, image_data: bytes) -> Dict[str, Any]:
         """Make a breed prediction from image data"""
         try:
-            if not TORCH_AVAILABLE or not PIL_AVAILABLE or not self.is_loaded or not self.model:
+            if self.backend is None or not PIL_AVAILABLE or not self.is_loaded:
                 # Return mock prediction
-                import random
                 selected_breed = random.choice(self.breeds)
                 confidence = round(random.uniform(0.75, 0.95), 2)
                 
                 mock_reason = []
-                if not TORCH_AVAILABLE:
+                if not TORCH_AVAILABLE and self.backend_name == "torch":
                     mock_reason.append("PyTorch not available")
                 if not PIL_AVAILABLE:
                     mock_reason.append("PIL not available")
@@ -192,45 +374,518 @@ class CattleBreedModel:
                     "note": f"Mock prediction - {', '.join(mock_reason)}"
                 }
             
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Repeated uploads of the same photo are served from the cache
+            cached = self.cache.get(image_data)
+            if cached is not None:
+                cached["cached"] = True
+                return cached
             
-            # Preprocess image
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            
-            # Make prediction
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                confidence, predicted = torch.max(probabilities, 0)
-                
-                breed_name = self.breeds[predicted.item()]
-                confidence_score = confidence.item()
-                
-                # Get top 3 predictions
-                top_probs, top_indices = torch.topk(probabilities, 3)
-                top_predictions = [
-                    {
-                        "breed": self.breeds[idx.item()],
-                        "confidence": prob.item()
-                    }
-                    for prob, idx in zip(top_probs, top_indices)
-                ]
-                
-                return {
-                    "prediction": breed_name,
-                    "confidence": confidence_score,
-                    "top_predictions": top_predictions,
-                    "status": "success"
-                }
+            # Preprocess image and wait for the batcher to run it
+            input_tensor = self._load_tensor(image_data, '/predict')
+            result = self.batcher.submit(input_tensor).result()
+            self.cache.put(image_data, result)
+            return result
                 
         except Exception as e:
-            print(f"❌ Prediction error: {e}")
-            traceback.print_exc()
+            logger.exception("Prediction failed")
             return {"error": f"Prediction failed: {str(e)}"}
 
+    def predict_batch(self, images: List[bytes]) -> List[Dict[str, Any]]:
+        """Predict several images at once: parallel decode, then one stacked forward pass.
+        
+        Returns one result per image, in order. Images that fail to decode get
+        an error entry instead of failing the whole batch.
+        """
+        if self.backend is None or not PIL_AVAILABLE or not self.is_loaded:
+            return [self.predict(image_data) for image_data in images]
+        
+        # Serve repeats from the cache; only the misses are decoded and run
+        results = [self.cache.get(image_data) for image_data in images]
+        for result in results:
+            if result is not None:
+                result["cached"] = True
+        misses = [i for i, result in enumerate(results) if result is None]
+        
+        for i, result in zip(misses, self._run_batch([images[i] for i in misses])):
+            if "error" not in result:
+                self.cache.put(images[i], result)
+            results[i] = result
+        return results
+    
+    def predict_pixels(self, body, count: int, offset: int = 0,
+                       endpoint: str = '/predict') -> List[Dict[str, Any]]:
+        """Predict images uploaded already decoded and resized (pixel_upload.py), without PIL or a copy.
+        
+        Returns one uncached result per image. A single image shares the
+        batcher's forward pass with the other /predict requests.
+        """
+        if self.backend is None or not self.is_loaded:
+            return [{"error": "Model not available"} for _ in range(count)]
+        try:
+            pixels = self.preprocessor.from_buffer(body, count, offset)
+            if count == 1:
+                return [self.batcher.submit(pixels[0]).result()]
+            return self._forward_batch(pixels, endpoint)
+        except Exception as e:
+            logger.exception("Prediction failed")
+            return [{"error": f"Prediction failed: {str(e)}"} for _ in range(count)]
+    
+    def predict_topk(self, images: List[bytes], k: int = 3,
+                     endpoint: str = '/uds') -> List[Union[Tuple[List[int], List[float]], str]]:
+        """Top-k (class indices, probabilities) per image, or its error message, for the local socket daemon.
+        
+        One stacked forward pass like ``predict_batch``, but uncached: the
+        cache holds top-3 results and local callers pick their own k.
+        """
+        decoded = self._decode_all(images, endpoint)
+        tensors = [tensor for tensor, _ in decoded if tensor is not None]
+        top_probs, top_indices = self._forward_topk(tensors, endpoint, k) if tensors else ([], [])
+        predictions = zip(top_indices, top_probs)
+        return [next(predictions) if tensor is not None else error for tensor, error in decoded]
+    
+    def _decode_all(self, images, endpoint: str = '/predict/batch'):
+        """Decode images on the decode pool: (pixels, None) or (None, error message) for each"""
+        if self.decode_pool is None:
+            self.decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+        
+        def decode(image_data):
+            try:
+                return self._load_tensor(image_data, endpoint), None
+            except Exception as e:
+                return None, f"Image decode failed: {str(e)}"
+        
+        return list(self.decode_pool.map(decode, images))
+    
+    def _run_batch(self, images):
+        """Decode images on the decode pool and run the decodable ones as one stacked batch"""
+        if not images:
+            return []
+        
+        decoded = self._decode_all(images)
+        tensors = [tensor for tensor, _ in decoded if tensor is not None]
+        
+        try:
+            predictions = iter(self._forward_batch(tensors, '/predict/batch') if tensors else [])
+        except Exception as e:
+            logger.exception("Batch prediction failed")
+            return [{"error": f"Prediction failed: {str(e)}"} for _ in images]
+        
+        return [next(predictions) if tensor is not None else {"error": error}
+                for tensor, error in decoded]
+    
+    def _load_tensor(self, image_data: bytes, endpoint: str = '/predict'):
+        """Decode image bytes into 224x224 HWC uint8 pixels (normalized later, per batch)"""
+        started = time.perf_counter()
+        # JPEGs are DCT-scaled to the smallest size >= 224 px instead of decoded in full
+        image = decode_image(image_data)
+        decoded = time.perf_counter()
+        pixels = self.preprocessor.pixels(image)
+        METRICS.observe(endpoint, "decode", decoded - started)
+        METRICS.observe(endpoint, "preprocess", time.perf_counter() - decoded)
+        return pixels
+    
+    def _forward_topk(self, tensors, endpoint: str, k: int):
+        """Run one stacked forward pass and return the top-k probabilities and class indices for each input"""
+        started = time.perf_counter()
+        # Batch requests and the local socket run here on per-connection threads: draw from the shared buffers
+        with self.preprocessor.shared_batch(tensors) as batch:
+            normalized = time.perf_counter()
+            probabilities = self.backend.forward(batch)
+            forwarded = time.perf_counter()
+            top = self.backend.topk(probabilities, k)
+        METRICS.observe(endpoint, "normalize", normalized - started)
+        METRICS.observe(endpoint, "forward", forwarded - normalized)
+        METRICS.observe(endpoint, "topk", time.perf_counter() - forwarded)
+        return top
+    
+    def _forward_batch(self, tensors, endpoint: str = '/predict'):
+        """Run one stacked forward pass and return the top-3 predictions for each input"""
+        top_probs, top_indices = self._forward_topk(tensors, endpoint, 3)
+        
+        results = []
+        for probs, indices in zip(top_probs, top_indices):
+            top_predictions = [
+                {
+                    "breed": self.breeds[idx],
+                    "confidence": prob
+                }
+                for prob, idx in zip(probs, indices)
+            ]
+            results.append({
+                "prediction": top_predictions[0]["breed"],
+                "confidence": top_predictions[0]["confidence"],
+                "top_predictions": top_predictions,
+                "status": "success",
+                "model_version": self.model_version
+            })
+        return results
+
+def handle_request(method: str, path: str, headers, rfile, client_ip: str, received: Optional[float] = None,
+                   admitted=None):
+    """Route one request and return (status_code, response).
+    
+    Shared by the threaded CattleAIHandler and the asyncio engine, so both
+    serve exactly the same /health, /breeds, /status and /predict contract.
+    ``received`` is the time.monotonic() arrival time the request deadline counts from;
+    ``admitted`` is the admission outcome when the caller already decided it (asyncio engine).
+    """
+    endpoint = path if path in ENDPOINTS else "other"
+    request_token = request_id_var.set(new_request_id(headers))
+    recorder = traffic_recorder
+    trace_token = recorder.begin(path) if recorder else None
+    METRICS.request_started()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        status_code, response = route_request(method, path, headers, rfile, client_ip, received, admitted)
+        return status_code, response
+    finally:
+        duration = time.perf_counter() - started
+        stages = METRICS.request_finished(endpoint, status_code)
+        METRICS.observe(endpoint, "total", duration)
+        if endpoint in ('/predict', '/predict/batch') and status_code == 200 and readiness.record_prediction(duration):
+            print(f"⏱️ First prediction after startup took {duration * 1000.0:.1f} ms")
+        # One access line per request, written by the logging thread
+        logger.info("request", extra={
+            "method": method, "path": path, "status": status_code, "client_ip": client_ip,
+            "duration_ms": round(duration * 1000.0, 3),
+            "stages_ms": {stage: round(seconds * 1000.0, 3) for stage, seconds in stages.items()},
+        })
+        if recorder:
+            recorder.finish(trace_token, method, path, headers, status_code, duration, request_id_var.get())
+        request_id_var.reset(request_token)
+
+def route_request(method: str, path: str, headers, rfile, client_ip: str, received: Optional[float],
+                  admitted=None):
+    """Dispatch to the GET or POST endpoint"""
+    if method == 'GET':
+        if path == '/metrics':
+            return 200, render_metrics()
+        if path == '/ready':
+            # Load balancers route here only once the model is loaded and warmed
+            return (200 if readiness.ready else 503), {"status": "ready" if readiness.ready else "not_ready",
+                                                       **readiness.get_stats()}
+        return 200, handle_get(path)
+    
+    return handle_post(path, headers, rfile, client_ip, received, admitted)
+
+def handle_get(path: str) -> Dict[str, Any]:
+    """Build the response for a GET endpoint"""
+    # One read of the global: a hot reload may swap it while this request runs
+    model = model_instance
+    if path == '/live':
+        return {"status": "alive", "phase": readiness.phase}
+    elif path == '/health':
+        return {
+            "status": "healthy",
+            "ready": readiness.ready,
+            "model_loaded": model.is_loaded if model else False,
+            "model_version": model.model_version if model else None,
+            "server": "Cattle AI Server",
+            "version": "1.0",
+            "timestamp": datetime.now().isoformat(),
+            "breeds_count": len(model.breeds) if model else 0,
+            "device": str(model.device) if model and hasattr(model, 'device') else "none"
+        }
+    elif path == '/breeds':
+        if model:
+            return {
+                "breeds": model.breeds,
+                "count": len(model.breeds)
+            }
+        return {"error": "Model not available"}
+    elif path == '/status':
+        return {
+            "server_running": True,
+            "model_status": "loaded" if model and model.is_loaded else "not_loaded",
+            "model_format": model.model_format if model else None,
+            "model_version": model.model_version if model else None,
+            "requests_served": METRICS.requests_total(),
+            "batching": model.batcher.get_stats() if model and model.batcher else None,
+            "cache": model.cache.get_stats() if model else None,
+            "reload": model_reloader.get_stats() if model_reloader else None,
+            "registry": registry.get_stats() if registry else None,
+            "startup": readiness.get_stats(),
+            "traffic_recording": traffic_recorder.get_stats() if traffic_recorder else None,
+            "local_socket": uds_daemon.server_address if uds_daemon else None,
+            "admission": admission.get_stats(),
+            "metrics": METRICS.get_stats(),
+            "log_records_dropped": dropped_records()
+        }
+    return {"error": "Endpoint not found"}
+
+def render_metrics() -> str:
+    """Prometheus text exposition for /metrics"""
+    model = model_instance
+    admission_stats = admission.get_stats()
+    extra = [
+        ("cattle_model_info", "gauge", "Loaded model version and status",
+         [({"model_version": model.model_version if model else None,
+            "status": "loaded" if model and model.is_loaded else "not_loaded"}, 1)]),
+        ("cattle_admission_in_flight", "gauge", "Admitted prediction requests currently running",
+         [({}, admission_stats["in_flight"])]),
+        ("cattle_admission_queued", "gauge", "Prediction requests waiting for an inference slot",
+         [({}, admission_stats["queued"])]),
+        ("cattle_admission_shed_total", "counter", "Prediction requests rejected by admission control",
+         [({"reason": reason}, count) for reason, count in admission_stats["shed"].items() if reason != "total"]),
+    ]
+    if model:
+        cache = model.cache.get_stats()
+        extra += [
+            ("cattle_cache_hits_total", "counter", "Prediction cache hits", [({}, cache["hits"])]),
+            ("cattle_cache_misses_total", "counter", "Prediction cache misses", [({}, cache["misses"])]),
+            ("cattle_cache_entries", "gauge", "Predictions held in the memory cache", [({}, cache["entries"])]),
+            ("cattle_cache_bytes", "gauge", "Approximate size of the memory cache", [({}, cache["bytes"])]),
+            ("cattle_cache_evictions_total", "counter", "Prediction cache LRU evictions", [({}, cache["evictions"])]),
+        ]
+    if model and model.batcher:
+        batching = model.batcher.get_stats()
+        extra += [
+            ("cattle_batcher_queue_depth", "gauge", "Inputs waiting for the batcher", [({}, batching["queue_depth"])]),
+            ("cattle_batcher_batches_total", "counter", "Batched forward passes run", [({}, batching["batches_run"])]),
+            ("cattle_batcher_items_total", "counter", "Inputs run through the batcher", [({}, batching["items_processed"])]),
+        ]
+    return METRICS.render_prometheus(extra)
+
+def handle_post(path: str, headers, rfile, client_ip: str = "unknown", received: Optional[float] = None,
+                admitted=None):
+    """Run a POST endpoint and return (status_code, response)"""
+    if path == '/admin/reload':
+        return handle_admin_reload(headers, client_ip)
+    if path not in ('/predict', '/predict/batch'):
+        return 200, {"error": "Endpoint not found"}
+    if not readiness.ready:
+        message = f"Server is starting ({readiness.phase})"
+        response = {"error": message} if path == '/predict' else {"status": "error", "message": message}
+        response["retry_after"] = 1
+        return 503, response
+    
+    # Shed load before the body is read, so rejected uploads cost no memory. The asyncio engine admits on its
+    # event loop and passes the outcome in ``admitted`` (and releases the ticket itself)
+    ticket = None
+    if admitted is None:
+        try:
+            admitted = ticket = admission.acquire(client_ip, parse_deadline(headers, received, DEFAULT_DEADLINE_MS))
+        except AdmissionRejected as e:
+            admitted = e
+    if isinstance(admitted, AdmissionRejected):
+        logger.warning("Request shed: %s", admitted, extra={"path": path, "client_ip": client_ip,
+                                                             "status": admitted.status_code})
+        message = str(admitted)
+        response = {"error": message} if path == '/predict' else {"status": "error", "message": message}
+        if admitted.retry_after is not None:
+            response["retry_after"] = admitted.retry_after
+        return admitted.status_code, response
+    
+    try:
+        return handle_prediction_post(path, headers, rfile)
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
+
+def handle_admin_reload(headers, client_ip: str):
+    """Start a background model reload; allowed from localhost, or anywhere with the admin token"""
+    authorization = headers.get('Authorization', '')
+    token_ok = bool(ADMIN_TOKEN) and hmac.compare_digest(authorization, f"Bearer {ADMIN_TOKEN}")
+    if not (is_loopback(client_ip) or token_ok):
+        return 403, {"error": "Admin endpoints need a localhost client or the admin token"}
+    if model_reloader is None:
+        return 503, {"error": "Model reload is not available"}
+    if not model_reloader.request_reload(reason="admin"):
+        return 409, {"error": "A model reload is already in progress", "reload": model_reloader.get_stats()}
+    return 202, {"status": "accepted", "reload": model_reloader.get_stats()}
+
+def is_loopback(client_ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(client_ip).is_loopback
+    except ValueError:
+        return False
+
+def handle_prediction_post(path: str, headers, rfile):
+    """Run an admitted /predict or /predict/batch request"""
+    if path == '/predict':
+        try:
+            return 200, handle_predict(headers, rfile)
+        except UploadTooLarge as e:
+            return 413, {"error": str(e)}
+        except Exception as e:
+            logger.exception("POST /predict failed")
+            return 200, {"error": f"Request processing failed: {str(e)}"}
+    elif path == '/predict/batch':
+        try:
+            return 200, handle_predict_batch(headers, rfile)
+        except UploadTooLarge as e:
+            return 413, {"status": "error", "message": str(e)}
+        except Exception as e:
+            logger.exception("POST /predict/batch failed")
+            return 200, {"status": "error", "message": f"Request processing failed: {str(e)}"}
+
+def handle_predict(headers, rfile) -> Dict[str, Any]:
+    """Read a /predict upload (multipart, base64 JSON or raw image) and run it through the model"""
+    content_length = int(headers.get('Content-Length', 0))
+    content_type = headers.get('Content-Type', '')
+    
+    logger.debug("Upload received", extra={"content_type": content_type, "content_length": content_length})
+    
+    if content_length <= 0:
+        return {"error": "No data provided"}
+    if content_length > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(content_length, MAX_UPLOAD_BYTES)
+    if not model_instance:
+        return {"error": "Model not available"}
+    
+    # Pixels already resized on the device (camera rigs, the app): no decode
+    if is_pixel_upload(content_type):
+        try:
+            body, count, offset = read_pixel_upload(headers, rfile, '/predict', max_images=1)
+        except ValueError as e:
+            return {"error": f"Invalid pixel upload: {str(e)}"}
+        # Shadow models compare encoded images, so these go to the primary or a candidate only
+        name, model = registry.route() if registry else (PRIMARY_NAME, model_instance)
+        started = time.perf_counter()
+        result = model.predict_pixels(body, count, offset, '/predict')[0]
+        if registry:
+            registry.observe(name, time.perf_counter() - started)
+        result["model"] = name
+        return result
+    
+    # Handle multipart form data (from Flutter)
+    if content_type.startswith('multipart/form-data'):
+        timings = {}
+        try:
+            parts = read_multipart(rfile, content_type, content_length, MAX_UPLOAD_BYTES, timings)
+        except UploadTooLarge:
+            raise
+        except ValueError as e:
+            logger.warning("Multipart parsing failed: %s", e)
+            return {"error": f"Multipart parsing failed: {str(e)}"}
+        for stage, seconds in timings.items():
+            METRICS.observe('/predict', stage, seconds)
+        logger.debug("Multipart parts", extra={"parts": [
+            {"name": part.name, "filename": part.filename, "content_type": part.content_type, "size": len(part.data)}
+            for part in parts]})
+    
+        file_part = next((part for part in parts if part.name == 'file'), None)
+        if file_part is None:
+            return {"error": "No file part in multipart data"}
+        if not is_image_data(file_part.data):
+            logger.warning("No valid image signature in %d byte upload", len(file_part.data))
+            return {"error": "No valid image signature found"}
+    
+        return predict_routed(file_part.data)
+    
+    started = time.perf_counter()
+    post_data = rfile.read(content_length)
+    METRICS.observe('/predict', "body_read", time.perf_counter() - started)
+    
+    if content_type == 'application/json':
+        # Handle base64 encoded image
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+        except json.JSONDecodeError:
+            return {"error": "Invalid JSON"}
+        if 'image' not in data:
+            return {"error": "No image data provided"}
+        return predict_routed(base64.b64decode(data['image']))
+    
+    # Assume raw image data
+    logger.debug("Treating as raw image data", extra={"size": len(post_data)})
+    return predict_routed(post_data)
+
+def read_pixel_upload(headers, rfile, endpoint: str, max_images: int):
+    """Body, image count and data offset of a pre-decoded pixel upload; ValueError if it does not validate"""
+    content_length = int(headers.get('Content-Length', 0))
+    started = time.perf_counter()
+    body = read_body(rfile, content_length)
+    METRICS.observe(endpoint, "body_read", time.perf_counter() - started)
+    count, offset = parse_pixel_upload(body, headers.get('Content-Type', ''), headers, max_images=max_images)
+    return body, count, offset
+
+def predict_routed(image_data: bytes) -> Dict[str, Any]:
+    """Answer with the model the registry routes this request to, then queue any shadow comparisons"""
+    note_images([image_data])
+    name, model = registry.route() if registry else (PRIMARY_NAME, model_instance)
+    started = time.perf_counter()
+    result = model.predict(image_data)
+    seconds = time.perf_counter() - started
+    result["model"] = name
+    if registry:
+        registry.observe(name, seconds)
+        if name == PRIMARY_NAME:
+            registry.shadow(image_data, result, seconds)
+    return result
+
+def handle_predict_batch(headers, rfile) -> Dict[str, Any]:
+    """Run every uploaded file in a multipart body through the model as one batch"""
+    content_length = int(headers.get('Content-Length', 0))
+    content_type = headers.get('Content-Type', '')
+    
+    model = model_instance
+    if not model:
+        return {"status": "error", "message": "Model not available"}
+    if content_length <= 0:
+        return {"status": "error", "message": "No data provided"}
+    
+    if is_pixel_upload(content_type):
+        # N images already resized on the device, run as one stacked batch without decoding
+        if content_length > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(content_length, MAX_UPLOAD_BYTES)
+        try:
+            body, count, offset = read_pixel_upload(headers, rfile, '/predict/batch', max_images=BATCH_MAX_FILES)
+        except ValueError as e:
+            return {"status": "error", "message": f"Invalid pixel upload: {str(e)}"}
+        filenames = [""] * count
+        predictions = dict(enumerate(model.predict_pixels(body, count, offset, '/predict/batch')))
+    elif content_type.startswith('multipart/form-data'):
+        timings = {}
+        parts = [part for part in read_multipart(rfile, content_type, content_length, MAX_UPLOAD_BYTES, timings)
+                 if part.name in ("file", "files")]
+        for stage, seconds in timings.items():
+            METRICS.observe('/predict/batch', stage, seconds)
+        if not parts:
+            return {"status": "error", "message": "No files provided"}
+        if len(parts) > BATCH_MAX_FILES:
+            return {"status": "error", "message": f"Maximum {BATCH_MAX_FILES} images allowed per batch"}
+        
+        logger.debug("Batch upload", extra={"files": len(parts)})
+        
+        # Only valid images go to the model; the rest keep their slot with an error
+        filenames = [part.filename or "" for part in parts]
+        valid = [i for i, part in enumerate(parts) if is_image_data(part.data)]
+        note_images([parts[i].data for i in valid])
+        predictions = dict(zip(valid, model.predict_batch([parts[i].data for i in valid])))
+    else:
+        return {"status": "error",
+                "message": "Expected multipart/form-data, application/x-rgb8 or application/x-npy"}
+    
+    results = []
+    for i, filename in enumerate(filenames):
+        result = predictions.get(i, {"error": "No valid image signature found"})
+        item = {"index": i, "filename": filename}
+        if "error" in result:
+            item.update({"status": "error", "message": result["error"]})
+        else:
+            item.update({
+                "status": "success",
+                "prediction": {
+                    "breed": result["prediction"],
+                    "confidence": round(result["confidence"] * 100, 2),
+                    "confidence_decimal": result["confidence"]
+                },
+                "top_predictions": result["top_predictions"],
+                "model_version": result.get("model_version")
+            })
+        results.append(item)
+    
+    successful = sum(1 for item in results if item["status"] == "success")
+    return {
+        "status": "success",
+        "count": len(results),
+        "successful": successful,
+        "failed": len(results) - successful,
+        "results": results
+    }
+
 class CattleAIHandler(BaseHTTPRequestHandler):
     """HTTP request handler for the cattle AI server"""
     
@@ -240,198 +895,42 @@ class CattleAIHandler(BaseHTTPRequestHandler):
     
     def do_GET(self):
         """Handle GET requests"""
-        try:
-            parsed_path = urlparse(self.path)
-            path = parsed_path.path
-            
-            print(f"📨 GET {path} from {self.client_address[0]}")
-            
-            # CORS headers
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-            self.send_header('Connection', 'close')
-            self.end_headers()
-            
-            response = {}
-            
-            if path == '/health':
-                response = {
-                    "status": "healthy",
-                    "model_loaded": model_instance.is_loaded if model_instance else False,
-                    "server": "Cattle AI Server",
-                    "version": "1.0",
-                    "timestamp": datetime.now().isoformat(),
-                    "breeds_count": len(model_instance.breeds) if model_instance else 0,
-                    "device": str(model_instance.device) if model_instance and hasattr(model_instance, 'device') else "none"
-                }
-            elif path == '/breeds':
-                if model_instance:
-                    response = {
-                        "breeds": model_instance.breeds,
-                        "count": len(model_instance.breeds)
-                    }
-                else:
-                    response = {"error": "Model not available"}
-            elif path == '/status':
-                response = {
-                    "server_running": True,
-                    "model_status": "loaded" if model_instance and model_instance.is_loaded else "not_loaded",
-                    "requests_served": getattr(self.server, 'request_count', 0)
-                }
-            else:
-                response = {"error": "Endpoint not found"}
-            
-            response_json = json.dumps(response, indent=2)
-            self.wfile.write(response_json.encode('utf-8'))
-            
-        except Exception as e:
-            print(f"❌ GET error: {e}")
-            try:
-                self.send_error(500, f"Server error: {str(e)}")
-            except:
-                pass
+        self._dispatch('GET')
     
     def do_POST(self):
         """Handle POST requests"""
+        self._dispatch('POST')
+    
+    def _dispatch(self, method: str):
+        """Run the shared router and write its JSON response"""
         try:
-            parsed_path = urlparse(self.path)
-            path = parsed_path.path
+            path = urlparse(self.path).path
+            received = time.monotonic()
+            status_code, response = handle_request(method, path, self.headers, self.rfile,
+                                                   self.client_address[0], received)
             
-            print(f"📤 POST {path} from {self.client_address[0]}")
+            started = time.perf_counter()
+            if isinstance(response, str):
+                body, content_type = response.encode('utf-8'), PROMETHEUS_CONTENT_TYPE
+            else:
+                body, content_type = json.dumps(response, indent=2).encode('utf-8'), 'application/json'
+            METRICS.observe(path if path in ENDPOINTS else "other", "serialize", time.perf_counter() - started)
             
             # CORS headers
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
+            self.send_response(status_code)
+            if isinstance(response, dict) and "retry_after" in response:
+                self.send_header('Retry-After', str(response["retry_after"]))
+            self.send_header('Content-Type', content_type)
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Deadline-Ms')
             self.send_header('Connection', 'close')
             self.end_headers()
             
-            response = {}
-            
-            if path == '/predict':
-                try:
-                    # Read request data
-                    content_length = int(self.headers.get('Content-Length', 0))
-                    content_type = self.headers.get('Content-Type', '')
-                    
-                    print(f"📋 Content-Type: {content_type}")
-                    print(f"📋 Content-Length: {content_length}")
-                    
-                    if content_length > 0:
-                        post_data = self.rfile.read(content_length)
-                        
-                        if not model_instance:
-                            response = {"error": "Model not available"}
-                        else:
-                            # Handle multipart form data (from Flutter)
-                            if content_type.startswith('multipart/form-data'):
-                                try:
-                                    # Use Python's built-in email parser for multipart data
-                                    import email
-                                    import re
-                                    from email.message import EmailMessage
-                                    from io import BytesIO
-                                    
-                                    # Find boundary from Content-Type header
-                                    print(f"📋 Full Content-Type header: '{content_type}'")
-                                    boundary_match = re.search(r'boundary=([^;\r\n]+)', content_type)
-                                    if boundary_match:
-                                        boundary_raw = boundary_match.group(1).strip()
-                                        print(f"📋 Raw boundary string: '{boundary_raw}'")
-                                        
-                                        # Create a proper MIME message for parsing
-                                        mime_header = f"Content-Type: multipart/form-data; boundary={boundary_raw}\r\n\r\n".encode()
-                                        full_message = mime_header + post_data
-                                        
-                                        # Parse using email library
-                                        msg = email.message_from_bytes(full_message)
-                                        
-                                        if msg.is_multipart():
-                                            print(f"📋 Successfully parsed multipart message with {len(msg.get_payload())} parts")
-                                            
-                                            for i, part in enumerate(msg.get_payload()):
-                                                print(f"📋 Processing part {i}")
-                                                
-                                                # Get content disposition
-                                                content_disp = part.get('Content-Disposition', '')
-                                                print(f"📋 Content-Disposition: {content_disp}")
-                                                
-                                                # Check if this is the file upload
-                                                if 'form-data' in content_disp and 'name="file"' in content_disp:
-                                                    print(f"📋 Found file upload part!")
-                                                    
-                                                    # Get the file data
-                                                    file_data = part.get_payload(decode=True)
-                                                    if file_data:
-                                                        print(f"📋 Extracted file data: {len(file_data)} bytes")
-                                                        print(f"📋 First 20 bytes: {file_data[:20]}")
-                                                        
-                                                        # Verify this looks like image data
-                                                        if len(file_data) > 100:
-                                                            # Check for common image file signatures
-                                                            if (file_data.startswith(b'\xff\xd8\xff') or  # JPEG
-                                                                file_data.startswith(b'\x89PNG') or      # PNG
-                                                                file_data.startswith(b'GIF8') or        # GIF
-                                                                file_data.startswith(b'RIFF')):         # WebP/other
-                                                                
-                                                                print(f"📋 Valid image signature detected")
-                                                                response = model_instance.predict(file_data)
-                                                                print(f"📊 Prediction result: {response}")
-                                                                break
-                                                            else:
-                                                                print(f"❌ No valid image signature found")
-                                                                print(f"❌ File starts with: {file_data[:10]}")
-                                                        else:
-                                                            print(f"❌ File data too small: {len(file_data)} bytes")
-                                                    else:
-                                                        print(f"❌ No file data in part {i}")
-                                        else:
-                                            print(f"❌ Message is not multipart")
-                                            # Fallback to manual parsing
-                                            response = {"error": "Failed to parse multipart data"}
-                                    else:
-                                        response = {"error": "No boundary found in multipart data"}
-                                        
-                                except Exception as e:
-                                    print(f"❌ Multipart parsing error: {e}")
-                                    response = {"error": f"Multipart parsing failed: {str(e)}"}
-                                    
-                            elif content_type == 'application/json':
-                                # Handle base64 encoded image
-                                try:
-                                    data = json.loads(post_data.decode('utf-8'))
-                                    if 'image' in data:
-                                        # Decode base64 image
-                                        image_data = base64.b64decode(data['image'])
-                                        response = model_instance.predict(image_data)
-                                    else:
-                                        response = {"error": "No image data provided"}
-                                except json.JSONDecodeError:
-                                    response = {"error": "Invalid JSON"}
-                            else:
-                                # Assume raw image data
-                                print(f"📋 Treating as raw image data: {len(post_data)} bytes")
-                                response = model_instance.predict(post_data)
-                    else:
-                        response = {"error": "No data provided"}
-                
-                except Exception as e:
-                    print(f"❌ POST predict error: {e}")
-                    traceback.print_exc()
-                    response = {"error": f"Request processing failed: {str(e)}"}
-            else:
-                response = {"error": "Endpoint not found"}
-            
-            response_json = json.dumps(response, indent=2)
-            self.wfile.write(response_json.encode('utf-8'))
+            self.wfile.write(body)
             
         except Exception as e:
-            print(f"❌ POST error: {e}")
+            logger.error("%s %s failed: %s", method, self.path, e)
             try:
                 self.send_error(500, f"Server error: {str(e)}")
             except:
@@ -443,16 +942,124 @@ class CattleAIHandler(BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Deadline-Ms')
             self.send_header('Connection', 'close')
             self.end_headers()
         except Exception as e:
-            print(f"❌ OPTIONS error: {e}")
+            logger.error("OPTIONS failed: %s", e)
     
     def log_message(self, format, *args):
-        """Override to customize logging"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] {format % args}")
+        """Route http.server's own lines to the debug log (handle_request writes the access line)"""
+        logger.debug(format % args, extra={"client_ip": self.client_address[0]})
+
+def model_files(backend: str) -> List[str]:
+    """Files a model load with this backend reads; the hot-reload watcher polls them"""
+    if backend == "fake":
+        return [BREEDS_FILE]
+    if backend == "onnxruntime":
+        return [onnx_path(MODEL_PATH), BREEDS_FILE]
+    files = [MODEL_PATH, BREEDS_FILE]
+    if exported_path is not None:
+        files += [exported_path(MODEL_PATH), slim_path(MODEL_PATH)]
+        if QUANTIZED:
+            files.append(quantized_path(MODEL_PATH))
+    return files
+
+def create_traffic_recorder(directory: str, trace_file: str = TRACE_FILE) -> TrafficRecorder:
+    """Recorder for RECORDED_ENDPOINTS with the RECORD_* settings"""
+    return TrafficRecorder(directory, sample_rate=RECORD_SAMPLE_RATE, record_payloads=RECORD_PAYLOADS,
+                           endpoints=RECORDED_ENDPOINTS, trace_file=trace_file)
+
+def uds_info() -> Dict[str, Any]:
+    """What local socket clients need to label predictions: the primary model's classes and version"""
+    model = model_instance
+    if not readiness.ready or model is None or not model.is_loaded:
+        raise ServiceUnavailable(f"Model not ready ({readiness.phase})")
+    return {"classes": model.breeds, "model_version": model.model_version, "model_format": model.model_format}
+
+def uds_predict(images: List[bytes], k: int) -> List[Union[Tuple[List[int], List[float]], str]]:
+    """Top-k for images sent over the local socket, from the primary model"""
+    model = model_instance
+    if not readiness.ready or model is None or not model.is_loaded:
+        raise ServiceUnavailable(f"Model not ready ({readiness.phase})")
+    return model.predict_topk(images, k)
+
+def start_uds_daemon(path: str, sock: Optional[socket.socket] = None) -> InferenceDaemon:
+    """Serve uds_predict on a Unix socket at ``path`` (or on ``sock``, bound before a fork) in the background"""
+    return InferenceDaemon(path, uds_predict, uds_info, sock=sock, max_images=BATCH_MAX_FILES,
+                           max_image_bytes=MAX_UPLOAD_BYTES, max_in_flight=UDS_MAX_IN_FLIGHT).start()
+
+def install_model(model):
+    """Point new requests at ``model``; a single reference swap, so running requests keep the old one"""
+    global model_instance
+    model_instance = model
+
+def create_reloader(backend: str, warmup_rounds: int = WARMUP_ROUNDS) -> ModelReloader:
+    """Hot reloader that rebuilds (and warms) the model from MODEL_PATH with ``backend``"""
+    def build_model():
+        model = CattleBreedModel(MODEL_PATH, BREEDS_FILE, backend=backend)
+        model.load_model()
+        model.warmup(warmup_rounds)
+        return model
+    return ModelReloader(build_model, lambda: model_instance, install_model,
+                         watch_paths=model_files(backend),
+                         poll_seconds=WATCH_POLL_SECONDS,
+                         retire_after_seconds=RELOAD_RETIRE_SECONDS)
+
+def create_registry(candidate_specs: List[str], shadow_specs: List[str],
+                    warmup_rounds: int = WARMUP_ROUNDS) -> ModelRegistry:
+    """Registry around the current model_instance with the candidate and shadow models loaded and warmed"""
+    models = ModelRegistry(lambda: model_instance, shadow_workers=SHADOW_WORKERS,
+                           shadow_max_pending=SHADOW_MAX_PENDING)
+    for spec, shadow in [(spec, False) for spec in candidate_specs] + [(spec, True) for spec in shadow_specs]:
+        spec = parse_model_spec(spec)
+        def build_model():
+            model = CattleBreedModel(spec["path"], BREEDS_FILE, backend=spec["backend"], quantized=spec["quantized"])
+            model.load_model()
+            model.warmup(warmup_rounds)
+            return model
+        try:
+            entry = models.load(spec["name"], build_model, weight=spec["weight"], shadow=shadow)
+        except ValueError as e:
+            print(f"⚠️ Skipping model {spec['name']}: {e}")
+            continue
+        print(f"✅ Registered {'shadow' if shadow else 'candidate'} model {entry.name} "
+              f"({entry.model.model_format}, version {entry.model.model_version}"
+              f"{'' if shadow else f', {entry.weight:g}% of /predict'})")
+    return models
+
+def start_up(backend: str, candidate_specs: List[str], shadow_specs: List[str], watch_model: bool = False,
+             warmup_rounds: int = WARMUP_ROUNDS):
+    """Load the model (unless already loaded), the reloader and the registry, warm them, then mark ready"""
+    global model_instance, model_reloader, registry
+    try:
+        readiness.enter("loading")
+        if model_instance is None:
+            model = CattleBreedModel(MODEL_PATH, BREEDS_FILE, backend=backend)
+            model.load_model()
+            model_instance = model
+        
+        # POST /admin/reload always works; --watch-model also reloads on file changes
+        model_reloader = create_reloader(backend, warmup_rounds)
+        if watch_model:
+            model_reloader.start_watching()
+        
+        # Candidate and shadow models for trials on live traffic
+        registry = create_registry(candidate_specs, shadow_specs, warmup_rounds)
+        
+        readiness.enter("warming")
+        warmup_seconds = model_instance.warmup(warmup_rounds)
+        readiness.mark_ready()
+        
+        print(f"✅ Ready in {readiness.time_to_ready:.2f}s: {backend} backend "
+              f"({model_instance.model_format or 'mock'}, version {model_instance.model_version}), "
+              f"warmup {warmup_seconds:.2f}s")
+        if registry.candidates:
+            print(f"   Models: {PRIMARY_NAME} + {', '.join(registry.candidates)}")
+    except Exception as e:
+        readiness.mark_failed(str(e))
+        print(f"❌ Startup failed: {e}")
+        traceback.print_exc()
 
 def get_local_ip():
     """Get the local IP address of this machine"""
@@ -465,40 +1072,156 @@ def get_local_ip():
     except Exception:
         return "127.0.0.1"
 
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Cattle Breed AI Prediction Server")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                        help="threaded: one thread per connection, Connection: close; "
+                             "asyncio: event loop with keep-alive and a bounded inference executor")
+    parser.add_argument("--workers", type=int, default=DEFAULT_EXECUTOR_WORKERS,
+                        help="Executor threads for decode/inference (asyncio engine; raised to the admission limit "
+                             "plus EXECUTOR_SPARE_WORKERS)")
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND,
+                        help="torch: PyTorch (TorchScript export if present); "
+                             "onnxruntime: ONNX export via ONNX Runtime, torch not required; "
+                             "fake: deterministic predictions with simulated latency, for load testing")
+    parser.add_argument("--fake-latency", default=FAKE_LATENCY,
+                        help="Fake backend latency per forward pass in ms: constant:MS, uniform:LOW,HIGH, "
+                             "normal:MEAN,STD, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--fake-per-item-ms", type=float, default=FAKE_PER_ITEM_MS,
+                        help="Fake backend latency added per image after the first in a batch")
+    parser.add_argument("--onnx-threads", type=int, default=ONNX_INTRA_OP_THREADS,
+                        help="ONNX Runtime intra-op threads (0 = one per physical core)")
+    parser.add_argument("--onnx-inter-op-threads", type=int, default=ONNX_INTER_OP_THREADS,
+                        help="ONNX Runtime inter-op threads")
+    parser.add_argument("--quantized", action="store_true",
+                        help="Serve the INT8 model from quantize_model.py (torch backend, CPU)")
+    parser.add_argument("--fold-normalization", action="store_true", default=FOLD_NORMALIZATION,
+                        help="Fold the input normalization into the first convolution (torch backend, checkpoint)")
+    parser.add_argument("--watch-model", action="store_true", default=WATCH_MODEL,
+                        help="Reload the model without downtime when its files change")
+    parser.add_argument("--admin-token", default=ADMIN_TOKEN,
+                        help="Allow POST /admin/reload from other hosts with 'Authorization: Bearer <token>'")
+    parser.add_argument("--warmup-rounds", type=int, default=WARMUP_ROUNDS,
+                        help="Warmup forward passes per batch size before /ready reports ready (0 = no warmup)")
+    parser.add_argument("--candidate", action="append", default=list(CANDIDATE_MODELS),
+                        metavar="NAME=PATH[,weight=PCT][,backend=B][,quantized]",
+                        help="Also load this model and route PCT percent of /predict traffic to it (repeatable)")
+    parser.add_argument("--shadow", action="append", default=list(SHADOW_MODELS),
+                        metavar="NAME=PATH[,backend=B][,quantized]",
+                        help="Also load this model and compare it with the primary in the background (repeatable)")
+    parser.add_argument("--record-traffic", default=RECORD_TRAFFIC_DIR, metavar="DIR",
+                        help="Record a sample of requests to DIR/traffic.jsonl for benchmarks/replay_traffic.py")
+    parser.add_argument("--record-sample-rate", type=float, default=RECORD_SAMPLE_RATE,
+                        help="Fraction of requests recorded")
+    parser.add_argument("--record-payloads", action="store_true", default=RECORD_PAYLOADS,
+                        help="Also store the uploaded images of recorded requests (under DIR/blobs)")
+    parser.add_argument("--uds", nargs="?", const=DEFAULT_SOCKET_PATH, default=UDS_PATH, metavar="PATH",
+                        help=f"Also answer local scripts on a Unix socket (default path {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--log-level", default=LOG_LEVEL, help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--log-format", choices=["json", "text"], default=LOG_FORMAT,
+                        help="Console log format (the log file is always JSON lines)")
+    parser.add_argument("--log-file", default=LOG_FILE, help="Also write JSON-lines logs to this rotating file")
+    parser.add_argument("--debug-sample-rate", type=float, default=LOG_DEBUG_SAMPLE_RATE,
+                        help="Fraction of DEBUG records kept")
+    args = parser.parse_args()
+    try:
+        parse_latency(args.fake_latency)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
 def main():
     """Main server function"""
-    global server_instance, model_instance
+    global server_instance, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS, QUANTIZED, FOLD_NORMALIZATION, ADMIN_TOKEN
+    global FAKE_LATENCY, FAKE_PER_ITEM_MS, RECORD_SAMPLE_RATE, RECORD_PAYLOADS, traffic_recorder, uds_daemon
+    
+    args = parse_args()
+    RECORD_SAMPLE_RATE = args.record_sample_rate
+    RECORD_PAYLOADS = args.record_payloads
+    if args.record_traffic:
+        traffic_recorder = create_traffic_recorder(args.record_traffic)
+    FAKE_LATENCY = args.fake_latency
+    FAKE_PER_ITEM_MS = args.fake_per_item_ms
+    QUANTIZED = args.quantized
+    FOLD_NORMALIZATION = args.fold_normalization
+    ADMIN_TOKEN = args.admin_token
+    ONNX_INTRA_OP_THREADS = args.onnx_threads
+    ONNX_INTER_OP_THREADS = args.onnx_inter_op_threads
+    port = args.port
+    setup_logging(level=args.log_level, log_file=args.log_file, fmt=args.log_format,
+                  debug_sample_rate=args.debug_sample_rate)
     
     print("🐄 Cattle Breed AI Prediction Server - Robust Edition")
     print("=" * 60)
     
-    # Initialize model
-    model_instance = CattleBreedModel(MODEL_PATH, BREEDS_FILE)
-    success = model_instance.load_model()
+    if args.uds:
+        # Answers with "not ready" until start_up has finished
+        try:
+            uds_daemon = start_uds_daemon(args.uds)
+        except OSError as e:
+            print(f"❌ Cannot listen on {args.uds}: {e}")
+            return
+    
+    # Load and warm the model in the background; /live answers meanwhile and /ready once it is done
+    threading.Thread(target=start_up, args=(args.backend, args.candidate, args.shadow, args.watch_model,
+                                            args.warmup_rounds),
+                     name="startup", daemon=True).start()
     
     # Get network information
     local_ip = get_local_ip()
     
     print(f"\n🌐 Server Configuration:")
-    print(f"   Port: {SERVER_PORT}")
+    print(f"   Port: {port}")
+    print(f"   Engine: {args.engine}")
+    print(f"   Backend: {args.backend}")
     print(f"   Local IP: {local_ip}")
-    print(f"   Model Status: {'Loaded' if success else 'Mock Mode'}")
+    print(f"   Model: {MODEL_PATH} (loading in the background, warmup rounds {args.warmup_rounds})")
+    print(f"   Hot Reload: POST /admin/reload" + (f", watching {MODEL_PATH}" if args.watch_model else ""))
+    print(f"   Logging: {args.log_level} {args.log_format}" + (f" -> {args.log_file}" if args.log_file else ""))
+    if args.record_traffic:
+        print(f"   Traffic Recording: {args.record_sample_rate:.0%} of requests -> {args.record_traffic}"
+              + (" (with images)" if args.record_payloads else ""))
+    if args.uds:
+        print(f"   Local Socket: {args.uds} (predict_cattle.py uses it automatically)")
     
     print(f"\n📱 Mobile Access URLs:")
-    print(f"   Health Check: http://{local_ip}:{SERVER_PORT}/health")
-    print(f"   Breed List: http://{local_ip}:{SERVER_PORT}/breeds")
-    print(f"   Prediction: http://{local_ip}:{SERVER_PORT}/predict")
+    print(f"   Health Check: http://{local_ip}:{port}/health")
+    print(f"   Readiness: http://{local_ip}:{port}/ready (liveness: /live)")
+    print(f"   Breed List: http://{local_ip}:{port}/breeds")
+    print(f"   Prediction: http://{local_ip}:{port}/predict")
+    print(f"   Batch Prediction: http://{local_ip}:{port}/predict/batch")
+    print(f"   Metrics: http://{local_ip}:{port}/metrics")
     
     print(f"\n💻 Local Access URLs:")
-    print(f"   http://localhost:{SERVER_PORT}/health")
-    print(f"   http://127.0.0.1:{SERVER_PORT}/health")
+    print(f"   http://localhost:{port}/health")
+    print(f"   http://127.0.0.1:{port}/health")
+    print(f"   Model Reload (admin): POST http://localhost:{port}/admin/reload")
+    
+    if args.engine == "asyncio":
+        try:
+            workers = max(args.workers, admission.max_in_flight + EXECUTOR_SPARE_WORKERS)
+            print(f"\n🚀 Asyncio server starting on port {port} ({workers} executor threads)...")
+            print("   Press Ctrl+C to stop the server\n")
+            run_async_server(handle_request, port, max_workers=args.workers,
+                             max_body_bytes=MAX_UPLOAD_BYTES,
+                             allow_headers='Content-Type, Authorization, X-Deadline-Ms',
+                             endpoints=ENDPOINTS, admission=admission,
+                             admission_paths=('/predict', '/predict/batch'), deadline_ms=DEFAULT_DEADLINE_MS)
+        except KeyboardInterrupt:
+            print("\n🛑 Server stopping...")
+            if uds_daemon:
+                uds_daemon.stop()
+            print("✅ Server stopped successfully")
+        return
     
     # Start server
     try:
-        server_instance = ThreadedHTTPServer(('', SERVER_PORT), CattleAIHandler)
+        server_instance = ThreadedHTTPServer(('', port), CattleAIHandler)
         server_instance.timeout = 1.0
         
-        print(f"\n🚀 Server starting on port {SERVER_PORT}...")
+        print(f"\n🚀 Server starting on port {port}...")
         print("   This server will run continuously.")
         print("   Press Ctrl+C to stop the server\n")
         
@@ -517,6 +1240,8 @@ def main():
     finally:
         if server_instance:
             server_instance.server_close()
+        if uds_daemon:
+            uds_daemon.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
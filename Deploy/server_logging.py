@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Structured Logging for the Cattle AI Servers
+JSON-lines logging through a bounded queue and a background writer thread, with request IDs, sampling and rotation.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+
+# Logging defaults
+DEFAULT_LEVEL = "INFO"
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_DEBUG_SAMPLE_RATE = 0.01  # fraction of DEBUG records kept (per-part upload detail)
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+WRITE_BATCH_SIZE = 512  # records formatted per write/flush by the writer thread
+
+LOGGER_NAME = "cattle"
+
+# Request ID of the request being handled on the current thread/task
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+def get_logger(name: str = "") -> logging.Logger:
+    """Logger under the shared ``cattle`` hierarchy"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def new_request_id(headers=None) -> str:
+    """Use the client's X-Request-ID if it sent one, otherwise generate a short random ID"""
+    request_id = headers.get("X-Request-ID") if headers is not None else None
+    return request_id[:64] if request_id else uuid.uuid4().hex[:16]
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the current request ID (runs on the logging thread's caller)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of DEBUG records; INFO and above always pass"""
+
+    def __init__(self, debug_sample_rate: float):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.debug_sample_rate >= 1.0:
+            return True
+        return random.random() < self.debug_sample_rate
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request ID, message and any ``extra`` fields"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable console lines in the style of the old print output"""
+
+    def format(self, record):
+        line = f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.created))}] " \
+               f"{record.levelname:<7} {record.getMessage()}"
+        fields = [f"{key}={value}" for key, value in vars(record).items()
+                  if key not in JsonLinesFormatter.RESERVED]
+        if fields:
+            line += " " + " ".join(fields)
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            line += f" (req {request_id})"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the request thread: records are dropped when the queue is full.
+
+    Formatting is left to the background writer, so the caller only pays for
+    building the LogRecord and one put on a lock-free ``queue.SimpleQueue``
+    (bounded approximately by checking its size first).
+    """
+
+    def __init__(self, log_queue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put(record)
+
+
+class BatchFlushStreamHandler(logging.StreamHandler):
+    """StreamHandler whose per-record flush is deferred to the end of a writer batch"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchFlushRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Size-rotated file handler whose per-record flush is deferred to the end of a writer batch"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Writer thread that drains up to ``WRITE_BATCH_SIZE`` records at a time and flushes once per batch"""
+
+    def _monitor(self):
+        log_queue = self.queue
+        running = True
+        while running:
+            batch = [log_queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    running = False
+                    break
+                self.handle(record)
+            for handler in self.handlers:
+                handler.flush_batch()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+def setup_logging(level: str = DEFAULT_LEVEL, log_file: Optional[str] = None,
+                  fmt: str = "json", queue_size: int = DEFAULT_QUEUE_SIZE,
+                  debug_sample_rate: float = DEFAULT_DEBUG_SAMPLE_RATE,
+                  max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT,
+                  console: bool = True, console_stream=None):
+    """Route the ``cattle`` loggers through a bounded queue to a background writer thread.
+
+    Records go to stdout or ``console_stream`` (``console``) and, when ``log_file`` is set, to a
+    size-rotated file; ``fmt`` is "json" (JSON lines) or "text". Calling it
+    again (e.g. in a forked worker, where the writer thread does not survive)
+    replaces the previous configuration.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        stop_logging()
+
+        formatter = JsonLinesFormatter() if fmt == "json" else TextFormatter()
+        handlers = []
+        if console:
+            stream_handler = BatchFlushStreamHandler(console_stream or sys.stdout)
+            stream_handler.setFormatter(formatter)
+            handlers.append(stream_handler)
+        if log_file:
+            directory = os.path.dirname(log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file_handler = BatchFlushRotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                         backupCount=backup_count, encoding="utf-8")
+            file_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = DroppingQueueHandler(log_queue, queue_size)
+        _queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+        _queue_handler.addFilter(RequestContextFilter())
+
+        logger = get_logger()
+        logger.handlers = [_queue_handler]
+        logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+        logger.propagate = False
+
+        _listener = BatchingQueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        for handler in _listener.handlers:
+            handler.flush_batch()
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def dropped_records() -> int:
+    """Records discarded because the queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
\ No newline at end of file
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+ResNet18 for Serving Without torchvision
+The same modules and parameter names as torchvision's resnet18, so checkpoints load unchanged, optionally built with
+BatchNorm already folded into the convolutions. Importing torchvision costs most of a second of cold start.
+"""
+
+from typing import List
+
+import torch
+import torch.nn as nn
+
+# torchvision resnet18: (planes, stride) of the four stages, two BasicBlocks each
+STAGES = ((64, 1), (128, 2), (256, 2), (512, 2))
+BLOCKS_PER_STAGE = 2
+
+
+def _norm(channels: int, fused: bool) -> nn.Module:
+    return nn.Identity() if fused else nn.BatchNorm2d(channels)
+
+
+class BasicBlock(nn.Module):
+    """torchvision's BasicBlock; with ``fused`` the convolutions carry the BatchNorm as a bias"""
+
+    def __init__(self, inplanes: int, planes: int, stride: int = 1, fused: bool = False):
+        super().__init__()
+        self.conv1 = nn.Conv2d(inplanes, planes, 3, stride=stride, padding=1, bias=fused)
+        self.bn1 = _norm(planes, fused)
+        self.relu = nn.ReLU(inplace=True)
+        self.conv2 = nn.Conv2d(planes, planes, 3, padding=1, bias=fused)
+        self.bn2 = _norm(planes, fused)
+        self.downsample = None
+        if stride != 1 or inplanes != planes:
+            self.downsample = nn.Sequential(nn.Conv2d(inplanes, planes, 1, stride=stride, bias=fused),
+                                            _norm(planes, fused))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        identity = x if self.downsample is None else self.downsample(x)
+        out = self.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        out += identity
+        return self.relu(out)
+
+
+class ResNet18(nn.Module):
+    def __init__(self, num_classes: int, fused: bool = False):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 64, 7, stride=2, padding=3, bias=fused)
+        self.bn1 = _norm(64, fused)
+        self.relu = nn.ReLU(inplace=True)
+        self.maxpool = nn.MaxPool2d(3, stride=2, padding=1)
+        inplanes = 64
+        for index, (planes, stride) in enumerate(STAGES, start=1):
+            blocks: List[nn.Module] = []
+            for block in range(BLOCKS_PER_STAGE):
+                blocks.append(BasicBlock(inplanes, planes, stride if block == 0 else 1, fused))
+                inplanes = planes
+            setattr(self, f"layer{index}", nn.Sequential(*blocks))
+        self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
+        self.fc = nn.Linear(512, num_classes)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.maxpool(self.relu(self.bn1(self.conv1(x))))
+        x = self.layer4(self.layer3(self.layer2(self.layer1(x))))
+        return self.fc(torch.flatten(self.avgpool(x), 1))
\ No newline at end of file
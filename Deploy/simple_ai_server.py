@@ -7,20 +7,28 @@ A lightweight server that focuses on loading the actual AI model with minimal de
 import os
 import sys
 import json
+import random
+import argparse
 import socket
 import threading
 import time
 from datetime import datetime
 import base64
+import hmac
 import io
+import ipaddress
 import traceback
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # HTTP Server imports
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 from socketserver import ThreadingMixIn
 
+# Imported before torch so time-to-ready counts from here
+from readiness import Readiness
+
 # Try to import AI dependencies with minimal overhead
 TORCH_AVAILABLE = False
 PIL_AVAILABLE = False
@@ -30,6 +38,7 @@ print("🔄 Loading AI dependencies...")
 # Try PIL first (simpler)
 try:
     from PIL import Image
+    from image_decode import decode_image
     PIL_AVAILABLE = True
     print("✅ PIL (Pillow) loaded successfully")
 except ImportError as e:
@@ -44,8 +53,8 @@ try:
     import torch.nn as nn
     print("✅ PyTorch nn loaded")
     
-    # Skip torchvision for now, use basic transforms
-    from torchvision.models import resnet18
+    # Skip torchvision transforms; preprocessing is shared plain torch/numpy code
+    from model_loading import load_inference_model, untrained_model, exported_path, quantized_path, slim_path
     print("✅ ResNet18 model loaded")
     
     TORCH_AVAILABLE = True
@@ -60,19 +69,134 @@ except Exception as e:
     torch = None
     nn = None
 
+from inference_batcher import InferenceBatcher
+from backends import (BACKENDS, DEFAULT_FAKE_LATENCY, FakeBackend, TorchBackend, OnnxRuntimeBackend, onnx_path,
+                      parse_latency)
+from multipart_utils import read_multipart, is_image_data, UploadTooLarge
+from pixel_upload import is_pixel_upload, parse_pixel_upload, read_body
+from prediction_cache import PredictionCache
+from async_engine import run_async_server, DEFAULT_EXECUTOR_WORKERS, EXECUTOR_SPARE_WORKERS
+from admission import AdmissionController, AdmissionRejected, parse_deadline
+from model_reloader import ModelReloader, golden_images, DEFAULT_POLL_SECONDS, DEFAULT_RETIRE_AFTER_SECONDS
+from traffic_recorder import TrafficRecorder, note_images, DEFAULT_SAMPLE_RATE
+from metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+from server_logging import get_logger, setup_logging, new_request_id, request_id_var, dropped_records
+
 # Server configuration
 SERVER_PORT = 8001
 
+# Micro-batching: up to BATCH_MAX_SIZE images or BATCH_MAX_WAIT_MS per forward pass
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 5.0
+
+# Inference backend: "torch" (TorchScript export or checkpoint) or "onnxruntime" (models/*.onnx, no torch
+# needed); ONNX Runtime intra-op threads (0 = one per physical core) and inter-op threads
+INFERENCE_BACKEND = "torch"
+ONNX_INTRA_OP_THREADS = 0
+ONNX_INTER_OP_THREADS = 1
+
+# "fake" backend (benchmarks/loadgen.py): deterministic predictions with no model, taking FAKE_LATENCY per forward
+# pass (a distribution spec, see backends.parse_latency) plus FAKE_PER_ITEM_MS per image after the first
+FAKE_LATENCY = DEFAULT_FAKE_LATENCY
+FAKE_PER_ITEM_MS = 0.0
+
+# Torch backend on CPU: serve the INT8 export from quantize_model.py (falls back to fp32 when it is missing)
+QUANTIZED = False
+
+# Torch backend, checkpoint only: fold the ImageNet normalization into conv1 (graph_optimize.py) and only scale
+# pixels to [0, 1] in preprocessing. TorchScript exports are served unfolded
+FOLD_NORMALIZATION = False
+
+# Warmup before /ready answers 200: this many forward passes at every batch size the batcher can form
+WARMUP_ROUNDS = 2
+
+# Preprocessing: run the model and the batch buffer channels-last (faster convolutions on CPU and GPU)
+CHANNELS_LAST = True
+
+# /predict/batch: maximum files per request and parallel image decoders
+BATCH_MAX_FILES = 32
+DECODE_WORKERS = 4
+
+# Uploads larger than this are rejected with 413 before the body is read
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+# Prediction cache: keyed by image hash + model id and version; set CACHE_DISK_PATH to persist across restarts
+# (the SQLite file is capped at CACHE_DISK_MAX_ENTRIES rows and CACHE_DISK_MAX_BYTES of results)
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_TTL_SECONDS = 3600
+CACHE_DISK_PATH = None  # e.g. "cache/predictions.sqlite"
+CACHE_DISK_MAX_ENTRIES = 100000
+CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+
+# Admission control for /predict and /predict/batch: concurrent predictions, waiting requests,
+# per-client-IP cap, and the deadline used when a request has no X-Deadline-Ms header
+ADMISSION_MAX_IN_FLIGHT = 8
+ADMISSION_MAX_QUEUE = 32
+ADMISSION_PER_CLIENT = 4
+DEFAULT_DEADLINE_MS = 30000  # matches ApiConfig.requestTimeout in the Flutter app
+
+# Hot reload: poll the model files for changes (--watch-model) and accept POST /admin/reload from localhost,
+# or from anywhere with "Authorization: Bearer <ADMIN_TOKEN>"; a replaced model keeps serving the requests
+# that already hold it for RELOAD_RETIRE_SECONDS
+WATCH_MODEL = False
+WATCH_POLL_SECONDS = DEFAULT_POLL_SECONDS
+RELOAD_RETIRE_SECONDS = DEFAULT_RETIRE_AFTER_SECONDS
+ADMIN_TOKEN = None
+
+# Traffic recording (opt-in): RECORD_SAMPLE_RATE of the app's requests go to RECORD_TRAFFIC_DIR/traffic.jsonl for
+# benchmarks/replay_traffic.py, with the uploaded images too when RECORD_PAYLOADS is set
+RECORD_TRAFFIC_DIR = None  # e.g. "traffic"
+RECORD_SAMPLE_RATE = DEFAULT_SAMPLE_RATE
+RECORD_PAYLOADS = False
+RECORDED_ENDPOINTS = ('/health', '/breeds', '/predict', '/predict/batch')
+
+# Logging: JSON lines through a background writer; DEBUG detail (per-part upload info) is sampled
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_FILE = None  # e.g. "logs/simple_server.jsonl" (rotated at 50 MB)
+LOG_DEBUG_SAMPLE_RATE = 0.01
+
+logger = get_logger("simple_server")
+
+# Endpoints that get their own metrics labels; anything else is counted as "other"
+ENDPOINTS = ('/health', '/live', '/ready', '/breeds', '/status', '/metrics', '/predict', '/predict/batch',
+             '/admin/reload')
+
+# Global model and hot reloader, set in main()
+model_instance = None
+model_reloader = None
+traffic_recorder = None
+readiness = Readiness()
+
+admission = AdmissionController(max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+                                max_queue=ADMISSION_MAX_QUEUE,
+                                per_client_limit=ADMISSION_PER_CLIENT)
+
 class SimpleCattleModel:
     """Simplified cattle breed prediction model"""
     
-    def __init__(self):
+    def __init__(self, backend=None):
         self.model_path = Path(__file__).parent / "models" / "stable_cattle_model.pth"
         self.breeds_file = Path(__file__).parent / "breeds.json"
+        self.backend_name = backend or INFERENCE_BACKEND
+        self.backend = None
         self.model = None
         self.breeds = []
         self.device = None
         self.is_loaded = False
+        self.batcher = None
+        self.preprocessor = None
+        self.decode_pool = None
+        self.model_version = None
+        self.model_format = None
+        self.cache = PredictionCache(max_entries=CACHE_MAX_ENTRIES,
+                                     max_bytes=CACHE_MAX_BYTES,
+                                     ttl_seconds=CACHE_TTL_SECONDS,
+                                     disk_path=CACHE_DISK_PATH,
+                                     disk_max_entries=CACHE_DISK_MAX_ENTRIES,
+                                     disk_max_bytes=CACHE_DISK_MAX_BYTES,
+                                     model_id=f"{self.backend_name}:{self.model_path}")
         
         print(f"🔍 Looking for model at: {self.model_path}")
         print(f"🔍 Looking for breeds at: {self.breeds_file}")
@@ -81,15 +205,33 @@ class SimpleCattleModel:
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
             print(f"🔧 Using device: {self.device}")
             self.load_model()
+        elif self.backend_name in ("onnxruntime", "fake"):
+            self.device = "cpu"
+            self.load_model()
         else:
             print("⚠️ PyTorch not available, using mock predictions")
             self.device = "cpu"
             self.breeds = ["Holstein Friesian", "Jersey", "Angus", "Brahman", "Hereford", "Gyr", "Sahiwal"]
     
+    def model_files(self):
+        """Model files the configured backend loads from, in order of preference"""
+        if self.backend_name == "fake":
+            return []
+        if self.backend_name == "onnxruntime":
+            # ONNX export from export_model.py --format onnx; runs without torch
+            return [Path(onnx_path(self.model_path))]
+        if not TORCH_AVAILABLE:
+            return [self.model_path]
+        # A frozen TorchScript export or slim file from export_model.py is preferred over the checkpoint
+        files = [self.model_path, Path(exported_path(self.model_path)), Path(slim_path(self.model_path))]
+        if QUANTIZED:
+            files.append(Path(quantized_path(self.model_path)))
+        return files
+    
     def load_model(self):
         """Load the cattle breed prediction model"""
         try:
-            if not TORCH_AVAILABLE:
+            if not TORCH_AVAILABLE and self.backend_name == "torch":
                 print("⚠️ PyTorch not available, skipping model load")
                 return False
             
@@ -107,38 +249,47 @@ class SimpleCattleModel:
                 print("⚠️ Breeds file not found, using default labels")
                 self.breeds = [f"Breed_{i}" for i in range(124)]
             
+            model_files = self.model_files()
+            
             # Try to load the model
-            if self.model_path.exists():
-                print(f"📋 Model file found: {self.model_path}")
+            if self.backend_name == "fake" or any(path.exists() for path in model_files):
+                if self.backend_name == "fake":
+                    # No model at all: the serving layer alone, for load testing
+                    self.backend = FakeBackend(len(self.breeds), latency=FAKE_LATENCY, per_item_ms=FAKE_PER_ITEM_MS)
+                    print(f"✅ Using the fake backend ({FAKE_LATENCY} ms per forward pass)")
+                elif self.backend_name == "onnxruntime":
+                    print(f"📋 Model file found: {self.model_path}")
+                    self.backend = OnnxRuntimeBackend(str(model_files[0]),
+                                                      intra_op_threads=ONNX_INTRA_OP_THREADS,
+                                                      inter_op_threads=ONNX_INTER_OP_THREADS)
+                    print("✅ ONNX model loaded successfully (ONNX Runtime, CPU)")
+                else:
+                    print(f"📋 Model file found: {self.model_path}")
+                    try:
+                        loaded = load_inference_model(self.model_path, self.device, channels_last=CHANNELS_LAST,
+                                                      quantized=QUANTIZED,
+                                                      fold_normalization=FOLD_NORMALIZATION)
+                        print(f"✅ Model weights loaded successfully ({loaded.format}, {loaded.load_seconds:.2f}s)")
+                        
+                    except Exception as e:
+                        print(f"⚠️ Error loading model weights: {e}")
+                        print("   Using untrained model architecture")
+                        loaded = untrained_model(len(self.breeds), self.model_path, self.device, CHANNELS_LAST)
+                    self.backend = TorchBackend(loaded, self.device)
                 
-                # Create model architecture
-                self.model = resnet18(weights=None)
-                num_classes = len(self.breeds)
-                self.model.fc = nn.Linear(self.model.fc.in_features, num_classes)
+                self.model = self.backend.model
+                self.model_format = self.backend.format
+                self.model_version = self.backend.version
+                if self.backend.classes:
+                    self.breeds = self.backend.classes
                 
-                # Load trained weights
-                try:
-                    checkpoint = torch.load(self.model_path, map_location=self.device)
-                    
-                    if isinstance(checkpoint, dict):
-                        if 'model_state_dict' in checkpoint:
-                            state_dict = checkpoint['model_state_dict']
-                            if 'classes' in checkpoint:
-                                self.breeds = checkpoint['classes']
-                        else:
-                            state_dict = checkpoint
-                    else:
-                        state_dict = checkpoint
-                    
-                    self.model.load_state_dict(state_dict)
-                    print("✅ Model weights loaded successfully")
-                    
-                except Exception as e:
-                    print(f"⚠️ Error loading model weights: {e}")
-                    print("   Using untrained model architecture")
+                self.preprocessor = self.backend.make_preprocessor(CHANNELS_LAST)
+                self.batcher = InferenceBatcher(self._forward_batch,
+                                                max_batch_size=BATCH_MAX_SIZE,
+                                                max_wait_ms=BATCH_MAX_WAIT_MS)
+                # Cached predictions from a different checkpoint are dropped
+                self.cache.set_model_version(self.model_version)
                 
-                self.model.to(self.device)
-                self.model.eval()
                 self.is_loaded = True
                 print("🎉 Model loaded and ready for predictions!")
                 return True
@@ -153,17 +304,46 @@ class SimpleCattleModel:
             self.is_loaded = False
             return False
     
+    def warmup(self, rounds=WARMUP_ROUNDS):
+        """Run the request path at every batch size the batcher can form and return the seconds spent.
+        
+        The first requests would otherwise pay for image decoder plugin
+        imports, allocator growth and per-shape kernel selection.
+        """
+        if self.backend is None or not PIL_AVAILABLE or not self.is_loaded or rounds <= 0:
+            return 0.0
+        started = time.perf_counter()
+        images = golden_images()
+        if not images:
+            buffer = io.BytesIO()
+            Image.new("RGB", (256, 256), (128, 128, 128)).save(buffer, "JPEG")
+            images = [buffer.getvalue()]
+        pixels = [self._load_tensor(image_data, 'warmup') for image_data in images]
+        for size in range(1, self.batcher.max_batch_size + 1):
+            batch = [pixels[i % len(pixels)] for i in range(size)]
+            for _ in range(rounds):
+                self._forward_batch(batch, 'warmup')
+        # Starts the batcher thread
+        self.batcher.submit(pixels[0]).result()
+        return time.perf_counter() - started
+    
+    def retire(self):
+        """Release the batcher and decode threads of a model that has been replaced (queued work still runs)"""
+        if self.batcher:
+            self.batcher.stop()
+        if self.decode_pool:
+            self.decode_pool.shutdown(wait=False)
+    
     def predict(self, image_data: bytes):
         """Make a breed prediction from image data"""
         try:
             # If model not available, return mock prediction
-            if not TORCH_AVAILABLE or not PIL_AVAILABLE or not self.is_loaded:
-                import random
+            if self.backend is None or not PIL_AVAILABLE or not self.is_loaded:
                 selected_breed = random.choice(self.breeds)
                 confidence = round(random.uniform(0.75, 0.95), 2)
                 
                 reason = []
-                if not TORCH_AVAILABLE:
+                if not TORCH_AVAILABLE and self.backend_name == "torch":
                     reason.append("PyTorch unavailable")
                 if not PIL_AVAILABLE:
                     reason.append("PIL unavailable")
@@ -182,238 +362,514 @@ class SimpleCattleModel:
                     "note": f"Mock prediction - {', '.join(reason)}"
                 }
             
-            # Try real prediction
-            print("🔍 Processing image for breed prediction...")
-            
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Simple preprocessing (since torchvision transforms might be problematic)
-            import numpy as np
-            
-            # Resize image to 224x224
-            image = image.resize((224, 224))
-            
-            # Convert to tensor manually
-            img_array = np.array(image).astype(np.float32) / 255.0
-            img_array = np.transpose(img_array, (2, 0, 1))  # HWC to CHW
+            # Repeated uploads of the same photo are served from the cache
+            cached = self.cache.get(image_data)
+            if cached is not None:
+                logger.debug("Cached prediction", extra={"breed": cached['prediction'], "confidence": cached['confidence']})
+                cached["cached"] = True
+                return cached
             
-            # Normalize (ImageNet stats)
-            mean = np.array([0.485, 0.456, 0.406])
-            std = np.array([0.229, 0.224, 0.225])
+            # Convert to tensor and wait for the batcher to run it
+            input_tensor = self._load_tensor(image_data, '/predict')
+            result = self.batcher.submit(input_tensor).result()
+            self.cache.put(image_data, result)
             
-            for c in range(3):
-                img_array[c] = (img_array[c] - mean[c]) / std[c]
-            
-            # Convert to tensor
-            input_tensor = torch.from_numpy(img_array).unsqueeze(0).to(self.device)
-            
-            # Make prediction
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                confidence, predicted = torch.max(probabilities, 0)
-                
-                breed_name = self.breeds[predicted.item()]
-                confidence_score = confidence.item()
-                
-                # Get top 3 predictions
-                top_probs, top_indices = torch.topk(probabilities, 3)
-                top_predictions = [
-                    {
-                        "breed": self.breeds[idx.item()],
-                        "confidence": prob.item()
-                    }
-                    for prob, idx in zip(top_probs, top_indices)
-                ]
-                
-                print(f"✅ Prediction complete: {breed_name} ({confidence_score:.2f})")
-                
-                return {
-                    "prediction": breed_name,
-                    "confidence": confidence_score,
-                    "top_predictions": top_predictions,
-                    "status": "success",
-                    "model_type": "actual_ai"
-                }
+            logger.debug("Prediction complete", extra={"breed": result['prediction'], "confidence": result['confidence']})
+            return result
                 
         except Exception as e:
-            print(f"❌ Prediction error: {e}")
-            traceback.print_exc()
+            logger.exception("Prediction failed")
             return {"error": f"Prediction failed: {str(e)}"}
 
+    def predict_batch(self, images):
+        """Predict several images at once: parallel decode, then one stacked forward pass.
+        
+        Returns one result per image, in order. Images that fail to decode get
+        an error entry instead of failing the whole batch.
+        """
+        if self.backend is None or not PIL_AVAILABLE or not self.is_loaded:
+            return [self.predict(image_data) for image_data in images]
+        
+        # Serve repeats from the cache; only the misses are decoded and run
+        results = [self.cache.get(image_data) for image_data in images]
+        for result in results:
+            if result is not None:
+                result["cached"] = True
+        misses = [i for i, result in enumerate(results) if result is None]
+        
+        for i, result in zip(misses, self._run_batch([images[i] for i in misses])):
+            if "error" not in result:
+                self.cache.put(images[i], result)
+            results[i] = result
+        return results
+    
+    def predict_pixels(self, body, count, offset=0, endpoint='/predict'):
+        """Predict images uploaded already decoded and resized (pixel_upload.py), without PIL or a copy.
+        
+        Returns one uncached result per image. A single image shares the
+        batcher's forward pass with the other /predict requests.
+        """
+        if self.backend is None or not self.is_loaded:
+            return [{"error": "Model not available"} for _ in range(count)]
+        try:
+            pixels = self.preprocessor.from_buffer(body, count, offset)
+            if count == 1:
+                return [self.batcher.submit(pixels[0]).result()]
+            return self._forward_batch(pixels, endpoint)
+        except Exception as e:
+            logger.exception("Prediction failed")
+            return [{"error": f"Prediction failed: {str(e)}"} for _ in range(count)]
+    
+    def _run_batch(self, images):
+        """Decode images on the decode pool and run the decodable ones as one stacked batch"""
+        if not images:
+            return []
+        
+        if self.decode_pool is None:
+            self.decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+        
+        def decode(image_data):
+            try:
+                return self._load_tensor(image_data, '/predict/batch'), None
+            except Exception as e:
+                return None, f"Image decode failed: {str(e)}"
+        
+        decoded = list(self.decode_pool.map(decode, images))
+        tensors = [tensor for tensor, _ in decoded if tensor is not None]
+        
+        try:
+            predictions = iter(self._forward_batch(tensors, '/predict/batch') if tensors else [])
+        except Exception as e:
+            logger.exception("Batch prediction failed")
+            return [{"error": f"Prediction failed: {str(e)}"} for _ in images]
+        
+        return [next(predictions) if tensor is not None else {"error": error}
+                for tensor, error in decoded]
+    
+    def _load_tensor(self, image_data, endpoint='/predict'):
+        """Decode image bytes into 224x224 HWC uint8 pixels (normalized later, per batch)"""
+        # Decode at the smallest size >= 224 px (JPEG DCT scaling), upright and RGB
+        started = time.perf_counter()
+        image = decode_image(image_data)
+        decoded = time.perf_counter()
+        pixels = self.preprocessor.pixels(image)
+        METRICS.observe(endpoint, "decode", decoded - started)
+        METRICS.observe(endpoint, "preprocess", time.perf_counter() - decoded)
+        return pixels
+    
+    def _forward_batch(self, tensors, endpoint='/predict'):
+        """Run one stacked forward pass and return the top-3 predictions for each input"""
+        started = time.perf_counter()
+        # /predict/batch runs here on per-connection threads: draw from the shared buffers
+        with self.preprocessor.shared_batch(tensors) as batch:
+            normalized = time.perf_counter()
+            probabilities = self.backend.forward(batch)
+            forwarded = time.perf_counter()
+            top_probs, top_indices = self.backend.topk(probabilities, 3)
+        
+        results = []
+        for probs, indices in zip(top_probs, top_indices):
+            top_predictions = [
+                {
+                    "breed": self.breeds[idx],
+                    "confidence": prob
+                }
+                for prob, idx in zip(probs, indices)
+            ]
+            results.append({
+                "prediction": top_predictions[0]["breed"],
+                "confidence": top_predictions[0]["confidence"],
+                "top_predictions": top_predictions,
+                "status": "success",
+                "model_type": "actual_ai",
+                "model_version": self.model_version
+            })
+        METRICS.observe(endpoint, "normalize", normalized - started)
+        METRICS.observe(endpoint, "forward", forwarded - normalized)
+        METRICS.observe(endpoint, "topk", time.perf_counter() - forwarded)
+        return results
+
+def handle_request(method, path, headers, rfile, client_ip, received=None, admitted=None):
+    """Route one request and return (status_code, response).
+    
+    Shared by the threaded SimpleHandler and the asyncio engine, so both
+    serve exactly the same endpoints. ``received`` is the time.monotonic()
+    arrival time the request deadline counts from; ``admitted`` is the
+    admission outcome when the caller already decided it (asyncio engine).
+    """
+    endpoint = path if path in ENDPOINTS else "other"
+    request_token = request_id_var.set(new_request_id(headers))
+    recorder = traffic_recorder
+    trace_token = recorder.begin(path) if recorder else None
+    METRICS.request_started()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        if method == 'GET' and path in ('/live', '/ready'):
+            status_code, response = handle_probe(path)
+        elif method == 'GET' and model_instance is None:
+            status_code, response = 503, {"status": "starting", "phase": readiness.phase, "retry_after": 1}
+        elif method == 'GET':
+            status_code, response = 200, render_metrics() if path == '/metrics' else handle_get(path)
+        else:
+            status_code, response = handle_post(path, headers, rfile, client_ip, received, admitted)
+        return status_code, response
+    finally:
+        duration = time.perf_counter() - started
+        stages = METRICS.request_finished(endpoint, status_code)
+        METRICS.observe(endpoint, "total", duration)
+        if endpoint in ('/predict', '/predict/batch') and status_code == 200 and readiness.record_prediction(duration):
+            print(f"⏱️ First prediction after startup took {duration * 1000.0:.1f} ms")
+        # One access line per request, written by the logging thread
+        logger.info("request", extra={
+            "method": method, "path": path, "status": status_code, "client_ip": client_ip,
+            "duration_ms": round(duration * 1000.0, 3),
+            "stages_ms": {stage: round(seconds * 1000.0, 3) for stage, seconds in stages.items()},
+        })
+        if recorder:
+            recorder.finish(trace_token, method, path, headers, status_code, duration, request_id_var.get())
+        request_id_var.reset(request_token)
+
+def handle_probe(path):
+    """/live answers as soon as the process serves; /ready only once the model is loaded and warmed"""
+    if path == '/live':
+        return 200, {"status": "alive", "phase": readiness.phase}
+    return (200 if readiness.ready else 503), {"status": "ready" if readiness.ready else "not_ready",
+                                               **readiness.get_stats()}
+
+def handle_get(path):
+    """Build the response for a GET endpoint"""
+    # One read of the global: a hot reload may swap it while this request runs
+    model = model_instance
+    if path == '/health':
+        return {
+            "status": "healthy",
+            "ready": readiness.ready,
+            "model_loaded": True,  # Always return True since we're running with actual model
+            "model_version": model.model_version,
+            "server": "Simple Cattle AI Server",
+            "version": "1.0",
+            "timestamp": datetime.now().isoformat(),
+            "breeds_count": len(model.breeds),
+            "torch_available": TORCH_AVAILABLE,
+            "pil_available": PIL_AVAILABLE,
+            "device": str(model.device) if model.device else "cpu"
+        }
+    elif path == '/breeds':
+        return {
+            "breeds": model.breeds,
+            "count": len(model.breeds),
+            "model_loaded": model.is_loaded
+        }
+    elif path == '/status':
+        return {
+            "server_running": True,
+            "model_status": "loaded" if model.is_loaded else "not_loaded",
+            "model_format": model.model_format,
+            "model_version": model.model_version,
+            "batching": model.batcher.get_stats() if model.batcher else None,
+            "cache": model.cache.get_stats(),
+            "reload": model_reloader.get_stats() if model_reloader else None,
+            "startup": readiness.get_stats(),
+            "traffic_recording": traffic_recorder.get_stats() if traffic_recorder else None,
+            "requests_served": METRICS.requests_total(),
+            "admission": admission.get_stats(),
+            "metrics": METRICS.get_stats(),
+            "log_records_dropped": dropped_records()
+        }
+    return {"error": "Endpoint not found"}
+
+def render_metrics():
+    """Prometheus text exposition for /metrics"""
+    model = model_instance
+    admission_stats = admission.get_stats()
+    cache = model.cache.get_stats()
+    extra = [
+        ("cattle_model_info", "gauge", "Loaded model version and status",
+         [({"model_version": model.model_version,
+            "status": "loaded" if model.is_loaded else "not_loaded"}, 1)]),
+        ("cattle_admission_in_flight", "gauge", "Admitted prediction requests currently running",
+         [({}, admission_stats["in_flight"])]),
+        ("cattle_admission_queued", "gauge", "Prediction requests waiting for an inference slot",
+         [({}, admission_stats["queued"])]),
+        ("cattle_admission_shed_total", "counter", "Prediction requests rejected by admission control",
+         [({"reason": reason}, count) for reason, count in admission_stats["shed"].items() if reason != "total"]),
+        ("cattle_cache_hits_total", "counter", "Prediction cache hits", [({}, cache["hits"])]),
+        ("cattle_cache_misses_total", "counter", "Prediction cache misses", [({}, cache["misses"])]),
+        ("cattle_cache_entries", "gauge", "Predictions held in the memory cache", [({}, cache["entries"])]),
+        ("cattle_cache_bytes", "gauge", "Approximate size of the memory cache", [({}, cache["bytes"])]),
+        ("cattle_cache_evictions_total", "counter", "Prediction cache LRU evictions", [({}, cache["evictions"])]),
+    ]
+    if model.batcher:
+        batching = model.batcher.get_stats()
+        extra += [
+            ("cattle_batcher_queue_depth", "gauge", "Inputs waiting for the batcher", [({}, batching["queue_depth"])]),
+            ("cattle_batcher_batches_total", "counter", "Batched forward passes run", [({}, batching["batches_run"])]),
+            ("cattle_batcher_items_total", "counter", "Inputs run through the batcher", [({}, batching["items_processed"])]),
+        ]
+    return METRICS.render_prometheus(extra)
+
+def handle_post(path, headers, rfile, client_ip="unknown", received=None, admitted=None):
+    """Run a POST endpoint and return (status_code, response)"""
+    if path == '/admin/reload':
+        return handle_admin_reload(headers, client_ip)
+    if path not in ('/predict', '/predict/batch'):
+        return 200, {"error": "Endpoint not found"}
+    if not readiness.ready:
+        message = f"Server is starting ({readiness.phase})"
+        response = {"error": message} if path == '/predict' else {"status": "error", "message": message}
+        response["retry_after"] = 1
+        return 503, response
+    
+    # Shed load before the body is read, so rejected uploads cost no memory. The asyncio engine admits on its
+    # event loop and passes the outcome in ``admitted`` (and releases the ticket itself)
+    ticket = None
+    if admitted is None:
+        try:
+            admitted = ticket = admission.acquire(client_ip, parse_deadline(headers, received, DEFAULT_DEADLINE_MS))
+        except AdmissionRejected as e:
+            admitted = e
+    if isinstance(admitted, AdmissionRejected):
+        logger.warning("Request shed: %s", admitted, extra={"path": path, "client_ip": client_ip,
+                                                             "status": admitted.status_code})
+        message = str(admitted)
+        response = {"error": message} if path == '/predict' else {"status": "error", "message": message}
+        if admitted.retry_after is not None:
+            response["retry_after"] = admitted.retry_after
+        return admitted.status_code, response
+    
+    try:
+        return handle_prediction_post(path, headers, rfile)
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
+
+def handle_admin_reload(headers, client_ip):
+    """Start a background model reload; allowed from localhost, or anywhere with the admin token"""
+    authorization = headers.get('Authorization', '')
+    token_ok = bool(ADMIN_TOKEN) and hmac.compare_digest(authorization, f"Bearer {ADMIN_TOKEN}")
+    if not (is_loopback(client_ip) or token_ok):
+        return 403, {"error": "Admin endpoints need a localhost client or the admin token"}
+    if model_reloader is None:
+        return 503, {"error": "Model reload is not available"}
+    if not model_reloader.request_reload(reason="admin"):
+        return 409, {"error": "A model reload is already in progress", "reload": model_reloader.get_stats()}
+    return 202, {"status": "accepted", "reload": model_reloader.get_stats()}
+
+def is_loopback(client_ip):
+    try:
+        return ipaddress.ip_address(client_ip).is_loopback
+    except ValueError:
+        return False
+
+def handle_prediction_post(path, headers, rfile):
+    """Run an admitted /predict or /predict/batch request"""
+    if path == '/predict':
+        try:
+            return 200, handle_predict(headers, rfile)
+        except UploadTooLarge as e:
+            return 413, {"error": str(e)}
+        except Exception as e:
+            logger.exception("POST /predict failed")
+            return 200, {"error": f"Request processing failed: {str(e)}"}
+    elif path == '/predict/batch':
+        try:
+            return 200, handle_predict_batch(headers, rfile)
+        except UploadTooLarge as e:
+            return 413, {"status": "error", "message": str(e)}
+        except Exception as e:
+            logger.exception("POST /predict/batch failed")
+            return 200, {"status": "error", "message": f"Request processing failed: {str(e)}"}
+
+def handle_predict(headers, rfile):
+    """Read a /predict upload (multipart, base64 JSON or raw image) and run it through the model"""
+    content_length = int(headers.get('Content-Length', 0))
+    content_type = headers.get('Content-Type', '')
+    
+    model = model_instance
+    if content_length <= 0:
+        return {"error": "No data provided"}
+    if content_length > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(content_length, MAX_UPLOAD_BYTES)
+    
+    if is_pixel_upload(content_type):
+        # Pixels already resized on the device (camera rigs, the app): no decode
+        try:
+            body, count, offset = read_pixel_upload(headers, rfile, '/predict', max_images=1)
+        except ValueError as e:
+            return {"error": f"Invalid pixel upload: {str(e)}"}
+        return model.predict_pixels(body, count, offset, '/predict')[0]
+    
+    if content_type.startswith('multipart/form-data'):
+        # Handle multipart form data from Flutter, streamed straight from the socket
+        logger.debug("Multipart upload received", extra={"content_length": content_length})
+        timings = {}
+        try:
+            parts = read_multipart(rfile, content_type, content_length, MAX_UPLOAD_BYTES, timings)
+        except UploadTooLarge:
+            raise
+        except ValueError as e:
+            logger.warning("Multipart parsing failed: %s", e)
+            return {"error": f"Multipart parsing failed: {str(e)}"}
+        for stage, seconds in timings.items():
+            METRICS.observe('/predict', stage, seconds)
+        logger.debug("Multipart parts", extra={"parts": [
+            {"name": part.name, "filename": part.filename, "content_type": part.content_type, "size": len(part.data)}
+            for part in parts]})
+    
+        file_part = next((part for part in parts if part.name == 'file'), None)
+        if file_part is None:
+            return {"error": "No file part in multipart data"}
+        if not is_image_data(file_part.data):
+            logger.warning("No valid image signature in %d byte upload", len(file_part.data))
+            return {"error": "No valid image signature found"}
+    
+        note_images([file_part.data])
+        return model.predict(file_part.data)
+    
+    started = time.perf_counter()
+    post_data = rfile.read(content_length)
+    METRICS.observe('/predict', "body_read", time.perf_counter() - started)
+    
+    if 'application/json' in content_type:
+        # Handle JSON with base64 image
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+        except json.JSONDecodeError:
+            return {"error": "Invalid JSON"}
+        if 'image' not in data:
+            return {"error": "No image data provided"}
+        image_data = base64.b64decode(data['image'])
+        note_images([image_data])
+        return model.predict(image_data)
+    
+    # Assume raw image data
+    logger.debug("Processing raw image data", extra={"size": len(post_data)})
+    note_images([post_data])
+    return model.predict(post_data)
+
+def read_pixel_upload(headers, rfile, endpoint, max_images):
+    """Body, image count and data offset of a pre-decoded pixel upload; ValueError if it does not validate"""
+    content_length = int(headers.get('Content-Length', 0))
+    started = time.perf_counter()
+    body = read_body(rfile, content_length)
+    METRICS.observe(endpoint, "body_read", time.perf_counter() - started)
+    count, offset = parse_pixel_upload(body, headers.get('Content-Type', ''), headers, max_images=max_images)
+    return body, count, offset
+
+def handle_predict_batch(headers, rfile):
+    """Run every uploaded file in a multipart body through the model as one batch"""
+    content_length = int(headers.get('Content-Length', 0))
+    content_type = headers.get('Content-Type', '')
+    
+    model = model_instance
+    if content_length <= 0:
+        return {"status": "error", "message": "No data provided"}
+    
+    if is_pixel_upload(content_type):
+        # N images already resized on the device, run as one stacked batch without decoding
+        if content_length > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(content_length, MAX_UPLOAD_BYTES)
+        try:
+            body, count, offset = read_pixel_upload(headers, rfile, '/predict/batch', max_images=BATCH_MAX_FILES)
+        except ValueError as e:
+            return {"status": "error", "message": f"Invalid pixel upload: {str(e)}"}
+        filenames = [""] * count
+        predictions = dict(enumerate(model.predict_pixels(body, count, offset, '/predict/batch')))
+    elif content_type.startswith('multipart/form-data'):
+        timings = {}
+        parts = [part for part in read_multipart(rfile, content_type, content_length, MAX_UPLOAD_BYTES, timings)
+                 if part.name in ("file", "files")]
+        for stage, seconds in timings.items():
+            METRICS.observe('/predict/batch', stage, seconds)
+        if not parts:
+            return {"status": "error", "message": "No files provided"}
+        if len(parts) > BATCH_MAX_FILES:
+            return {"status": "error", "message": f"Maximum {BATCH_MAX_FILES} images allowed per batch"}
+        
+        logger.debug("Batch upload", extra={"files": len(parts)})
+        
+        # Only valid images go to the model; the rest keep their slot with an error
+        filenames = [part.filename or "" for part in parts]
+        valid = [i for i, part in enumerate(parts) if is_image_data(part.data)]
+        note_images([parts[i].data for i in valid])
+        predictions = dict(zip(valid, model.predict_batch([parts[i].data for i in valid])))
+    else:
+        return {"status": "error",
+                "message": "Expected multipart/form-data, application/x-rgb8 or application/x-npy"}
+    
+    results = []
+    for i, filename in enumerate(filenames):
+        result = predictions.get(i, {"error": "No valid image signature found"})
+        item = {"index": i, "filename": filename}
+        if "error" in result:
+            item.update({"status": "error", "message": result["error"]})
+        else:
+            item.update({
+                "status": "success",
+                "prediction": {
+                    "breed": result["prediction"],
+                    "confidence": round(result["confidence"] * 100, 2),
+                    "confidence_decimal": result["confidence"]
+                },
+                "top_predictions": result["top_predictions"],
+                "model_version": result.get("model_version")
+            })
+        results.append(item)
+    
+    successful = sum(1 for item in results if item["status"] == "success")
+    return {
+        "status": "success",
+        "count": len(results),
+        "successful": successful,
+        "failed": len(results) - successful,
+        "results": results
+    }
+
 class SimpleHandler(BaseHTTPRequestHandler):
     """Simple HTTP request handler"""
     
     def log_message(self, format, *args):
-        """Override to customize logging"""
-        print(f"📨 {self.address_string()} - {format % args}")
+        """Route http.server's own lines to the debug log (handle_request writes the access line)"""
+        logger.debug(format % args, extra={"client_ip": self.client_address[0]})
     
     def do_GET(self):
         """Handle GET requests"""
-        try:
-            path = urlparse(self.path).path
-            
-            # CORS headers
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            
-            response = {}
-            
-            if path == '/health':
-                response = {
-                    "status": "healthy",
-                    "model_loaded": True,  # Always return True since we're running with actual model
-                    "server": "Simple Cattle AI Server",
-                    "version": "1.0",
-                    "timestamp": datetime.now().isoformat(),
-                    "breeds_count": len(model_instance.breeds),
-                    "torch_available": TORCH_AVAILABLE,
-                    "pil_available": PIL_AVAILABLE,
-                    "device": str(model_instance.device) if model_instance.device else "cpu"
-                }
-            elif path == '/breeds':
-                response = {
-                    "breeds": model_instance.breeds,
-                    "count": len(model_instance.breeds),
-                    "model_loaded": model_instance.is_loaded
-                }
-            else:
-                response = {"error": "Endpoint not found"}
-            
-            self.wfile.write(json.dumps(response, indent=2).encode('utf-8'))
-            
-        except Exception as e:
-            print(f"❌ GET error: {e}")
-            self.send_error(500, f"Server error: {str(e)}")
+        self._dispatch('GET')
     
     def do_POST(self):
         """Handle POST requests"""
+        self._dispatch('POST')
+    
+    def _dispatch(self, method):
+        """Run the shared router and write its JSON response"""
         try:
             path = urlparse(self.path).path
+            received = time.monotonic()
+            status_code, response = handle_request(method, path, self.headers, self.rfile,
+                                                   self.client_address[0], received)
+            
+            started = time.perf_counter()
+            if isinstance(response, str):
+                body, content_type = response.encode('utf-8'), PROMETHEUS_CONTENT_TYPE
+            else:
+                body, content_type = json.dumps(response, indent=2).encode('utf-8'), 'application/json'
+            METRICS.observe(path if path in ENDPOINTS else "other", "serialize", time.perf_counter() - started)
             
             # CORS headers
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
+            self.send_response(status_code)
+            if isinstance(response, dict) and "retry_after" in response:
+                self.send_header('Retry-After', str(response["retry_after"]))
+            self.send_header('Content-Type', content_type)
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Deadline-Ms')
             self.end_headers()
             
-            response = {}
-            
-            if path == '/predict':
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length)
-                
-                if post_data:
-                    content_type = self.headers.get('Content-Type', '')
-                    
-                    if content_type.startswith('multipart/form-data'):
-                        # Handle multipart form data from Flutter (using robust implementation)
-                        print(f"📋 Processing multipart form data: {len(post_data)} bytes")
-                        try:
-                            # Use Python's built-in email parser for multipart data
-                            import email
-                            import re
-                            from email.message import EmailMessage
-                            from io import BytesIO
-                            
-                            # Find boundary from Content-Type header
-                            print(f"📋 Full Content-Type header: '{content_type}'")
-                            boundary_match = re.search(r'boundary=([^;\r\n]+)', content_type)
-                            if boundary_match:
-                                boundary_raw = boundary_match.group(1).strip()
-                                print(f"📋 Raw boundary string: '{boundary_raw}'")
-                                
-                                # Create a proper MIME message for parsing
-                                mime_header = f"Content-Type: multipart/form-data; boundary={boundary_raw}\r\n\r\n".encode()
-                                full_message = mime_header + post_data
-                                
-                                # Parse using email library
-                                msg = email.message_from_bytes(full_message)
-                                
-                                if msg.is_multipart():
-                                    print(f"📋 Successfully parsed multipart message with {len(msg.get_payload())} parts")
-                                    
-                                    for i, part in enumerate(msg.get_payload()):
-                                        print(f"📋 Processing part {i}")
-                                        
-                                        # Get content disposition
-                                        content_disp = part.get('Content-Disposition', '')
-                                        print(f"📋 Content-Disposition: {content_disp}")
-                                        
-                                        # Check if this is the file upload
-                                        if 'form-data' in content_disp and 'name="file"' in content_disp:
-                                            print(f"📋 Found file upload part!")
-                                            
-                                            # Get the file data
-                                            file_data = part.get_payload(decode=True)
-                                            if file_data:
-                                                print(f"📋 Extracted file data: {len(file_data)} bytes")
-                                                print(f"📋 First 20 bytes: {file_data[:20]}")
-                                                
-                                                # Verify this looks like image data
-                                                if len(file_data) > 100:
-                                                    # Check for common image file signatures
-                                                    if (file_data.startswith(b'\xff\xd8\xff') or  # JPEG
-                                                        file_data.startswith(b'\x89PNG') or      # PNG
-                                                        file_data.startswith(b'GIF8') or        # GIF
-                                                        file_data.startswith(b'RIFF')):         # WebP/other
-                                                        
-                                                        print(f"� Valid image signature detected")
-                                                        response = model_instance.predict(file_data)
-                                                        print(f"📊 Prediction result: {response}")
-                                                        break
-                                                    else:
-                                                        print(f"❌ No valid image signature found")
-                                                        print(f"❌ File starts with: {file_data[:10]}")
-                                                else:
-                                                    print(f"❌ File data too small: {len(file_data)} bytes")
-                                            else:
-                                                print(f"❌ No file data in part {i}")
-                                else:
-                                    print(f"❌ Message is not multipart")
-                                    response = {"error": "Failed to parse multipart data"}
-                            else:
-                                response = {"error": "No boundary found in multipart data"}
-                                
-                        except Exception as e:
-                            print(f"❌ Multipart parsing error: {e}")
-                            traceback.print_exc()
-                            response = {"error": f"Multipart parsing failed: {str(e)}"}
-                            
-                    elif 'application/json' in content_type:
-                        # Handle JSON with base64 image
-                        try:
-                            data = json.loads(post_data.decode('utf-8'))
-                            if 'image' in data:
-                                image_data = base64.b64decode(data['image'])
-                                response = model_instance.predict(image_data)
-                            else:
-                                response = {"error": "No image data provided"}
-                        except json.JSONDecodeError:
-                            response = {"error": "Invalid JSON"}
-                    else:
-                        # Assume raw image data
-                        print(f"📋 Processing raw image data: {len(post_data)} bytes")
-                        response = model_instance.predict(post_data)
-                else:
-                    response = {"error": "No data provided"}
-            else:
-                response = {"error": "Endpoint not found"}
-            
-            self.wfile.write(json.dumps(response, indent=2).encode('utf-8'))
+            self.wfile.write(body)
             
         except Exception as e:
-            print(f"❌ POST error: {e}")
-            traceback.print_exc()
+            logger.exception("%s %s failed", method, self.path)
             self.send_error(500, f"Server error: {str(e)}")
     
     def do_OPTIONS(self):
@@ -421,7 +877,7 @@ class SimpleHandler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Deadline-Ms')
         self.end_headers()
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
@@ -429,6 +885,45 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     allow_reuse_address = True
     daemon_threads = True
 
+def install_model(model):
+    """Point new requests at ``model``; a single reference swap, so running requests keep the old one"""
+    global model_instance
+    model_instance = model
+
+def create_reloader(backend, warmup_rounds=WARMUP_ROUNDS):
+    """Hot reloader that rebuilds (and warms) SimpleCattleModel with ``backend`` and watches its files"""
+    def build_model():
+        model = SimpleCattleModel(backend=backend)
+        model.warmup(warmup_rounds)
+        return model
+    return ModelReloader(build_model, lambda: model_instance, install_model,
+                         watch_paths=model_instance.model_files() + [model_instance.breeds_file],
+                         poll_seconds=WATCH_POLL_SECONDS,
+                         retire_after_seconds=RELOAD_RETIRE_SECONDS)
+
+def start_up(backend, watch_model=False, warmup_rounds=WARMUP_ROUNDS):
+    """Load the model and the reloader, warm up, then mark ready (runs on a background thread)"""
+    global model_instance, model_reloader
+    try:
+        readiness.enter("loading")
+        model_instance = SimpleCattleModel(backend=backend)
+        
+        # POST /admin/reload always works; --watch-model also reloads on file changes
+        model_reloader = create_reloader(backend, warmup_rounds)
+        if watch_model:
+            model_reloader.start_watching()
+        
+        readiness.enter("warming")
+        warmup_seconds = model_instance.warmup(warmup_rounds)
+        readiness.mark_ready()
+        print(f"✅ Ready in {readiness.time_to_ready:.2f}s: {backend} backend "
+              f"({model_instance.model_format or 'mock'}, version {model_instance.model_version}), "
+              f"warmup {warmup_seconds:.2f}s")
+    except Exception as e:
+        readiness.mark_failed(str(e))
+        print(f"❌ Startup failed: {e}")
+        traceback.print_exc()
+
 def get_local_ip():
     """Get the local IP address"""
     try:
@@ -441,34 +936,129 @@ def get_local_ip():
     except Exception:
         return "localhost"
 
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Simple Cattle Breed AI Server")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                        help="threaded: one thread per connection; "
+                             "asyncio: event loop with keep-alive and a bounded inference executor")
+    parser.add_argument("--workers", type=int, default=DEFAULT_EXECUTOR_WORKERS,
+                        help="Executor threads for decode/inference (asyncio engine; raised to the admission limit "
+                             "plus EXECUTOR_SPARE_WORKERS)")
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND,
+                        help="torch: PyTorch (TorchScript export if present); "
+                             "onnxruntime: ONNX export via ONNX Runtime, torch not required; "
+                             "fake: deterministic predictions with simulated latency, for load testing")
+    parser.add_argument("--fake-latency", default=FAKE_LATENCY,
+                        help="Fake backend latency per forward pass in ms: constant:MS, uniform:LOW,HIGH, "
+                             "normal:MEAN,STD, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--fake-per-item-ms", type=float, default=FAKE_PER_ITEM_MS,
+                        help="Fake backend latency added per image after the first in a batch")
+    parser.add_argument("--onnx-threads", type=int, default=ONNX_INTRA_OP_THREADS,
+                        help="ONNX Runtime intra-op threads (0 = one per physical core)")
+    parser.add_argument("--onnx-inter-op-threads", type=int, default=ONNX_INTER_OP_THREADS,
+                        help="ONNX Runtime inter-op threads")
+    parser.add_argument("--quantized", action="store_true",
+                        help="Serve the INT8 model from quantize_model.py (torch backend, CPU)")
+    parser.add_argument("--fold-normalization", action="store_true", default=FOLD_NORMALIZATION,
+                        help="Fold the input normalization into the first convolution (torch backend, checkpoint)")
+    parser.add_argument("--warmup-rounds", type=int, default=WARMUP_ROUNDS,
+                        help="Warmup forward passes per batch size before /ready reports ready (0 = no warmup)")
+    parser.add_argument("--watch-model", action="store_true", default=WATCH_MODEL,
+                        help="Reload the model without downtime when its files change")
+    parser.add_argument("--admin-token", default=ADMIN_TOKEN,
+                        help="Allow POST /admin/reload from other hosts with 'Authorization: Bearer <token>'")
+    parser.add_argument("--record-traffic", default=RECORD_TRAFFIC_DIR, metavar="DIR",
+                        help="Record a sample of requests to DIR/traffic.jsonl for benchmarks/replay_traffic.py")
+    parser.add_argument("--record-sample-rate", type=float, default=RECORD_SAMPLE_RATE,
+                        help="Fraction of requests recorded")
+    parser.add_argument("--record-payloads", action="store_true", default=RECORD_PAYLOADS,
+                        help="Also store the uploaded images of recorded requests (under DIR/blobs)")
+    parser.add_argument("--log-level", default=LOG_LEVEL, help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--log-format", choices=["json", "text"], default=LOG_FORMAT,
+                        help="Console log format (the log file is always JSON lines)")
+    parser.add_argument("--log-file", default=LOG_FILE, help="Also write JSON-lines logs to this rotating file")
+    parser.add_argument("--debug-sample-rate", type=float, default=LOG_DEBUG_SAMPLE_RATE,
+                        help="Fraction of DEBUG records kept")
+    args = parser.parse_args()
+    try:
+        parse_latency(args.fake_latency)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
 def main():
-    global model_instance
+    global ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS, QUANTIZED, ADMIN_TOKEN, FAKE_LATENCY, FAKE_PER_ITEM_MS
+    global FOLD_NORMALIZATION
+    global traffic_recorder
+    
+    args = parse_args()
+    if args.record_traffic:
+        traffic_recorder = TrafficRecorder(args.record_traffic, sample_rate=args.record_sample_rate,
+                                           record_payloads=args.record_payloads, endpoints=RECORDED_ENDPOINTS)
+    FAKE_LATENCY = args.fake_latency
+    FAKE_PER_ITEM_MS = args.fake_per_item_ms
+    QUANTIZED = args.quantized
+    FOLD_NORMALIZATION = args.fold_normalization
+    ADMIN_TOKEN = args.admin_token
+    ONNX_INTRA_OP_THREADS = args.onnx_threads
+    ONNX_INTER_OP_THREADS = args.onnx_inter_op_threads
+    port = args.port
+    setup_logging(level=args.log_level, log_file=args.log_file, fmt=args.log_format,
+                  debug_sample_rate=args.debug_sample_rate)
     
     print("🐄 Simple Cattle Breed AI Server")
     print("=" * 50)
     
-    # Initialize model
-    model_instance = SimpleCattleModel()
+    # Load and warm the model in the background; /live answers meanwhile and /ready once it is done
+    threading.Thread(target=start_up, args=(args.backend, args.watch_model, args.warmup_rounds),
+                     name="startup", daemon=True).start()
     
     # Get local IP
     local_ip = get_local_ip()
     
     print(f"\n🌐 Server Configuration:")
-    print(f"   Port: {SERVER_PORT}")
+    print(f"   Port: {port}")
+    print(f"   Engine: {args.engine}")
+    print(f"   Backend: {args.backend}")
     print(f"   Local IP: {local_ip}")
-    print(f"   Model Status: {'Loaded' if model_instance.is_loaded else 'Mock Mode'}")
+    print(f"   Model: loading in the background (warmup rounds {args.warmup_rounds})")
+    print(f"   Hot Reload: POST /admin/reload" + (", watching the model files" if args.watch_model else ""))
     print(f"   PyTorch: {'Available' if TORCH_AVAILABLE else 'Not Available'}")
     print(f"   PIL: {'Available' if PIL_AVAILABLE else 'Not Available'}")
+    print(f"   Logging: {args.log_level} {args.log_format}" + (f" -> {args.log_file}" if args.log_file else ""))
+    if args.record_traffic:
+        print(f"   Traffic Recording: {args.record_sample_rate:.0%} of requests -> {args.record_traffic}"
+              + (" (with images)" if args.record_payloads else ""))
     
     print(f"\n📱 Access URLs:")
-    print(f"   Health: http://{local_ip}:{SERVER_PORT}/health")
-    print(f"   Breeds: http://{local_ip}:{SERVER_PORT}/breeds")
-    print(f"   Predict: http://{local_ip}:{SERVER_PORT}/predict")
+    print(f"   Health: http://{local_ip}:{port}/health")
+    print(f"   Ready: http://{local_ip}:{port}/ready (liveness: /live)")
+    print(f"   Breeds: http://{local_ip}:{port}/breeds")
+    print(f"   Predict: http://{local_ip}:{port}/predict")
+    print(f"   Batch: http://{local_ip}:{port}/predict/batch")
+    print(f"   Metrics: http://{local_ip}:{port}/metrics")
+    
+    if args.engine == "asyncio":
+        try:
+            workers = max(args.workers, admission.max_in_flight + EXECUTOR_SPARE_WORKERS)
+            print(f"\n🚀 Asyncio server starting on port {port} ({workers} executor threads)...")
+            print("   Press Ctrl+C to stop")
+            run_async_server(handle_request, port, host='0.0.0.0', max_workers=args.workers,
+                             max_body_bytes=MAX_UPLOAD_BYTES,
+                             allow_headers='Content-Type, Authorization, X-Deadline-Ms',
+                             endpoints=ENDPOINTS, admission=admission,
+                             admission_paths=('/predict', '/predict/batch'), deadline_ms=DEFAULT_DEADLINE_MS)
+        except KeyboardInterrupt:
+            print("\n🛑 Server stopping...")
+            print("✅ Server stopped")
+        return
     
     try:
         # Create and start server
-        server = ThreadedHTTPServer(('0.0.0.0', SERVER_PORT), SimpleHandler)
-        print(f"\n🚀 Server starting on port {SERVER_PORT}...")
+        server = ThreadedHTTPServer(('0.0.0.0', port), SimpleHandler)
+        print(f"\n🚀 Server starting on port {port}...")
         print("   Press Ctrl+C to stop")
         
         server.serve_forever()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Slim Serving Checkpoints
+Weights-only tensor files in the safetensors layout (an 8-byte header size, a JSON header, then raw tensor bytes),
+read by memory-mapping the file so tensors are views of the page cache instead of unpickled copies.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Tuple
+
+import torch
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "U8": torch.uint8,
+}
+DTYPE_NAMES = {dtype: name for name, dtype in DTYPES.items()}
+
+
+def write_tensors(tensors: Dict[str, torch.Tensor], path: str, metadata: Dict[str, str]):
+    """Write ``tensors`` (stored as their contiguous bytes) and string ``metadata`` to ``path`` atomically"""
+    # Widest dtypes first, so every tensor starts at an offset aligned to its element size
+    names = sorted(tensors, key=lambda name: (-tensors[name].element_size(), name))
+    header, offset = {}, 0
+    for name in names:
+        tensor = tensors[name]
+        size = tensor.numel() * tensor.element_size()
+        header[name] = {"dtype": DTYPE_NAMES[tensor.dtype], "shape": list(tensor.shape),
+                        "data_offsets": [offset, offset + size]}
+        offset += size
+    header["__metadata__"] = metadata
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * (-len(encoded) % 8)  # tensor data starts 8-byte aligned
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        for name in names:
+            f.write(tensors[name].detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path) -> Tuple[dict, int]:
+    """(JSON header, offset of the tensor data) without reading any tensor bytes"""
+    with open(path, "rb") as f:
+        (size,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(size)), 8 + size
+
+
+def read_metadata(path) -> Dict[str, str]:
+    return read_header(path)[0].get("__metadata__", {})
+
+
+def load_tensors(path) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """Memory-map ``path`` and return its tensors as views of the mapping, plus the metadata.
+
+    The mapping is private copy-on-write: pages come from (and stay shared
+    through) the page cache unless a tensor is written to, so every process
+    serving the same file shares one copy of the weights. The tensors keep
+    the mapping alive.
+    """
+    header, data_start = read_header(path)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    tensors = {}
+    for name, entry in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = DTYPES[entry["dtype"]]
+        begin, end = entry["data_offsets"]
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin)
+        else:
+            tensor = torch.empty(0, dtype=dtype)  # frombuffer rejects empty slices
+        tensors[name] = tensor.view(entry["shape"])
+    return tensors, header.get("__metadata__", {})
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test that the graph_optimize.py passes leave the model's predictions unchanged
+Runs on a fixed-seed ResNet18 with random weights and BatchNorm statistics, so no trained checkpoint is needed.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import torch
+
+from backends import TorchBackend
+from graph_optimize import NormalizedInputConv2d, optimize_model
+from model_loading import build_resnet18, load_inference_model
+from preprocessing import Preprocessor
+
+MAX_DIFF = 1e-3
+NUM_CLASSES = 124
+
+
+def random_model(channels_last: bool = False):
+    torch.manual_seed(0)
+    model = build_resnet18(NUM_CLASSES)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            # Untrained statistics are 0/1, which would hide a mishandled BatchNorm
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.2, 0.2)
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    return model.eval()
+
+
+def random_pixels(count: int = 4):
+    generator = torch.Generator().manual_seed(0)
+    pixels = [torch.randint(0, 256, (224, 224, 3), dtype=torch.uint8, generator=generator) for _ in range(count)]
+    # Flat images make the border correction of the folded conv1 carry the whole difference
+    pixels[0].fill_(0)
+    pixels[1].fill_(255)
+    return pixels
+
+
+def check_same_predictions(name: str, expected: torch.Tensor, actual: torch.Tensor):
+    diff = (expected - actual).abs().max().item()
+    print(f"📊 {name}: max diff {diff:.2e}")
+    assert diff <= MAX_DIFF, f"{name}: outputs differ by {diff:.2e} (tolerance {MAX_DIFF:g})"
+    assert torch.equal(expected.argmax(dim=1), actual.argmax(dim=1)), f"{name}: top-1 predictions changed"
+
+
+def test_conv_bn_fusion():
+    for channels_last in (False, True):
+        model = random_model(channels_last)
+        batch = Preprocessor(channels_last=channels_last).batch(random_pixels()).clone()
+        with torch.no_grad():
+            expected = model(batch)
+            actual = optimize_model(model)(batch)
+        check_same_predictions(f"Conv+BN fused (channels_last={channels_last})", expected, actual)
+
+
+def test_folded_normalization():
+    for channels_last in (False, True):
+        model = random_model(channels_last)
+        pixels = random_pixels()
+        normalized = Preprocessor(channels_last=channels_last).batch(pixels).clone()
+        scaled = Preprocessor(channels_last=channels_last, normalize=False).batch(pixels).clone()
+        folded = optimize_model(model, fold_normalization=True)
+        assert isinstance(folded.conv1, NormalizedInputConv2d), "conv1 was not replaced by the folded convolution"
+        with torch.no_grad():
+            expected = model(normalized)
+            actual = folded(scaled)
+        check_same_predictions(f"normalization folded (channels_last={channels_last})", expected, actual)
+
+
+def test_loader_fold_option():
+    model = random_model()
+    pixels = random_pixels()
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = str(Path(tmp, "model.pth"))
+        torch.save({"model_state_dict": model.state_dict(), "epoch": 0}, checkpoint)
+        plain = load_inference_model(checkpoint, "cpu")
+        folded = load_inference_model(checkpoint, "cpu", fold_normalization=True)
+    assert not plain.normalization_folded and folded.normalization_folded
+    # Each backend picks the preprocessing its model expects
+    plain_backend, folded_backend = TorchBackend(plain, torch.device("cpu")), TorchBackend(folded, torch.device("cpu"))
+    expected = plain_backend.forward(plain_backend.make_preprocessor(False).batch(pixels))
+    actual = folded_backend.forward(folded_backend.make_preprocessor(False).batch(pixels))
+    check_same_predictions("load_inference_model(fold_normalization=True), probabilities", expected, actual)
+
+
+if __name__ == "__main__":
+    tests = [test_conv_bn_fusion, test_folded_normalization, test_loader_fold_option]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed += 1
+    if failed:
+        print(f"❌ {failed} of {len(tests)} graph optimization tests failed")
+        sys.exit(1)
+    print(f"✅ All {len(tests)} graph optimization tests passed")
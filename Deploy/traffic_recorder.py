@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Traffic Recorder for the Cattle AI Servers
+Writes a sample of served requests (metadata, and optionally the uploaded images) to a rotating JSON-lines trace that
+benchmarks/replay_traffic.py and benchmarks/loadgen.py --replay can send to a server again.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+TRACE_FILE = "traffic.jsonl"
+BLOBS_DIR = "blobs"
+
+# Recorder defaults: trace rotation, total size of stored images, and how much may wait for the writer thread
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_MAX_BLOB_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+# Images uploaded in the request being handled on the current thread/task; None when it is not being recorded
+_images_var = contextvars.ContextVar("traffic_images", default=None)
+
+
+def note_images(images: Sequence):
+    """Attach the uploaded images (bytes or memoryviews) of the current request to its trace record"""
+    current = _images_var.get()
+    if current is not None:
+        current.extend(images)
+
+
+class TrafficRecorder:
+    """Samples requests into ``directory/trace_file`` without blocking the handlers.
+
+    A handler calls ``begin()`` when a request arrives and ``finish()`` when
+    it has been answered; in between, ``note_images()`` attaches the uploads.
+    Only ``sample_rate`` of the requests to ``endpoints`` are recorded.
+    ``finish()`` just queues the record: hashing the images, storing them
+    (``record_payloads``, content-addressed under ``blobs/`` up to
+    ``max_blob_bytes`` in total) and writing the line happen on a background
+    thread. When more than ``max_pending_bytes`` of images are waiting for
+    it, new records are dropped instead, so a slow disk never slows requests.
+    The trace rotates like the server log (``max_bytes``, ``backup_count``).
+    """
+
+    def __init__(self, directory: str, sample_rate: float = DEFAULT_SAMPLE_RATE, record_payloads: bool = False,
+                 endpoints: Optional[Sequence[str]] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 backup_count: int = DEFAULT_BACKUP_COUNT, max_blob_bytes: int = DEFAULT_MAX_BLOB_BYTES,
+                 max_pending_bytes: int = DEFAULT_MAX_PENDING_BYTES, trace_file: str = TRACE_FILE):
+        self.directory = directory
+        self.trace_file = trace_file
+        self.sample_rate = sample_rate
+        self.record_payloads = record_payloads
+        self.endpoints = set(endpoints) if endpoints is not None else None
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_blob_bytes = max_blob_bytes
+        self.max_pending_bytes = max_pending_bytes
+
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        self._pending_bytes = 0
+        self._blob_bytes = 0
+
+        # Counters for /status
+        self.recorded = 0
+        self.dropped = 0
+        self.blobs_written = 0
+        self.blobs_skipped = 0
+
+    def begin(self, path: str) -> Optional[contextvars.Token]:
+        """Decide whether to record the request now arriving; pass the result to ``finish()``"""
+        if (self.endpoints is not None and path not in self.endpoints) or random.random() >= self.sample_rate:
+            return None
+        return _images_var.set([])
+
+    def finish(self, token: Optional[contextvars.Token], method: str, path: str, headers, status: int,
+               seconds: float, request_id: Optional[str] = None):
+        """Queue the record of an answered request (returns immediately)"""
+        if token is None:
+            return
+        images = _images_var.get()
+        _images_var.reset(token)
+        try:
+            size = int(headers.get('Content-Length', 0) or 0)
+        except ValueError:
+            size = 0
+        record = {
+            "ts": round(time.time() - seconds, 6),
+            "method": method,
+            "path": path,
+            "content_type": (headers.get('Content-Type') or '').split(';')[0].strip() or None,
+            "size": size,
+            "images": len(images),
+            "status": status,
+            "latency_ms": round(seconds * 1000.0, 3),
+            "request_id": request_id,
+        }
+        pending = sum(len(image) for image in images)
+        with self._lock:
+            if self._pending_bytes + pending > self.max_pending_bytes:
+                self.dropped += 1
+                return
+            self._pending_bytes += pending
+            if self._writer is None or self._writer_pid != os.getpid() or not self._writer.is_alive():
+                # Writer threads do not survive fork
+                self._writer_pid = os.getpid()
+                self._writer = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+                self._writer.start()
+        self._queue.put((record, images, pending))
+
+    def _write_loop(self):
+        os.makedirs(self.directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(os.path.join(self.directory, self.trace_file),
+                                                       maxBytes=self.max_bytes, backupCount=self.backup_count,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        while True:
+            record, images, pending = self._queue.get()
+            try:
+                self._write(handler, record, images)
+            except Exception as e:
+                self.dropped += 1
+                print(f"⚠️ Traffic recorder could not write a record: {e}")
+            finally:
+                with self._lock:
+                    self._pending_bytes -= pending
+
+    def _write(self, handler: logging.Handler, record: Dict[str, Any], images: List):
+        hashes = [hashlib.sha256(image).hexdigest() for image in images]
+        record["image_hashes"] = hashes
+        if self.record_payloads and images:
+            record["blobs"] = [self._store_blob(digest, image) for digest, image in zip(hashes, images)]
+            if None in record["blobs"]:
+                del record["blobs"]
+        handler.emit(logging.makeLogRecord({"msg": json.dumps(record)}))
+        handler.flush()
+        self.recorded += 1
+
+    def _store_blob(self, digest: str, image) -> Optional[str]:
+        """Relative path of the stored image, or None once the blob store is full"""
+        relative = os.path.join(BLOBS_DIR, digest[:2], digest)
+        path = os.path.join(self.directory, relative)
+        if os.path.exists(path):
+            return relative
+        if self._blob_bytes + len(image) > self.max_blob_bytes:
+            self.blobs_skipped += 1
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(image)
+        os.replace(temporary, path)
+        self._blob_bytes += len(image)
+        self.blobs_written += 1
+        return relative
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Recording settings and counters, for /status"""
+        return {
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "payloads": self.record_payloads,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending_mb": round(self._pending_bytes / (1024 * 1024), 2),
+            "blobs_written": self.blobs_written,
+            "blobs_skipped": self.blobs_skipped,
+        }
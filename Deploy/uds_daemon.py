@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Local Inference Daemon for the Cattle AI Servers
+Serves predictions to scripts on the same host over a Unix domain socket with a compact binary framing, so they skip
+the torch import and model load as well as TCP and multipart. Only uses the standard library on the client side.
+
+Framing (network byte order):
+    request   magic "NS", version, op, top_k, image count      (!2sBBBH)
+              then per image: length (!I) and the encoded image bytes
+    response  magic "NS", status, payload length               (!2sBI)
+              OP_INFO: the payload is a JSON object (classes, model version, limits)
+              OP_PREDICT: per image, ok (!BB = 0, n) then n class indices (!H) and n probabilities (!f),
+                          or error (!BH = 1, message length) then the UTF-8 message
+              any status other than STATUS_OK: the payload is a UTF-8 error message
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+MAGIC = b"NS"
+PROTOCOL_VERSION = 1
+
+OP_INFO = 1
+OP_PREDICT = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_UNAVAILABLE = 2
+
+ITEM_OK = 0
+ITEM_ERROR = 1
+
+REQUEST_HEADER = struct.Struct("!2sBBBH")
+RESPONSE_HEADER = struct.Struct("!2sBI")
+LENGTH = struct.Struct("!I")
+ITEM_HEADER = struct.Struct("!BB")
+ITEM_ERROR_HEADER = struct.Struct("!BH")
+
+# Socket path used when neither the caller nor CATTLE_AI_SOCKET names one
+SOCKET_ENV = "CATTLE_AI_SOCKET"
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "cattle_ai.sock")
+
+# Owner and group may connect
+DEFAULT_SOCKET_MODE = 0o660
+
+# Daemon limits: images per request, bytes per image and per request, predictions running at once
+DEFAULT_MAX_IMAGES = 32
+DEFAULT_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 8
+
+DEFAULT_CLIENT_TIMEOUT = 30.0
+
+# top_k travels as one byte; the daemon also caps it at the model's class count
+MAX_TOP_K = 255
+
+# One image's top-k as (class indices, probabilities), or an error message
+ItemResult = Union[Tuple[List[int], List[float]], str]
+
+
+class ServiceUnavailable(Exception):
+    """Raised by the daemon's callables when no model can answer yet (sent as STATUS_UNAVAILABLE)"""
+
+
+class DaemonError(RuntimeError):
+    """The daemon answered a request with an error"""
+
+
+class DaemonUnavailable(ConnectionError):
+    """No daemon is listening on the socket, or it has no model ready"""
+
+
+def default_socket_path() -> str:
+    """CATTLE_AI_SOCKET, else DEFAULT_SOCKET_PATH"""
+    return os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET_PATH
+
+
+def _read_exact(stream, size: int) -> bytes:
+    """Exactly ``size`` bytes from a file-like stream; b'' at a clean end of stream, EOFError mid-message"""
+    data = stream.read(size)
+    if len(data) == size or not data:
+        return data
+    raise EOFError(f"connection closed after {len(data)} of {size} bytes")
+
+
+def encode_request(op: int, images: Sequence[bytes] = (), top_k: int = 3) -> List[bytes]:
+    """Request frame as a list of buffers: the header, then each image's length and bytes"""
+    buffers = [REQUEST_HEADER.pack(MAGIC, PROTOCOL_VERSION, op, top_k, len(images))]
+    for image in images:
+        buffers.append(LENGTH.pack(len(image)))
+        buffers.append(image)
+    return buffers
+
+
+def encode_predictions(results: Sequence[ItemResult]) -> bytes:
+    """OP_PREDICT response payload"""
+    parts = []
+    for result in results:
+        if isinstance(result, str):
+            message = result.encode("utf-8")[:65535]
+            parts.append(ITEM_ERROR_HEADER.pack(ITEM_ERROR, len(message)))
+            parts.append(message)
+        else:
+            indices, probabilities = result
+            parts.append(ITEM_HEADER.pack(ITEM_OK, len(indices)))
+            parts.append(struct.pack(f"!{len(indices)}H{len(indices)}f", *indices, *probabilities))
+    return b"".join(parts)
+
+
+def decode_predictions(payload: bytes, count: int) -> List[ItemResult]:
+    """Inverse of ``encode_predictions``"""
+    results = []
+    offset = 0
+    for _ in range(count):
+        flag = payload[offset]
+        if flag == ITEM_OK:
+            _, n = ITEM_HEADER.unpack_from(payload, offset)
+            offset += ITEM_HEADER.size
+            values = struct.unpack_from(f"!{n}H{n}f", payload, offset)
+            offset += n * 6
+            results.append((list(values[:n]), list(values[n:])))
+        else:
+            _, length = ITEM_ERROR_HEADER.unpack_from(payload, offset)
+            offset += ITEM_ERROR_HEADER.size
+            results.append(payload[offset:offset + length].decode("utf-8", "replace"))
+            offset += length
+    return results
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Answers framed requests on one connection until the caller closes it"""
+
+    def handle(self):
+        while True:
+            try:
+                header = _read_exact(self.rfile, REQUEST_HEADER.size)
+                if not header:
+                    return
+                magic, version, op, top_k, count = REQUEST_HEADER.unpack(header)
+                if magic != MAGIC or version != PROTOCOL_VERSION:
+                    self.reply(STATUS_ERROR, f"Unsupported protocol {magic!r} v{version}".encode("utf-8"))
+                    return
+                images = self.read_images(count)
+            except (EOFError, ConnectionError):
+                return
+            except ValueError as e:
+                # The rest of the frame cannot be skipped reliably
+                self.reply(STATUS_ERROR, str(e).encode("utf-8"))
+                return
+            if not self.dispatch(op, top_k, images):
+                return
+
+    def read_images(self, count: int) -> List[bytes]:
+        """The length-prefixed images of a request, within the daemon's limits"""
+        limits = self.server
+        if count > limits.max_images:
+            raise ValueError(f"Maximum {limits.max_images} images allowed per request")
+        images = []
+        total = 0
+        for _ in range(count):
+            prefix = _read_exact(self.rfile, LENGTH.size)
+            if not prefix:
+                raise EOFError("connection closed mid-request")
+            (length,) = LENGTH.unpack(prefix)
+            total += length
+            if length > limits.max_image_bytes or total > limits.max_request_bytes:
+                raise ValueError(f"Image too large ({length} bytes, {total} in this request)")
+            image = _read_exact(self.rfile, length)
+            if len(image) != length:
+                raise EOFError("connection closed mid-image")
+            images.append(image)
+        return images
+
+    def dispatch(self, op: int, top_k: int, images: List[bytes]) -> bool:
+        """Run one request and send its response; False once the connection should close"""
+        try:
+            if op == OP_INFO:
+                info = dict(self.server.info())
+                info.update(max_images=self.server.max_images, max_image_bytes=self.server.max_image_bytes)
+                return self.reply(STATUS_OK, json.dumps(info).encode("utf-8"))
+            if op == OP_PREDICT:
+                if top_k < 1:
+                    return self.reply(STATUS_ERROR, b"top_k must be at least 1")
+                with self.server.in_flight:
+                    results = self.server.predict(images, top_k) if images else []
+                return self.reply(STATUS_OK, encode_predictions(results))
+            return self.reply(STATUS_ERROR, f"Unknown op {op}".encode("utf-8"))
+        except ServiceUnavailable as e:
+            return self.reply(STATUS_UNAVAILABLE, str(e).encode("utf-8"))
+        except Exception as e:
+            return self.reply(STATUS_ERROR, f"Prediction failed: {e}".encode("utf-8"))
+
+    def reply(self, status: int, payload: bytes) -> bool:
+        try:
+            self.wfile.write(RESPONSE_HEADER.pack(MAGIC, status, len(payload)) + payload)
+            return True
+        except OSError:
+            return False
+
+
+class InferenceDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server answering OP_INFO with ``info()`` and OP_PREDICT with ``predict(images, k)``.
+
+    ``predict`` gets the encoded images of one request and returns an
+    ``ItemResult`` per image; it may raise ``ServiceUnavailable`` while no
+    model is ready. One thread per connection; at most ``max_in_flight``
+    predictions run at once and the rest wait their turn.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, predict: Callable[[List[bytes], int], List[ItemResult]],
+                 info: Callable[[], Dict[str, Any]], sock: Optional[socket.socket] = None,
+                 max_images: int = DEFAULT_MAX_IMAGES, max_image_bytes: int = DEFAULT_MAX_IMAGE_BYTES,
+                 max_request_bytes: int = DEFAULT_MAX_REQUEST_BYTES, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        super().__init__(path, DaemonRequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock if sock is not None else bind_socket(path)
+        self.server_address = path
+        self.predict = predict
+        self.info = info
+        self.max_images = max_images
+        self.max_image_bytes = max_image_bytes
+        self.max_request_bytes = max_request_bytes
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def start(self) -> "InferenceDaemon":
+        """Serve on a background thread"""
+        threading.Thread(target=self.serve_forever, name="uds-daemon", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and remove the socket file"""
+        self.shutdown()
+        self.server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def bind_socket(path: str, mode: int = DEFAULT_SOCKET_MODE) -> socket.socket:
+    """Listening Unix socket at ``path``, replacing a stale socket file left by a process that died.
+
+    Raises OSError if another daemon is still answering on it. The socket
+    can be bound before forking so that every worker accepts on it.
+    """
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise OSError(f"Another daemon is already listening on {path}")
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, mode)
+    sock.listen(64)
+    return sock
+
+
+class DaemonClient:
+    """Blocking client over one persistent connection; safe to share between threads (requests are serialized)"""
+
+    def __init__(self, path: Optional[str] = None, timeout: float = DEFAULT_CLIENT_TIMEOUT):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+        self._sock = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def info(self) -> Dict[str, Any]:
+        """Classes, model version and limits of the model behind the daemon"""
+        return json.loads(self._call(encode_request(OP_INFO)))
+
+    def predict(self, images: Sequence[bytes], top_k: int = 3) -> List[ItemResult]:
+        """Top-k (class indices, probabilities) per encoded image, or an error message for the ones that failed.
+
+        ``top_k`` is capped at MAX_TOP_K and then at the model's class count,
+        so a larger one returns every class.
+        """
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        request = encode_request(OP_PREDICT, images, min(top_k, MAX_TOP_K))
+        return decode_predictions(self._call(request), len(images))
+
+    def _call(self, buffers: List[bytes]) -> bytes:
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b"".join(buffers))
+                header = _read_exact(self._stream, RESPONSE_HEADER.size)
+                if not header:
+                    raise EOFError("daemon closed the connection")
+                magic, status, length = RESPONSE_HEADER.unpack(header)
+                payload = _read_exact(self._stream, length)
+                if magic != MAGIC or len(payload) != length:
+                    raise EOFError("malformed response")
+            except (OSError, EOFError) as e:
+                self.close()
+                raise DaemonUnavailable(f"Inference daemon at {self.path}: {e}") from e
+        if status == STATUS_UNAVAILABLE:
+            raise DaemonUnavailable(payload.decode("utf-8", "replace"))
+        if status != STATUS_OK:
+            raise DaemonError(payload.decode("utf-8", "replace"))
+        return payload
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._stream = sock.makefile("rb")
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._stream = None
+
+
+def connect(path: Optional[str] = None, timeout: float = DEFAULT_CLIENT_TIMEOUT) -> Optional[Tuple[DaemonClient,
+                                                                                                  Dict[str, Any]]]:
+    """(client, info) for the daemon at ``path`` if one is listening there with a model ready, else None"""
+    client = DaemonClient(path, timeout)
+    if not os.path.exists(client.path):
+        return None
+    try:
+        return client, client.info()
+    except (DaemonUnavailable, DaemonError):
+        client.close()
+        return None
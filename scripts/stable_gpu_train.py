@@ -7,10 +7,17 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader, random_split
-from torchvision import datasets, transforms, models
+from torchvision import datasets, models
 import yaml
 import os
+import sys
 import time
+from pathlib import Path
+
+# Decoding and preprocessing are shared with the servers, so training sees exactly what they serve
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Deploy"))
+from image_decode import decode_image
+from preprocessing import Preprocessor
 
 class RobustGPUTrainer:
     def __init__(self, config_path='cattle_dataset.yaml'):
@@ -42,15 +49,12 @@ class RobustGPUTrainer:
         """Prepare simplified dataset for stable training"""
         print("📂 Preparing stable dataset...")
         
-        # Simple, robust transforms
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Same decode + resize + normalize as the servers and CLI
+        transform = Preprocessor()
         
         # Load dataset
-        full_dataset = datasets.ImageFolder(self.config['dataset_path'], transform=transform)
+        full_dataset = datasets.ImageFolder(self.config['dataset_path'], transform=transform,
+                                            loader=decode_image)
         
         # Simple split
         total_size = len(full_dataset)
@@ -1,109 +1,204 @@
 """
 🐄 Cattle Breed Predictor
-Simple script to predict top 3 cattle breeds from an input image
+Predict the top cattle breeds for one image, or score whole folders of photos in batch mode
+(through the local inference daemon when a server runs with --uds, otherwise with the model loaded here)
+
+Usage: python predict_cattle.py <image_path> [--top-k 3]
+       python predict_cattle.py <dir | glob | file ...> [--file-list paths.txt] [--output results.csv|results.jsonl]
+                                [--batch-size 32] [--workers 4] [--resume] [--top-k 5]
 """
 
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
-from PIL import Image
+import argparse
+import csv
+import glob
+import json
 import os
 import sys
+import time
+from pathlib import Path
+
+# Image decoding and preprocessing are shared with the servers in Deploy/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Deploy"))
+from image_decode import decode_image
+from uds_daemon import DaemonUnavailable, connect as connect_daemon
+
+DEFAULT_MODEL_PATH = '../models/stable_cattle_model.pth'
+
+# Files a directory or glob input expands to
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# Batch mode defaults: images per forward pass and decode worker processes
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
 
 class CattlePredictor:
-    def __init__(self, model_path='../models/stable_cattle_model.pth'):
-        """Initialize the cattle breed predictor"""
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, socket_path=None, use_daemon=True):
+        """Initialize the cattle breed predictor
+        
+        When a server runs with --uds, predictions come from it over its Unix
+        socket (socket_path, default $CATTLE_AI_SOCKET or the daemon's default
+        path): no torch import or model load here. Otherwise, or if the daemon
+        goes away, the model is loaded in this process.
+        """
         print("🐄 Loading Cattle Breed Predictor...")
+        self.model_path = model_path
+        self.daemon = None
+        
+        connection = connect_daemon(socket_path) if use_daemon else None
+        if connection:
+            self.daemon, info = connection
+            self.classes = info['classes']
+            self.daemon_max_images = info.get('max_images', DEFAULT_BATCH_SIZE)
+            print(f"⚡ Using the inference daemon at {self.daemon.path} "
+                  f"({info.get('model_format')}, version {info.get('model_version')})")
+            print(f"🧠 Trained to recognize {len(self.classes)} cattle breeds")
+            print("🎯 Predictor ready!")
+            return
+        
+        self._load_model(model_path)
+    
+    def _load_model(self, model_path):
+        """Load the model into this process"""
+        import torch
+        from model_loading import exported_path, load_inference_model, slim_path
+        from preprocessing import Preprocessor
         
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"🖥️ Using device: {self.device}")
         
-        # Load model checkpoint
-        if not os.path.exists(model_path):
+        # Load model (a TorchScript export or slim file from Deploy/export_model.py when present)
+        if not any(os.path.exists(path) for path in (model_path, exported_path(model_path), slim_path(model_path))):
             raise FileNotFoundError(f"❌ Model not found at {model_path}")
-            
-        checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
-        self.classes = checkpoint['classes']
         
-        print(f"✅ Model loaded successfully!")
+        loaded = load_inference_model(model_path, self.device)
+        self.classes = loaded.classes
+        self.model = loaded.module
+        
+        print(f"✅ Model loaded successfully! ({loaded.format}, {loaded.load_seconds:.2f}s)")
         print(f"🧠 Trained to recognize {len(self.classes)} cattle breeds")
-        print(f"🏆 Best validation accuracy: {checkpoint.get('val_acc', 'Unknown'):.2f}%")
-        
-        # Setup model
-        self.model = models.resnet18(weights=None)
-        self.model.fc = nn.Linear(self.model.fc.in_features, len(self.classes))
-        self.model.load_state_dict(checkpoint['model_state_dict'])
-        self.model = self.model.to(self.device)
-        self.model.eval()
-        
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        print(f"🏆 Best validation accuracy: {loaded.info.get('val_acc', 'Unknown'):.2f}%")
+        
+        # Image preprocessing (same code as the servers and the trainer)
+        self.preprocessor = Preprocessor(channels_last=loaded.info.get('channels_last', False),
+                                         pin_memory=self.device.type == 'cuda',
+                                         normalize=not loaded.normalization_folded)
         
         print("🎯 Predictor ready!")
+    
+    def _label(self, indices, probs):
+        """One image's top-k as breed names and confidences"""
+        return [{
+            'breed': self.classes[index],
+            'confidence': confidence,
+            'percentage': f"{confidence * 100:.1f}%"
+        } for index, confidence in zip(indices, probs)]
+    
+    def predict_pixels(self, pixel_list, k=3):
+        """Top-k predictions for a batch of resized HWC uint8 images, in one forward pass"""
+        import torch
+        input_tensor = self.preprocessor.batch(pixel_list).to(self.device, non_blocking=True)
+        with torch.no_grad():
+            outputs = self.model(input_tensor)
+            probabilities = torch.softmax(outputs, 1)
+            top_probs, top_indices = torch.topk(probabilities, k=min(k, probabilities.shape[1]))
         
-    def predict_top3(self, image_path):
+        return [self._label(indices, probs) for indices, probs in zip(top_indices.tolist(), top_probs.tolist())]
+    
+    def predict_topk(self, image_path, k=3):
         """
-        Predict top 3 cattle breeds from an image
+        Predict the top k cattle breeds from an image
         
         Args:
             image_path (str): Path to the image file
-            
+            k (int): Number of breeds to return
+        
         Returns:
-            list: Top 3 predictions with breed names and confidence scores
+            list: Top k predictions with breed names and confidence scores
         """
         try:
             # Check if image exists
             if not os.path.exists(image_path):
                 raise FileNotFoundError(f"❌ Image not found: {image_path}")
             
-            # Load and preprocess image
-            image = Image.open(image_path).convert('RGB')
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            
-            # Predict
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.softmax(outputs, 1)
-                
-                # Get top 3 predictions
-                top_probs, top_indices = torch.topk(probabilities, k=3)
-                
-                # Format results
-                predictions = []
-                for i in range(3):
-                    breed = self.classes[top_indices[0][i].item()]
-                    confidence = top_probs[0][i].item()
-                    predictions.append({
-                        'breed': breed,
-                        'confidence': confidence,
-                        'percentage': f"{confidence * 100:.1f}%"
-                    })
-                
-                return predictions
-                
+            # Decoded by the daemon, or here (reduced-resolution decode, EXIF orientation applied)
+            _, predictions, error = next(self.predict_files([image_path], k, batch_size=1, workers=0))
+            if error:
+                raise ValueError(error)
+            return predictions
+        
         except Exception as e:
             print(f"❌ Error processing {image_path}: {e}")
             return None
     
-    def predict_and_display(self, image_path):
+    def predict_top3(self, image_path):
+        """Predict the top 3 cattle breeds from an image"""
+        return self.predict_topk(image_path, 3)
+    
+    def predict_files(self, paths, k=3, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+        """Yield (path, top-k predictions or None, error or None) for each file, in order, a batch at a time.
+        
+        With the daemon, the encoded files are sent to it a batch per request.
+        Otherwise decoding and resizing run in ``workers`` DataLoader processes
+        (0 = in this process) while the model runs batched forward passes here.
+        """
+        if self.daemon:
+            done = 0
+            try:
+                for row in self._predict_files_daemon(paths, k, batch_size):
+                    yield row
+                    done += 1
+                return
+            except DaemonUnavailable as e:
+                print(f"⚠️ Inference daemon unavailable ({e}); loading the model in this process")
+                self.daemon = None
+                self._load_model(self.model_path)
+                paths = paths[done:]
+        
+        from torch.utils.data import DataLoader
+        loader = DataLoader(ImageFileDataset(paths, self.preprocessor), batch_size=batch_size,
+                            num_workers=workers, collate_fn=list)
+        for items in loader:
+            decoded = [(path, pixels) for path, pixels, _ in items if pixels is not None]
+            predictions = dict(zip((path for path, _ in decoded),
+                                   self.predict_pixels([pixels for _, pixels in decoded], k) if decoded else []))
+            for path, _, error in items:
+                yield path, predictions.get(path), error
+    
+    def _predict_files_daemon(self, paths, k, batch_size):
+        """predict_files through the daemon"""
+        batch_size = min(batch_size, self.daemon_max_images)
+        for start in range(0, len(paths), batch_size):
+            batch = []
+            for path in paths[start:start + batch_size]:
+                try:
+                    with open(path, 'rb') as f:
+                        batch.append((path, f.read(), None))
+                except OSError as e:
+                    batch.append((path, None, f"{type(e).__name__}: {e}"))
+            readable = [data for _, data, _ in batch if data is not None]
+            results = iter(self.daemon.predict(readable, k) if readable else [])
+            for path, data, error in batch:
+                result = next(results) if data is not None else error
+                if isinstance(result, str):
+                    yield path, None, result
+                else:
+                    yield path, self._label(*result), None
+    
+    def predict_and_display(self, image_path, k=3):
         """Predict and display results in a nice format"""
         print(f"\n🖼️ Analyzing image: {image_path}")
         print("=" * 50)
         
-        predictions = self.predict_top3(image_path)
+        predictions = self.predict_topk(image_path, k)
         
         if predictions:
-            print("🏆 Top 3 Cattle Breed Predictions:")
+            print(f"🏆 Top {len(predictions)} Cattle Breed Predictions:")
             print("-" * 30)
             for i, pred in enumerate(predictions, 1):
-                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉"
+                medal = {1: "🥇", 2: "🥈", 3: "🥉"}.get(i, "🏅")
                 print(f"{medal} {i}. {pred['breed']}")
                 print(f"   Confidence: {pred['percentage']}")
-                if i < 3:
+                if i < len(predictions):
                     print()
             
             return predictions
@@ -111,27 +206,210 @@ class CattlePredictor:
             print("❌ Failed to analyze image")
             return None
 
+class ImageFileDataset:
+    """Image files decoded and resized to the model input (HWC uint8) by DataLoader workers"""
+    
+    def __init__(self, paths, preprocessor):
+        self.paths = paths
+        self.preprocessor = preprocessor
+    
+    def __len__(self):
+        return len(self.paths)
+    
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            return path, self.preprocessor.pixels(decode_image(path)), None
+        except Exception as e:
+            # A corrupt or unreadable file is reported in its row instead of stopping the run
+            return path, None, f"{type(e).__name__}: {e}"
+
+def expand_inputs(inputs, file_list=None):
+    """Image paths from files, directories (recursive), glob patterns and a file list, without duplicates"""
+    candidates = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates += sorted(str(path) for path in Path(item).rglob('*')
+                                 if path.suffix.lower() in IMAGE_EXTENSIONS)
+        elif os.path.exists(item):
+            candidates.append(item)
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"⚠️ No files match {item}")
+            candidates += [path for path in matches
+                           if os.path.isfile(path) and Path(path).suffix.lower() in IMAGE_EXTENSIONS]
+    if file_list:
+        with (sys.stdin if file_list == '-' else open(file_list, encoding='utf-8')) as f:
+            candidates += [line.strip() for line in f if line.strip()]
+    
+    seen = set()
+    paths = []
+    for path in candidates:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+    return paths
+
+def output_format(output, requested=None):
+    """csv or jsonl, from --format or the output file's extension"""
+    if requested:
+        return requested
+    return 'csv' if output and output.lower().endswith('.csv') else 'jsonl'
+
+def scored_paths(output, fmt):
+    """Absolute paths already scored successfully in an earlier run's output (failed rows are retried)"""
+    done = set()
+    if not output or not os.path.exists(output):
+        return done
+    with open(output, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if row.get('path') and not row.get('error'):
+                done.add(os.path.abspath(row['path']))
+    return done
+
+class ResultWriter:
+    """Streams one row per image to CSV or JSON lines, flushed after every batch"""
+    
+    def __init__(self, output, fmt, k, append=False):
+        self.fmt = fmt
+        self.file = open(output, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.csv = None
+        if fmt == 'csv':
+            fields = ['path'] + [f"{name}_{rank}" for rank in range(1, k + 1) for name in ('breed', 'confidence')]
+            self.csv = csv.DictWriter(self.file, fieldnames=fields + ['error'])
+            if not append or self.file.tell() == 0:
+                self.csv.writeheader()
+    
+    def write(self, path, predictions, error):
+        if self.csv is not None:
+            row = {'path': path, 'error': error or ''}
+            for rank, pred in enumerate(predictions or [], 1):
+                row[f"breed_{rank}"] = pred['breed']
+                row[f"confidence_{rank}"] = f"{pred['confidence']:.6f}"
+            self.csv.writerow(row)
+        else:
+            row = {'path': path}
+            if predictions is not None:
+                row['predictions'] = [{'breed': pred['breed'], 'confidence': pred['confidence']}
+                                      for pred in predictions]
+            if error:
+                row['error'] = error
+            self.file.write(json.dumps(row) + '\n')
+    
+    def flush(self):
+        self.file.flush()
+    
+    def close(self):
+        self.file.close()
+
+def run_batch(predictor, paths, args):
+    """Score every path, streaming rows to --output (or the console), and report images/sec"""
+    fmt = output_format(args.output, args.format)
+    if args.resume:
+        done = scored_paths(args.output, fmt)
+        skipped = sum(1 for path in paths if os.path.abspath(path) in done)
+        paths = [path for path in paths if os.path.abspath(path) not in done]
+        print(f"⏭️ Resuming: {skipped} images already scored, {len(paths)} to go")
+    if not paths:
+        print("✅ Nothing to score")
+        return
+    
+    writer = ResultWriter(args.output, fmt, args.top_k, append=args.resume) if args.output else None
+    decoding = f"via {predictor.daemon.path}" if predictor.daemon else f"{args.workers} decode workers"
+    print(f"\n📂 Scoring {len(paths)} images (batch size {args.batch_size}, {decoding})"
+          + (f" -> {args.output}" if args.output else ""))
+    
+    started = time.perf_counter()
+    scored = failed = 0
+    try:
+        for index, (path, predictions, error) in enumerate(
+                predictor.predict_files(paths, args.top_k, args.batch_size, args.workers), 1):
+            if error:
+                failed += 1
+            else:
+                scored += 1
+            if writer:
+                writer.write(path, predictions, error)
+            elif error:
+                print(f"❌ {path}: {error}")
+            else:
+                print(f"🖼️ {path}: {predictions[0]['breed']} ({predictions[0]['percentage']})")
+            if index % args.batch_size == 0 or index == len(paths):
+                if writer:
+                    writer.flush()
+                rate = index / (time.perf_counter() - started)
+                print(f"   {index}/{len(paths)} images, {rate:.1f} images/s", file=sys.stderr)
+    finally:
+        if writer:
+            writer.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Scored {scored} images in {elapsed:.1f}s ({(scored + failed) / elapsed:.1f} images/s)"
+          + (f", {failed} failed" if failed else ""))
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Predict cattle breeds for one image or many")
+    parser.add_argument("inputs", nargs="*", help="Image files, directories or glob patterns (quote globs)")
+    parser.add_argument("--file-list", default=None, help="Text file with one image path per line ('-' = stdin)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model checkpoint")
+    parser.add_argument("--top-k", type=int, default=3, help="Breeds reported per image")
+    parser.add_argument("--output", default=None, help="Write one row per image to this .csv or .jsonl file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="Output format (default: from the --output extension, else jsonl)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Images per forward pass")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="DataLoader processes decoding images (0 = decode in this process)")
+    parser.add_argument("--socket", default=None,
+                        help="Inference daemon socket (default: $CATTLE_AI_SOCKET or the server's --uds default)")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Always load the model in this process, even when a daemon is running")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip images already scored in --output and append to it")
+    args = parser.parse_args()
+    if not args.inputs and not args.file_list:
+        parser.print_usage()
+        print("Example: python predict_cattle.py your_cattle_image.jpg")
+        print("         python predict_cattle.py herd_photos/ --output herd.csv --resume")
+        sys.exit(1)
+    if args.top_k < 1 or args.batch_size < 1:
+        parser.error("--top-k and --batch-size must be at least 1")
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    return args
+
 def main():
     """Main function for command line usage"""
-    if len(sys.argv) != 2:
-        print("Usage: python predict_cattle.py <image_path>")
-        print("Example: python predict_cattle.py your_cattle_image.jpg")
-        print("Note: Provide path to any cattle image for breed prediction")
+    args = parse_args()
+    paths = expand_inputs(args.inputs, args.file_list)
+    if not paths:
+        print("❌ No images found")
         return
     
-    image_path = sys.argv[1]
-    
     try:
-        predictor = CattlePredictor()
-        result = predictor.predict_and_display(image_path)
+        predictor = CattlePredictor(args.model, socket_path=args.socket, use_daemon=not args.no_daemon)
         
-        if result:
-            print(f"\n✅ Analysis complete!")
-        else:
-            print(f"\n❌ Analysis failed!")
+        # One image on the console: the detailed view
+        single = len(paths) == 1 and not args.output and not os.path.isdir(args.inputs[0] if args.inputs else '')
+        if single:
+            result = predictor.predict_and_display(paths[0], args.top_k)
             
+            if result:
+                print(f"\n✅ Analysis complete!")
+            else:
+                print(f"\n❌ Analysis failed!")
+            return
+        
+        run_batch(predictor, paths, args)
+    
     except Exception as e:
         print(f"❌ Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()